@@ -1,10 +1,34 @@
 from airflow import DAG
+from airflow.operators.python import PythonOperator, ShortCircuitOperator
 from airflow.providers.cncf.kubernetes.operators.pod import KubernetesPodOperator
 from airflow.providers.cncf.kubernetes.secret import Secret
 from kubernetes.client import models as k8s
 
+import logging
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+# scheduled: silver, gold and tests pods every 15 minutes
+# event: dbt build of the models downstream of bronze sources with new files, checked every few minutes
+DBT_DAG_MODE = os.environ.get("DBT_DAG_MODE", "scheduled")
+
+# bucket notification subscription of each bronze source, and the suffix of the files its snowpipe copies
+BRONZE_NOTIFICATIONS = {
+    "trend_raw": ("trend-bucket-dbt-sub", ".parquet"),
+    "batch_raw": ("batch-bucket-dbt-sub", ".parquet"),
+    "sample_raw": ("sample-bucket-dbt-sub", ".json"),
+}
+
+# files notified less than this long ago may not be copied by snowpipe yet, they are left for a later run
+SNOWPIPE_SETTLE_SEC = int(os.environ.get("SNOWPIPE_SETTLE_SEC", "60"))
+# sources with new files stay pending in this airflow variable until a dbt build of them succeeds
+PENDING_SOURCES_VARIABLE = "chrom_dbt_pending_bronze_sources"
+# failed builds of a pending source before it is dropped and the check task fails to raise an alert
+DBT_BUILD_MAX_ATTEMPTS = int(os.environ.get("DBT_BUILD_MAX_ATTEMPTS", "5"))
+PULL_MAX_MESSAGES = 1000
+PULL_MAX_PAGES = 20
+
+log = logging.getLogger(__name__)
 
 # Kubernetes secret volume
 sf_key_file = Secret(
@@ -38,6 +62,71 @@ def get_env_vars() -> dict:
 def get_image() -> str:
     return f'{os.environ["DBT_IMAGE"]}:latest'
 
+def check_bronze_loads(ti) -> str:
+    """
+    Drain the bucket notifications of each bronze source, returns the dbt selector of the sources with new files.
+    Sources stay pending across runs until clear_bronze_loads records a successful build of them, so a failed
+    build is retried by the next run even when no further files arrive.
+    """
+
+    from airflow.exceptions import AirflowFailException
+    from airflow.models import Variable
+    from airflow.providers.google.cloud.hooks.pubsub import PubSubHook
+
+    hook = PubSubHook()
+    project_id = os.environ["GCP_PROJECT_ID"]
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=SNOWPIPE_SETTLE_SEC)
+    pending = Variable.get(PENDING_SOURCES_VARIABLE, default_var={}, deserialize_json=True)
+    # a source whose builds keep failing, e.g. on a dbt test, is dropped so the dag alerts once instead of rebuilding
+    # forever, files notified from now on make it pending again
+    exhausted = {source: state for source, state in pending.items() if state["attempts"] >= DBT_BUILD_MAX_ATTEMPTS}
+    for source in exhausted:
+        del pending[source]
+
+    for source, (subscription, suffix) in BRONZE_NOTIFICATIONS.items():
+        new_files = 0
+        for _ in range(PULL_MAX_PAGES):
+            messages = hook.pull(project_id=project_id, subscription=subscription, max_messages=PULL_MAX_MESSAGES,
+                                 return_immediately=True)
+            # unacked notifications are redelivered once their ack deadline passes
+            settled = [message for message in messages if message.message.publish_time <= settled_before]
+            files = sum(1 for message in settled if message.message.attributes.get("objectId", "").endswith(suffix))
+            if files:
+                # recorded before the ack, so no notification is lost if the task dies in between
+                pending.setdefault(source, {"files": 0, "attempts": 0})["files"] += files
+                Variable.set(PENDING_SOURCES_VARIABLE, pending, serialize_json=True)
+            if settled:
+                hook.acknowledge(project_id=project_id, subscription=subscription, messages=settled)
+            new_files += files
+            if len(messages) < PULL_MAX_MESSAGES:
+                break
+        log.info("%s: %d new files", source, new_files)
+
+    if exhausted:
+        Variable.set(PENDING_SOURCES_VARIABLE, pending, serialize_json=True)
+        raise AirflowFailException(f"dbt build failed {DBT_BUILD_MAX_ATTEMPTS} times for bronze sources {exhausted}, "
+                                   "their files are not rebuilt until new files arrive")
+
+    for state in pending.values():
+        state["attempts"] += 1
+    Variable.set(PENDING_SOURCES_VARIABLE, pending, serialize_json=True)
+    ti.xcom_push(key="sources", value=sorted(pending))
+    # an empty selector skips the dbt build
+    return " ".join(f"source:bronze.{source}+" for source in sorted(pending))
+
+def clear_bronze_loads(ti) -> None:
+    """ Mark the bronze sources selected by check_bronze_loads as built, after dbt_build succeeded """
+
+    from airflow.models import Variable
+
+    built = ti.xcom_pull(task_ids="check_bronze_loads", key="sources") or []
+    pending = Variable.get(PENDING_SOURCES_VARIABLE, default_var={}, deserialize_json=True)
+    for source in built:
+        state = pending.pop(source, None)
+        if state is not None:
+            log.info("%s: built %d new files after %d attempts", source, state["files"], state["attempts"])
+    Variable.set(PENDING_SOURCES_VARIABLE, pending, serialize_json=True)
+
 # DAG setup
 default_args = {
     "owner": "chrom",
@@ -49,45 +138,80 @@ with DAG(
     dag_id="chrom_dbt_pipeline",
     default_args=default_args,
     start_date=datetime(2026, 1, 1),
-    schedule_interval="*/15 * * * *",
+    schedule_interval="*/15 * * * *" if DBT_DAG_MODE == "scheduled" else "*/2 * * * *",
     catchup=False,
+    max_active_runs=1,
     tags=["dbt", "snowflake"]
 ) as dag:
 
-    dbt_silver = KubernetesPodOperator(
-        task_id="dbt_silver",
-        name="dbt-silver",
-        image=get_image(),
-        cmds=["dbt"],
-        arguments=["run", "--select", "tag:silver"],
-        env_vars=get_env_vars(),
-        secrets=[sf_key_file, sf_passphrase],
-        get_logs=True,
-        is_delete_operator_pod=True,
-    )
-
-    dbt_gold = KubernetesPodOperator(
-        task_id="dbt_gold",
-        name="dbt-gold",
-        image=get_image(),
-        cmds=["dbt"],
-        arguments=["run", "--select", "tag:gold"],
-        env_vars=get_env_vars(),
-        secrets=[sf_key_file, sf_passphrase],
-        get_logs=True,
-        is_delete_operator_pod=True,
-    )
-
-    dbt_tests = KubernetesPodOperator(
-        task_id="dbt_tests",
-        name="dbt-tests",
-        image=get_image(),
-        cmds=["dbt"],
-        arguments=["test"],
-        env_vars=get_env_vars(),
-        secrets=[sf_key_file, sf_passphrase],
-        get_logs=True,
-        is_delete_operator_pod=True,
-    )
-
-    dbt_silver >> dbt_gold >> dbt_tests
+    if DBT_DAG_MODE == "scheduled":
+        dbt_silver = KubernetesPodOperator(
+            task_id="dbt_silver",
+            name="dbt-silver",
+            image=get_image(),
+            cmds=["dbt"],
+            arguments=["run", "--select", "tag:silver"],
+            env_vars=get_env_vars(),
+            secrets=[sf_key_file, sf_passphrase],
+            get_logs=True,
+            is_delete_operator_pod=True,
+        )
+
+        dbt_gold = KubernetesPodOperator(
+            task_id="dbt_gold",
+            name="dbt-gold",
+            image=get_image(),
+            cmds=["dbt"],
+            arguments=["run", "--select", "tag:gold"],
+            env_vars=get_env_vars(),
+            secrets=[sf_key_file, sf_passphrase],
+            get_logs=True,
+            is_delete_operator_pod=True,
+        )
+
+        dbt_tests = KubernetesPodOperator(
+            task_id="dbt_tests",
+            name="dbt-tests",
+            image=get_image(),
+            cmds=["dbt"],
+            arguments=["test"],
+            env_vars=get_env_vars(),
+            secrets=[sf_key_file, sf_passphrase],
+            get_logs=True,
+            is_delete_operator_pod=True,
+        )
+
+        dbt_silver >> dbt_gold >> dbt_tests
+
+    else:
+        # cheap check on the airflow worker, no pod or warehouse is started when nothing was loaded
+        check_bronze = ShortCircuitOperator(
+            task_id="check_bronze_loads",
+            python_callable=check_bronze_loads,
+        )
+
+        # silver, gold and their tests in one pod, only for the models downstream of the loaded sources
+        dbt_build = KubernetesPodOperator(
+            task_id="dbt_build",
+            name="dbt-build",
+            image=get_image(),
+            cmds=["dbt"],
+            arguments=[
+                "build",
+                "--select", "{{ ti.xcom_pull(task_ids='check_bronze_loads') }}",
+                "--threads", os.environ.get("DBT_THREADS", "4"),
+            ],
+            env_vars=get_env_vars(),
+            secrets=[sf_key_file, sf_passphrase],
+            get_logs=True,
+            is_delete_operator_pod=True,
+            retry_delay=timedelta(minutes=1),
+        )
+
+        # only runs once dbt_build succeeded, a failed build leaves its sources pending for the next run
+        clear_bronze = PythonOperator(
+            task_id="clear_bronze_loads",
+            python_callable=clear_bronze_loads,
+        )
+
+        check_bronze >> dbt_build >> clear_bronze
@@ -0,0 +1,127 @@
+{{ config(
+    materialized = 'incremental',
+    unique_key = 'golden_bin_id',
+    incremental_strategy = 'merge',
+    on_schema_change = 'append_new_columns'
+) }}
+
+-- per recipe and cv bin envelope of each sensor across closed batches without alerts.
+-- each run folds only the batches closed since the last run into the stored statistics: counts, means and sums of
+-- squared deviations are merged with the parallel form of welford's algorithm, percentiles with mergeable t-digest states
+{% set sensors = ['uv_mau', 'flow_rate_lpm', 'pressure_bar', 'ph', 'cond_ms_cm'] %}
+{% set bin_width_cv = var('golden_envelope_bin_width_cv', 0.05) %}
+{% set settle_hours = var('golden_envelope_settle_hours', 1) %}
+
+WITH golden_batches AS (
+    SELECT
+        br.batch_id,
+        br.recipe_name,
+        br.batch_end_ts
+    FROM {{ ref('batch_results') }} br
+    WHERE br.batch_alerts = 'No Alerts'
+    -- trend points of a batch keep arriving for a while after its end event
+    AND br.batch_end_ts <= DATEADD(hour, -{{ settle_hours }}, (SELECT MAX(reading_ts) FROM {{ ref('trend_base') }}))
+    {% if is_incremental() %}
+    AND br.batch_end_ts > (SELECT COALESCE(MAX(folded_through_ts), '1970-01-01'::TIMESTAMP) FROM {{ this }})
+    {% endif %}
+),
+
+new_bins AS (
+    SELECT
+        gb.recipe_name,
+        cb.cv_bin_start,
+        COUNT(*) AS batch_count,
+        MAX(gb.batch_end_ts) AS folded_through_ts,
+        {% for sensor in sensors %}
+        AVG(cb.{{ sensor }}_mean) AS {{ sensor }}_mean,
+        VAR_POP(cb.{{ sensor }}_mean) * COUNT(*) AS {{ sensor }}_m2,
+        APPROX_PERCENTILE_ACCUMULATE(cb.{{ sensor }}_mean) AS {{ sensor }}_digest{% if not loop.last %},{% endif %}
+        {% endfor %}
+    FROM golden_batches gb
+    INNER JOIN {{ ref('trend_cv_bins') }} cb
+    ON gb.batch_id = cb.batch_id
+    AND cb.bin_width_cv = {{ bin_width_cv }}
+    GROUP BY
+        gb.recipe_name,
+        cb.cv_bin_start
+),
+
+-- the newly closed batches of a bin, and its stored statistics on incremental runs
+bin_parts AS (
+    SELECT
+        nb.*
+    FROM new_bins nb
+    {% if is_incremental() %}
+    UNION ALL
+    SELECT
+        ge.recipe_name,
+        ge.cv_bin_start,
+        ge.batch_count,
+        ge.folded_through_ts,
+        {% for sensor in sensors %}
+        ge.{{ sensor }}_mean,
+        ge.{{ sensor }}_m2,
+        ge.{{ sensor }}_digest{% if not loop.last %},{% endif %}
+        {% endfor %}
+    FROM {{ this }} ge
+    INNER JOIN new_bins nb
+    ON ge.recipe_name = nb.recipe_name
+    AND ge.cv_bin_start = nb.cv_bin_start
+    {% endif %}
+),
+
+pooled AS (
+    SELECT
+        bp.recipe_name,
+        bp.cv_bin_start,
+        SUM(bp.batch_count) AS batch_count,
+        MAX(bp.folded_through_ts) AS folded_through_ts,
+        {% for sensor in sensors %}
+        SUM(bp.batch_count * bp.{{ sensor }}_mean) / SUM(bp.batch_count) AS {{ sensor }}_mean,
+        APPROX_PERCENTILE_COMBINE(bp.{{ sensor }}_digest) AS {{ sensor }}_digest{% if not loop.last %},{% endif %}
+        {% endfor %}
+    FROM bin_parts bp
+    GROUP BY
+        bp.recipe_name,
+        bp.cv_bin_start
+),
+
+pooled_m2 AS (
+    SELECT
+        bp.recipe_name,
+        bp.cv_bin_start,
+        {% for sensor in sensors %}
+        SUM(bp.{{ sensor }}_m2 + bp.batch_count * POWER(bp.{{ sensor }}_mean - p.{{ sensor }}_mean, 2)) AS {{ sensor }}_m2{% if not loop.last %},{% endif %}
+        {% endfor %}
+    FROM bin_parts bp
+    INNER JOIN pooled p
+    ON bp.recipe_name = p.recipe_name
+    AND bp.cv_bin_start = p.cv_bin_start
+    GROUP BY
+        bp.recipe_name,
+        bp.cv_bin_start
+)
+
+SELECT
+    {{ dbt_utils.generate_surrogate_key([
+        "p.recipe_name",
+        "p.cv_bin_start"
+    ]) }} AS golden_bin_id,
+    p.recipe_name,
+    {{ bin_width_cv }}::NUMBER(10, 4) AS bin_width_cv,
+    p.cv_bin_start,
+    p.batch_count,
+    p.folded_through_ts,
+    {% for sensor in sensors %}
+    p.{{ sensor }}_mean,
+    SQRT(pm.{{ sensor }}_m2 / NULLIF(p.batch_count - 1, 0)) AS {{ sensor }}_std,
+    APPROX_PERCENTILE_ESTIMATE(p.{{ sensor }}_digest, 0.05) AS {{ sensor }}_p05,
+    APPROX_PERCENTILE_ESTIMATE(p.{{ sensor }}_digest, 0.5) AS {{ sensor }}_p50,
+    APPROX_PERCENTILE_ESTIMATE(p.{{ sensor }}_digest, 0.95) AS {{ sensor }}_p95,
+    pm.{{ sensor }}_m2,
+    p.{{ sensor }}_digest{% if not loop.last %},{% endif %}
+    {% endfor %}
+FROM pooled p
+INNER JOIN pooled_m2 pm
+ON p.recipe_name = pm.recipe_name
+AND p.cv_bin_start = pm.cv_bin_start
@@ -1,13 +1,140 @@
 {{ config(
-    materialized = 'table',
+    materialized = 'incremental',
     unique_key = 'trend_point_id',
+    incremental_strategy = 'merge',
     on_schema_change = 'append_new_columns'
 ) }}
 
-WITH trend_base AS (
+-- incremental runs only rebuild the tail of open and recently closed batches, from their earliest new silver point
+-- or changed batch and phase event, and carry cumulative cv and auc forward from the last stored row of each batch and phase.
+-- batches closed more than trend_base_frozen_after_hours before the newest stored reading are frozen,
+-- late points and events for them are only picked up by a --full-refresh
+{% set frozen_after_hours = var('trend_base_frozen_after_hours', 24) %}
+
+WITH
+{% if is_incremental() %}
+active_batches AS (
+    SELECT
+        batch_id
+    FROM {{ ref('batch_base') }}
+    WHERE batch_end_ts IS NULL
+    OR batch_end_ts >= DATEADD(hour, -{{ frozen_after_hours }}, (SELECT MAX(reading_ts) FROM {{ this }}))
+),
+
+new_points AS (
+    SELECT
+        ts.chrom_id,
+        ts.reading_ts,
+        bb.batch_id
+    FROM {{ ref('trend_silver') }} ts
+    LEFT JOIN {{ ref('batch_base') }} bb
+    ON ts.chrom_id = bb.chrom_id
+    AND ts.reading_ts >= bb.batch_start_ts
+    AND (bb.batch_end_ts IS NULL OR ts.reading_ts <= bb.batch_end_ts)
+    WHERE ts.load_time > (SELECT MAX(load_time) FROM {{ this }})
+    QUALIFY
+        ROW_NUMBER() OVER (PARTITION BY ts.chrom_id, ts.reading_ts ORDER BY bb.batch_start_ts DESC) = 1
+),
+
+-- batch and phase events loaded since the last run relabel the points of their unit from the event on,
+-- so points that loaded before their batch or phase context pick up batch_id and phase_name
+context_changes AS (
+    SELECT
+        bs.chrom_id,
+        bs.event_ts AS changed_from_ts
+    FROM {{ ref('batch_silver') }} bs
+    WHERE bs.load_time > (SELECT MAX(load_time) FROM {{ this }})
+    AND bs.batch_id IN (SELECT batch_id FROM active_batches)
+    UNION ALL
     SELECT
-        bb.batch_id,
         bb.chrom_id,
+        ps.event_ts AS changed_from_ts
+    FROM {{ ref('phase_silver') }} ps
+    INNER JOIN {{ ref('batch_base') }} bb
+    ON ps.batch_id = bb.batch_id
+    WHERE ps.load_time > (SELECT MAX(load_time) FROM {{ this }})
+    AND ps.batch_id IN (SELECT batch_id FROM active_batches)
+),
+
+-- stored points of the active window whose batch_id or phase_name no longer match batch_base and phase_base,
+-- catches events that were loaded but not yet in silver when the last run read it
+stale_points AS (
+    SELECT
+        tb.chrom_id,
+        tb.reading_ts AS changed_from_ts
+    FROM {{ this }} tb
+    LEFT JOIN {{ ref('batch_base') }} bb
+    ON tb.chrom_id = bb.chrom_id
+    AND tb.reading_ts >= bb.batch_start_ts
+    AND (bb.batch_end_ts IS NULL OR tb.reading_ts <= bb.batch_end_ts)
+    LEFT JOIN {{ ref('phase_base') }} pb
+    ON bb.batch_id = pb.batch_id
+    AND tb.reading_ts >= pb.phase_start_ts
+    AND (pb.phase_end_ts IS NULL OR tb.reading_ts <= pb.phase_end_ts)
+    WHERE tb.reading_ts >= DATEADD(hour, -{{ frozen_after_hours }}, (SELECT MAX(reading_ts) FROM {{ this }}))
+    QUALIFY
+        ROW_NUMBER() OVER (PARTITION BY tb.chrom_id, tb.reading_ts ORDER BY bb.batch_start_ts DESC, pb.phase_start_ts DESC) = 1
+        AND (tb.batch_id IS DISTINCT FROM bb.batch_id OR tb.phase_name IS DISTINCT FROM pb.phase_name)
+),
+
+-- every stored point of a unit from its earliest new point or context change on is rebuilt,
+-- so late points reorder the windows and late events relabel them
+recompute_from AS (
+    SELECT
+        changes.chrom_id,
+        MIN(changes.changed_from_ts) AS recompute_from_ts
+    FROM (
+        SELECT
+            np.chrom_id,
+            np.reading_ts AS changed_from_ts
+        FROM new_points np
+        WHERE np.batch_id IS NULL
+        OR np.batch_id IN (SELECT batch_id FROM active_batches)
+        UNION ALL
+        SELECT chrom_id, changed_from_ts FROM context_changes
+        UNION ALL
+        SELECT chrom_id, changed_from_ts FROM stale_points
+    ) changes
+    GROUP BY changes.chrom_id
+),
+
+-- last stored point of each active batch before its rebuilt tail, the starting point of the carried totals
+batch_anchors AS (
+    SELECT
+        tb.batch_id,
+        tb.reading_ts,
+        tb.flow_rate_lpm,
+        tb.uv_mau,
+        tb.batch_tot_cv
+    FROM {{ this }} tb
+    INNER JOIN recompute_from rf
+    ON tb.chrom_id = rf.chrom_id
+    AND tb.reading_ts < rf.recompute_from_ts
+    WHERE tb.batch_id IN (SELECT batch_id FROM active_batches)
+    QUALIFY
+        ROW_NUMBER() OVER (PARTITION BY tb.batch_id ORDER BY tb.reading_ts DESC) = 1
+),
+
+phase_anchors AS (
+    SELECT
+        tb.batch_id,
+        tb.phase_name,
+        tb.phase_tot_cv,
+        tb.uv_tot_auc
+    FROM {{ this }} tb
+    INNER JOIN recompute_from rf
+    ON tb.chrom_id = rf.chrom_id
+    AND tb.reading_ts < rf.recompute_from_ts
+    WHERE tb.batch_id IN (SELECT batch_id FROM active_batches)
+    QUALIFY
+        ROW_NUMBER() OVER (PARTITION BY tb.batch_id, tb.phase_name ORDER BY tb.reading_ts DESC) = 1
+),
+{% endif %}
+
+trend_points AS (
+    SELECT
+        bb.batch_id,
+        ts.chrom_id,
         bb.recipe_name,
         bb.run_number,
         pb.phase_name,
@@ -18,28 +145,72 @@ WITH trend_base AS (
         ts.ph,
         ts.uv_mau,
         ts.cond_ms_cm,
-        0.5 * (
-            ts.flow_rate_lpm + LAG(ts.flow_rate_lpm) OVER (PARTITION BY bb.batch_id ORDER BY ts.reading_ts)
-        ) * (
-            DATEDIFF(seconds, LAG(ts.reading_ts) OVER (PARTITION BY bb.batch_id ORDER BY ts.reading_ts), ts.reading_ts) / 60
-        ) AS vol_thru_l,
-        0.5 * (
-            ts.uv_mau + LAG(ts.uv_mau) OVER (PARTITION BY bb.batch_id ORDER BY ts.reading_ts)
-        ) * (
-            DATEDIFF(seconds, LAG(ts.reading_ts) OVER (PARTITION BY bb.batch_id ORDER BY ts.reading_ts), ts.reading_ts) / 60
-        ) AS uv_auc
+        ts.totalized_cv AS streamed_batch_tot_cv,
+        ts.phase_totalized_cv AS streamed_phase_tot_cv,
+        ts.phase_uv_auc AS streamed_uv_tot_auc,
+        ts.load_time,
+        FALSE AS is_anchor
     FROM {{ ref('trend_silver' )}} ts
+    {% if is_incremental() %}
+    INNER JOIN recompute_from rf
+    ON ts.chrom_id = rf.chrom_id
+    AND ts.reading_ts >= rf.recompute_from_ts
+    {% endif %}
     LEFT JOIN {{ ref('batch_base') }} bb
     ON ts.chrom_id = bb.chrom_id
     AND ts.reading_ts >= bb.batch_start_ts
     AND (bb.batch_end_ts IS NULL OR ts.reading_ts <= bb.batch_end_ts)
     LEFT JOIN {{ ref('phase_base') }} pb
     ON bb.batch_id = pb.batch_id
-    AND ts.reading_ts >= pb.phase_start_ts 
+    AND ts.reading_ts >= pb.phase_start_ts
     AND (pb.phase_end_ts IS NULL OR ts.reading_ts <= pb.phase_end_ts)
     QUALIFY
-        ROW_NUMBER() OVER (PARTITION BY ts.chrom_id, ts.reading_ts ORDER BY bb.batch_start_ts DESC) = 1
-        AND ROW_NUMBER() OVER (PARTITION BY bb.batch_id, ts.reading_ts ORDER BY pb.phase_start_ts DESC) = 1
+        ROW_NUMBER() OVER (PARTITION BY ts.chrom_id, ts.reading_ts ORDER BY bb.batch_start_ts DESC, pb.phase_start_ts DESC) = 1
+    {% if is_incremental() %}
+
+    -- anchors only feed the first interval of each rebuilt tail and are not written back
+    UNION ALL
+    SELECT
+        ba.batch_id,
+        NULL AS chrom_id,
+        NULL AS recipe_name,
+        NULL AS run_number,
+        NULL AS phase_name,
+        NULL AS totalized_batch_time_sec,
+        ba.reading_ts,
+        ba.flow_rate_lpm,
+        NULL AS pressure_bar,
+        NULL AS ph,
+        ba.uv_mau,
+        NULL AS cond_ms_cm,
+        NULL AS streamed_batch_tot_cv,
+        NULL AS streamed_phase_tot_cv,
+        NULL AS streamed_uv_tot_auc,
+        NULL AS load_time,
+        TRUE AS is_anchor
+    FROM batch_anchors ba
+    {% endif %}
+),
+
+trend_base AS (
+    SELECT
+        tp.*,
+        0.5 * (
+            tp.flow_rate_lpm + LAG(tp.flow_rate_lpm) OVER (PARTITION BY tp.batch_id ORDER BY tp.reading_ts)
+        ) * (
+            DATEDIFF(seconds, LAG(tp.reading_ts) OVER (PARTITION BY tp.batch_id ORDER BY tp.reading_ts), tp.reading_ts) / 60
+        ) AS vol_thru_l,
+        0.5 * (
+            tp.uv_mau + LAG(tp.uv_mau) OVER (PARTITION BY tp.batch_id ORDER BY tp.reading_ts)
+        ) * (
+            DATEDIFF(seconds, LAG(tp.reading_ts) OVER (PARTITION BY tp.batch_id ORDER BY tp.reading_ts), tp.reading_ts) / 60
+        ) AS uv_auc
+    FROM trend_points tp
+    {% if is_incremental() %}
+    -- points of frozen batches in a rebuilt unit tail keep their stored values
+    WHERE tp.batch_id IS NULL
+    OR tp.batch_id IN (SELECT batch_id FROM active_batches)
+    {% endif %}
 )
 
 SELECT
@@ -47,9 +218,27 @@ SELECT
         "tb.chrom_id",
         "tb.reading_ts",
     ]) }} AS trend_point_id,
-    tb.*,
-    SUM(tb.vol_thru_l) OVER (PARTITION BY tb.batch_id ORDER BY tb.reading_ts) / 226 AS batch_tot_cv, --226L colummn
-    SUM(tb.vol_thru_l) OVER (PARTITION BY tb.batch_id, tb.phase_name ORDER BY tb.reading_ts) / 226 AS phase_tot_cv, --226L colummn
-    SUM(tb.uv_auc) OVER (PARTITION BY tb.batch_id, tb.phase_name ORDER BY tb.reading_ts) AS uv_tot_auc
+    tb.* EXCLUDE (streamed_batch_tot_cv, streamed_phase_tot_cv, streamed_uv_tot_auc, is_anchor),
+    -- prefer totals computed by the streaming totalizer, fall back to windows for points streamed without them
+    COALESCE(
+        tb.streamed_batch_tot_cv,
+        {% if is_incremental() %}COALESCE(ba.batch_tot_cv, 0) + {% endif %}SUM(tb.vol_thru_l) OVER (PARTITION BY tb.batch_id ORDER BY tb.reading_ts) / 226 --226L colummn
+    ) AS batch_tot_cv,
+    COALESCE(
+        tb.streamed_phase_tot_cv,
+        {% if is_incremental() %}COALESCE(pa.phase_tot_cv, 0) + {% endif %}SUM(tb.vol_thru_l) OVER (PARTITION BY tb.batch_id, tb.phase_name ORDER BY tb.reading_ts) / 226 --226L colummn
+    ) AS phase_tot_cv,
+    COALESCE(
+        tb.streamed_uv_tot_auc,
+        {% if is_incremental() %}COALESCE(pa.uv_tot_auc, 0) + {% endif %}SUM(tb.uv_auc) OVER (PARTITION BY tb.batch_id, tb.phase_name ORDER BY tb.reading_ts)
+    ) AS uv_tot_auc
 FROM
     trend_base tb
+{% if is_incremental() %}
+LEFT JOIN batch_anchors ba
+ON tb.batch_id = ba.batch_id
+LEFT JOIN phase_anchors pa
+ON tb.batch_id = pa.batch_id
+AND tb.phase_name = pa.phase_name
+WHERE NOT tb.is_anchor
+{% endif %}
@@ -0,0 +1,81 @@
+{{ config(
+    materialized = 'incremental',
+    unique_key = 'batch_id',
+    incremental_strategy = 'delete+insert',
+    cluster_by = ['bin_width_cv', 'batch_id'],
+    on_schema_change = 'append_new_columns'
+) }}
+
+-- one row per batch, cv bin and resolution, so overlays of historical batches fetch a few thousand rows per batch
+-- instead of every trend point. incremental runs rebuild only the batches with trend points loaded since the last run
+WITH bin_widths AS (
+    {% for bin_width_cv in var('trend_cv_bin_widths', [0.01, 0.05, 0.25]) %}
+    SELECT {{ bin_width_cv }}::NUMBER(10, 4) AS bin_width_cv
+    {% if not loop.last %}UNION ALL{% endif %}
+    {% endfor %}
+),
+
+trend_points AS (
+    SELECT
+        tb.batch_id,
+        tb.chrom_id,
+        tb.recipe_name,
+        tb.run_number,
+        tb.phase_name,
+        tb.reading_ts,
+        tb.batch_tot_cv,
+        tb.uv_mau,
+        tb.flow_rate_lpm,
+        tb.pressure_bar,
+        tb.ph,
+        tb.cond_ms_cm,
+        tb.load_time
+    FROM {{ ref('trend_base') }} tb
+    WHERE tb.batch_id IS NOT NULL
+    AND tb.batch_tot_cv IS NOT NULL
+    {% if is_incremental() %}
+    AND tb.batch_id IN (
+        SELECT DISTINCT batch_id
+        FROM {{ ref('trend_base') }}
+        WHERE load_time > (SELECT MAX(load_time) FROM {{ this }})
+    )
+    {% endif %}
+)
+
+SELECT
+    {{ dbt_utils.generate_surrogate_key([
+        "tp.batch_id",
+        "bw.bin_width_cv",
+        "FLOOR(tp.batch_tot_cv / bw.bin_width_cv)"
+    ]) }} AS trend_cv_bin_id,
+    tp.batch_id,
+    bw.bin_width_cv,
+    FLOOR(tp.batch_tot_cv / bw.bin_width_cv) * bw.bin_width_cv AS cv_bin_start,
+    ANY_VALUE(tp.chrom_id) AS chrom_id,
+    ANY_VALUE(tp.recipe_name) AS recipe_name,
+    ANY_VALUE(tp.run_number) AS run_number,
+    MIN_BY(tp.phase_name, tp.reading_ts) AS phase_name,
+    COUNT(*) AS point_count,
+    AVG(tp.batch_tot_cv) AS batch_tot_cv,
+    MIN(tp.uv_mau) AS uv_mau_min,
+    MAX(tp.uv_mau) AS uv_mau_max,
+    AVG(tp.uv_mau) AS uv_mau_mean,
+    MIN(tp.flow_rate_lpm) AS flow_rate_lpm_min,
+    MAX(tp.flow_rate_lpm) AS flow_rate_lpm_max,
+    AVG(tp.flow_rate_lpm) AS flow_rate_lpm_mean,
+    MIN(tp.pressure_bar) AS pressure_bar_min,
+    MAX(tp.pressure_bar) AS pressure_bar_max,
+    AVG(tp.pressure_bar) AS pressure_bar_mean,
+    MIN(tp.ph) AS ph_min,
+    MAX(tp.ph) AS ph_max,
+    AVG(tp.ph) AS ph_mean,
+    MIN(tp.cond_ms_cm) AS cond_ms_cm_min,
+    MAX(tp.cond_ms_cm) AS cond_ms_cm_max,
+    AVG(tp.cond_ms_cm) AS cond_ms_cm_mean,
+    MAX(tp.load_time) AS load_time
+FROM trend_points tp
+CROSS JOIN bin_widths bw
+GROUP BY
+    tp.batch_id,
+    bw.bin_width_cv,
+    FLOOR(tp.batch_tot_cv / bw.bin_width_cv)
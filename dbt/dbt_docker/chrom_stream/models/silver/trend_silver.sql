@@ -20,6 +20,8 @@ SELECT
     raw:cond_mScm::FLOAT AS cond_ms_cm,
     raw:totalized_volume_ml::FLOAT / 1000 AS totalized_vol_l,
     raw:totalized_column_volumes::FLOAT AS totalized_cv,
+    raw:phase_column_volumes::FLOAT AS phase_totalized_cv,
+    raw:phase_uv_auc::FLOAT AS phase_uv_auc,
     source_file,
     load_time
 FROM {{ source('bronze', 'trend_raw') }}
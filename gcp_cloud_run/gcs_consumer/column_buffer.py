@@ -0,0 +1,214 @@
+import sys
+import time
+import queue
+import array
+import threading
+from typing import Callable
+
+class ColumnBuffer:
+    """
+    Append-only columnar buffer of trend data points for one chromatography unit.
+    Numeric fields are stored in typed arrays (8 bytes per value) and text fields in lists of interned strings,
+    instead of one dict per data point.
+
+    Params:
+        chrom_unit (str): Chromatography unit the buffered points belong to
+        late (bool): Whether the buffer holds late points that arrived behind the unit's reorder window
+
+    Methods:
+        append: Add a data point to the buffer
+        to_table: Build a pyarrow Table from the buffered columns
+        age_sec: Seconds since the first point was buffered
+    """
+
+    def __init__(self, chrom_unit: str, late: bool = False):
+        self.chrom_unit = chrom_unit
+        self.late = late
+        self.columns = {}
+        self.size = 0
+        self.last_time_iso = None
+        self.created_ts = time.monotonic()
+
+    def append(self, data: dict) -> None:
+        """ Add a data point to the buffer """
+
+        for key, value in data.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self._new_column(value)
+                self.columns[key] = column
+            try:
+                column.append(sys.intern(value) if isinstance(value, str) else value)
+            except (TypeError, OverflowError):
+                # value does not fit the typed array, e.g. a float in an int column
+                column = self.columns[key] = list(column)
+                column.append(value)
+
+        self.size += 1
+        # points missing a column keep every column the same length
+        for key, column in self.columns.items():
+            if len(column) < self.size:
+                if not isinstance(column, list):
+                    column = self.columns[key] = list(column)
+                column.extend([None] * (self.size - len(column)))
+
+        self.last_time_iso = data.get("time_iso", self.last_time_iso)
+
+    def to_table(self) -> "pa.Table":
+        """ Build a pyarrow Table from the buffered columns """
+        # imported on the first flush rather than at consumer boot
+        import numpy as np
+        import pyarrow as pa
+
+        arrays = {}
+        for key, column in self.columns.items():
+            if isinstance(column, array.array):
+                arrays[key] = pa.array(np.frombuffer(column, dtype=np.float64 if column.typecode == "d" else np.int64))
+            else:
+                arrays[key] = pa.array(column)
+
+        return pa.table(arrays)
+
+    def age_sec(self) -> float:
+        """ Seconds since the first point was buffered """
+
+        return time.monotonic() - self.created_ts
+
+    def _new_column(self, value):
+        # columns joining after the first point are padded with nulls
+        if self.size > 0:
+            return [None] * self.size
+        if isinstance(value, float):
+            return array.array("d")
+        if isinstance(value, int) and not isinstance(value, bool):
+            return array.array("q")
+        return []
+
+
+class TrendBufferPool:
+    """
+    Per-unit columnar buffers flushed on size, on age and on shutdown.
+    Full buffers are swapped out on the request path and handed to a background upload thread, so encoding
+    and uploading never block a Pub/Sub request. A background flusher hands off buffers older than time_limit_sec,
+    bounding how long a slow unit's data waits before it is written.
+
+    Params:
+        flush_fn (Callable): Writes a flushed buffer, called as flush_fn(column_buffer)
+        size_limit (int): Number of buffered points that triggers a flush of a unit's buffer
+        time_limit_sec (float): Maximum age of a unit's buffer before it is flushed
+        check_interval_sec (float): How often the flusher checks buffer ages
+        max_retries (int): Number of times a failed flush is retried before its data is dropped
+        retry_backoff_sec (float): Delay before the first retry, doubled on each further retry
+
+    Methods:
+        append: Buffer a data point, flushing its unit's buffer when it is full, late points are buffered separately
+        flush_expired: Hand off every buffer older than time_limit_sec
+        flush_all: Hand off every buffer
+        close: Flush every buffer and wait for all uploads to finish
+        stats: Buffer counters
+    """
+
+    def __init__(self, flush_fn: Callable, size_limit: int = 1000, time_limit_sec: float = 900,
+                 check_interval_sec: float = 5.0, max_retries: int = 3, retry_backoff_sec: float = 1.0):
+        self.flush_fn = flush_fn
+        self.size_limit = size_limit
+        self.time_limit_sec = time_limit_sec
+        self.check_interval_sec = check_interval_sec
+        self.max_retries = max_retries
+        self.retry_backoff_sec = retry_backoff_sec
+        self.points_buffered = 0
+        self.points_flushed = 0
+        self.points_failed = 0
+        self.files_flushed = 0
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._uploads = queue.Queue()
+        self._closed = threading.Event()
+        self._uploader = threading.Thread(target=self._run_uploader, name="gcs-uploader", daemon=True)
+        self._flusher = threading.Thread(target=self._run_flusher, name="gcs-flusher", daemon=True)
+        self._uploader.start()
+        self._flusher.start()
+
+    def append(self, data: dict, late: bool = False) -> None:
+        """ Buffer a data point, flushing its unit's buffer when it is full """
+
+        chrom_unit = data["chrom_unit"]
+        key = (chrom_unit, late)
+        with self._lock:
+            column_buffer = self._buffers.get(key)
+            if column_buffer is None:
+                column_buffer = self._buffers[key] = ColumnBuffer(chrom_unit, late=late)
+            column_buffer.append(data)
+            self.points_buffered += 1
+            if column_buffer.size >= self.size_limit:
+                del self._buffers[key]
+                self._uploads.put(column_buffer)
+
+    def flush_expired(self) -> None:
+        """ Hand off every buffer older than time_limit_sec """
+
+        with self._lock:
+            expired = [key for key, column_buffer in self._buffers.items() if column_buffer.age_sec() >= self.time_limit_sec]
+            for key in expired:
+                self._uploads.put(self._buffers.pop(key))
+
+    def flush_all(self) -> None:
+        """ Hand off every buffer """
+
+        with self._lock:
+            for column_buffer in self._buffers.values():
+                self._uploads.put(column_buffer)
+            self._buffers = {}
+
+    def close(self) -> None:
+        """ Flush every buffer and wait for all uploads to finish """
+
+        self._closed.set()
+        self._flusher.join()
+        self.flush_all()
+        self._uploads.put(None)
+        self._uploader.join()
+
+    def stats(self) -> dict:
+        """ Buffer counters """
+
+        with self._lock:
+            pending = sum(column_buffer.size for column_buffer in self._buffers.values())
+        with self._stats_lock:
+            return {
+                "points_buffered": self.points_buffered,
+                "points_pending": pending,
+                "points_flushed": self.points_flushed,
+                "points_failed": self.points_failed,
+                "files_flushed": self.files_flushed
+            }
+
+    def _run_flusher(self):
+        """ Background thread flushing buffers on age """
+
+        while not self._closed.wait(timeout=self.check_interval_sec):
+            self.flush_expired()
+
+    def _run_uploader(self):
+        """ Background thread writing flushed buffers with retries """
+
+        while True:
+            column_buffer = self._uploads.get()
+            if column_buffer is None:
+                return
+
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.flush_fn(column_buffer)
+                    with self._stats_lock:
+                        self.points_flushed += column_buffer.size
+                        self.files_flushed += 1
+                    break
+                except Exception as e:
+                    if attempt < self.max_retries:
+                        time.sleep(self.retry_backoff_sec * 2 ** attempt)
+                    else:
+                        print(f"Error flushing {column_buffer.size} points for {column_buffer.chrom_unit}: {e}")
+                        with self._stats_lock:
+                            self.points_failed += column_buffer.size
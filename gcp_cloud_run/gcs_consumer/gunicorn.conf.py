@@ -0,0 +1,20 @@
+import os
+
+# Production server for push mode: gunicorn -c gunicorn.conf.py main:app
+# Each worker process holds its own reorder buffer, unit buffers and parquet writer, threads share them.
+# Threads should match the Cloud Run request concurrency so no push request queues behind another.
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 80))
+worker_class = "gthread"
+
+# Cloud Run enforces the request timeout, and allows 10 seconds between SIGTERM and SIGKILL
+timeout = 0
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT_SEC", 8))
+accesslog = None
+
+def worker_exit(server, worker):
+    """ Upload every buffered point once a worker has stopped serving requests """
+
+    from main import close_buffers
+    close_buffers()
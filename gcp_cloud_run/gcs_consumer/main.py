@@ -1,27 +1,48 @@
+import time
+BOOT_TS = time.perf_counter()
+
 import os
-import json
 import base64
-import io
-import pandas as pd
+import sys
+import signal
+import threading
 from flask import Flask, request
-from google.cloud import storage
-from google.cloud.storage.bucket import Bucket
+from column_buffer import ColumnBuffer, TrendBufferPool
+from reorder_buffer import ReorderBuffer
+from trend_codec import decode_trend
+from request_metrics import RequestMetrics, StartupTimer, instrument_app
+
+# the storage client, pyarrow and the pub/sub client are imported on first use, off the path to the first ack
+STARTUP = StartupTimer(BOOT_TS)
+STARTUP.mark("imports")
 
 # GCP CONFIG
 PROJECT_ID = os.environ["GCP_PROJECT_ID"]
+# push: one Pub/Sub push request per message, pull: streaming pull subscriber with batched processing and acks
+CONSUMER_MODE = os.environ.get("CONSUMER_MODE", "push")
 GCS_BUCKET = os.environ["GCS_TREND_BUCKET"]
-gcs_client = storage.Client()
-BUCKET = gcs_client.bucket(GCS_BUCKET)
+# import the storage client and pyarrow in the background at boot so the first flush does not wait for them
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "true").lower() == "true"
 
 # INITIALIZE GLOBALS
-BUFFER_TIME_LIMIT = 900 # 15 minutes
-BUFFER_SIZE_LIMIT = 1000 # records
-BUFFER = {}
+# unit buffers become parquet row groups, row groups are rolled into files per partition
+BUFFER_TIME_LIMIT = int(os.environ.get("BUFFER_TIME_LIMIT", 60)) # 1 minute
+BUFFER_SIZE_LIMIT = int(os.environ.get("BUFFER_SIZE_LIMIT", 10000)) # records
+PARQUET_TARGET_FILE_ROWS = int(os.environ.get("PARQUET_TARGET_FILE_ROWS", 500000))
+# 2 minutes, the event mode dbt dag's check interval, so new rows reach bronze within a few minutes
+PARQUET_MAX_FILE_AGE_SEC = float(os.environ.get("PARQUET_MAX_FILE_AGE_SEC", 120))
+PARQUET_COMPRESSION = os.environ.get("PARQUET_COMPRESSION", "zstd")
+REORDER_WINDOW_SEC = float(os.environ.get("REORDER_WINDOW_SEC", 5))
+REORDER_MAX_SIZE = int(os.environ.get("REORDER_MAX_SIZE", 1000)) # events per unit
+REORDER_MAX_HOLD_SEC = float(os.environ.get("REORDER_MAX_HOLD_SEC", 2))
 last_timestamp_ns = {}
 last_flow_rate = {}
 totalized_volume_ml = {}
+TOTALIZER_LOCK = threading.Lock()
 
 app = Flask(__name__)
+METRICS = RequestMetrics(report_every_sec=float(os.environ.get("METRICS_REPORT_INTERVAL_SEC", 60)), boot_ts=BOOT_TS)
+instrument_app(app, METRICS)
 
 # Cloud Run HTTP entry point
 @app.route("/", methods=["POST"])
@@ -36,8 +57,8 @@ def receive_pubsub_message():
     msg = envelope["message"]
 
     try:
-        data = base64.b64decode(msg["data"]).decode("utf-8")
-        event = json.loads(data)
+        # compact struct messages name their encoding in the attributes, json otherwise
+        event = decode_trend(base64.b64decode(msg["data"]), msg.get("attributes"))
 
         # handle only new data for streaming
         process_data(event)
@@ -48,76 +69,177 @@ def receive_pubsub_message():
         return f"Interal error: {e}", 500
 
 
+writer = None
+writer_lock = threading.Lock()
+
+def get_writer():
+    """ Rolling parquet writer of the trend bucket, created with the storage client on first use and shared by all threads """
+    global writer
+
+    with writer_lock:
+        if writer is None:
+            from google.cloud import storage
+            from parquet_writer import RollingParquetWriter
+            writer = RollingParquetWriter(
+                storage.Client().bucket(GCS_BUCKET),
+                prefix="raw/trend",
+                target_file_rows=PARQUET_TARGET_FILE_ROWS,
+                row_group_size=BUFFER_SIZE_LIMIT,
+                max_file_age_sec=PARQUET_MAX_FILE_AGE_SEC,
+                compression=PARQUET_COMPRESSION
+            )
+
+    return writer
+
+def flush_buffer(column_buffer: ColumnBuffer) -> None:
+    """ Append a flushed unit buffer as a row group to its partition's rolling parquet file """
+
+    partition = {"chrom_unit": column_buffer.chrom_unit, "date": column_buffer.last_time_iso[:10]}
+    # late points behind the reorder window go to their own files so regular files stay sorted
+    if column_buffer.late:
+        partition["arrival"] = "late"
+    get_writer().write_table(column_buffer.to_table(), partition)
+
+BUFFER = TrendBufferPool(flush_fn=flush_buffer, size_limit=BUFFER_SIZE_LIMIT, time_limit_sec=BUFFER_TIME_LIMIT)
+
+# points reach the buffers sorted and deduplicated per unit
+REORDER_BUFFER = ReorderBuffer(
+    release_fn=BUFFER.append,
+    window_ns=int(REORDER_WINDOW_SEC * 1e9),
+    max_size=REORDER_MAX_SIZE,
+    max_hold_sec=REORDER_MAX_HOLD_SEC,
+    on_late=lambda data: BUFFER.append(data, late=True)
+)
+
 def process_data(data: dict) -> None:
     """ Triggered automatically whenever a Pub/Sub message arrives """
-    
-    chrom_unit = data["chrom_unit"]
-
-    if chrom_unit not in BUFFER:
-        BUFFER[chrom_unit] = []
-    BUFFER[chrom_unit].append(data)
-
-    if len(BUFFER[chrom_unit]) >= BUFFER_SIZE_LIMIT:
-        parquet_to_gcs(
-            data=pd.DataFrame(BUFFER[chrom_unit]),
-            gcs_file_path=f"raw/{chrom_unit}/{chrom_unit}_trends_{data['time_iso'].replace(':', '-')}.parquet",
-            bucket=BUCKET
-        ) 
-        BUFFER[chrom_unit] = []
-        
+
+    REORDER_BUFFER.push(data["chrom_unit"], int(data["time_ns"]), data)
+
+def process_batch(events: list) -> list:
+    """ Buffer a batch of pulled trend data points """
+
+    return [process_data(event) for event in events]
+
+def run_pull_subscriber() -> None:
+    """ Consume the trend subscription with a streaming pull instead of push requests """
+    global pull_subscriber
+    from pull_subscriber import PullSubscriber
+
+    pull_subscriber = PullSubscriber(
+        subscription_path=f"projects/{PROJECT_ID}/subscriptions/{os.environ['PUBSUB_SUBSCRIPTION_ID']}",
+        process_batch_fn=process_batch,
+        batch_size=int(os.environ.get("PULL_BATCH_SIZE", 500)),
+        max_latency_sec=float(os.environ.get("PULL_MAX_LATENCY_SEC", 0.2)),
+        flow_control_messages=int(os.environ.get("PULL_FLOW_CONTROL_MESSAGES", 5000)),
+        flow_control_bytes=int(os.environ.get("PULL_FLOW_CONTROL_BYTES", 100 * 1024 * 1024))
+    )
+    pull_subscriber.run()
+
+pull_subscriber = None
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """ Request latency and buffer counters of this worker process """
+
+    return {"requests": METRICS.stats(), "reorder": REORDER_BUFFER.stats(), "buffers": BUFFER.stats(),
+            "writer": writer.stats() if writer is not None else None}
+
+@app.route("/warmup", methods=["GET"])
+def warm_up():
+    """ Create the parquet writer and its storage client, usable as a Cloud Run startup probe """
+
+    start_ts = time.perf_counter()
+    get_writer()
+    # pyarrow table building is imported lazily by the column buffers
+    ColumnBuffer("warmup").to_table()
+
+    return {"warmup_sec": round(time.perf_counter() - start_ts, 3)}
+
+def close_buffers() -> None:
+    """
+    Stop pulling and upload every buffered point, called on SIGTERM and by gunicorn when a worker exits.
+    Raises if parquet files could not be uploaded, they are lost with the instance's disk.
+    """
+
+    if pull_subscriber is not None:
+        pull_subscriber.stop()
+    REORDER_BUFFER.close()
+    print(f"Reorder buffer closed: {REORDER_BUFFER.stats()}")
+    BUFFER.close()
+    print(f"Trend buffers closed: {BUFFER.stats()}")
+    close_error = None
+    if writer is not None:
+        try:
+            writer.close()
+        except Exception as e:
+            close_error = e
+            print(f"Error closing parquet writer, trend rows were not uploaded: {e}")
+        print(f"Parquet writer closed: {writer.stats()}")
+    print(f"Request metrics: {METRICS.stats()}")
+    if close_error is not None:
+        raise close_error
+
+def shutdown(signum, frame) -> None:
+    """ Upload every buffered point before Cloud Run stops the container """
+
+    print(f"Received signal {signum}, flushing trend buffers")
+    try:
+        close_buffers()
+    except Exception:
+        sys.exit(1)
+    sys.exit(0)
+
+STARTUP.mark("buffers")
+if WARMUP_ON_START:
+    threading.Thread(target=lambda: app.test_client().get("/warmup"), name="warmup", daemon=True).start()
+STARTUP.report()
+
 # deprecated: totalized volume calculations done downstream of streaming
 def handle_event(event: dict) -> None:
     """ Process individual event from Pub/Sub """
     global last_timestamp_ns, last_flow_rate, totalized_volume_ml
 
-    # Calculate totalized volume
-    chrom_unit = event["chrom_unit"]
-    cur_ts = int(event["time_ns"])
-    cur_flow = event["flow_mL_min"]
-
-    last_ts = last_timestamp_ns.get(chrom_unit, None)
-    last_flow = last_flow_rate.get(chrom_unit, 0)
-    if chrom_unit not in totalized_volume_ml:
-        totalized_volume_ml[chrom_unit] = 0.0
-
-    if last_ts is not None:
-        # Calculate time difference in minutes
-        delta_min = (cur_ts - last_ts) / 1e9 / 60.0
-        # Average flow rate between last and current
-        avg_flow = (last_flow + cur_flow) / 2.0
-        # Calculate volume added since last event
-        delta_vol = avg_flow * delta_min
-        totalized_volume_ml[chrom_unit] += delta_vol
-
-    # Calculate totalized column volumes (assuming 226 L column volume)
-    tot_col_vol = totalized_volume_ml[chrom_unit] / 1000.0 / 226 
-
-    last_timestamp_ns[chrom_unit] = cur_ts
-    last_flow_rate[chrom_unit] = cur_flow
-
-    # Add calculations to event
-    event["totalized_volume_ml"] = totalized_volume_ml[chrom_unit]
-    event["totalized_column_volumes"] = tot_col_vol
+    # request threads share the per-unit totals
+    with TOTALIZER_LOCK:
+        # Calculate totalized volume
+        chrom_unit = event["chrom_unit"]
+        cur_ts = int(event["time_ns"])
+        cur_flow = event["flow_mL_min"]
+
+        last_ts = last_timestamp_ns.get(chrom_unit, None)
+        last_flow = last_flow_rate.get(chrom_unit, 0)
+        if chrom_unit not in totalized_volume_ml:
+            totalized_volume_ml[chrom_unit] = 0.0
+
+        if last_ts is not None:
+            # Calculate time difference in minutes
+            delta_min = (cur_ts - last_ts) / 1e9 / 60.0
+            # Average flow rate between last and current
+            avg_flow = (last_flow + cur_flow) / 2.0
+            # Calculate volume added since last event
+            delta_vol = avg_flow * delta_min
+            totalized_volume_ml[chrom_unit] += delta_vol
+
+        # Calculate totalized column volumes (assuming 226 L column volume)
+        tot_col_vol = totalized_volume_ml[chrom_unit] / 1000.0 / 226 
+
+        last_timestamp_ns[chrom_unit] = cur_ts
+        last_flow_rate[chrom_unit] = cur_flow
+
+        # Add calculations to event
+        event["totalized_volume_ml"] = totalized_volume_ml[chrom_unit]
+        event["totalized_column_volumes"] = tot_col_vol
 
     return event
 
-def parquet_to_gcs(data: pd.DataFrame, gcs_file_path: str, bucket: Bucket, verbose: bool = True) -> None:
-    """ Upload local parquet file to GCS bucket """
-    
-    # Create an in-memory bytes buffer
-    buffer = io.BytesIO()
-    data.to_parquet(buffer, index=False)
-
-    # Reset buffer pointer before upload
-    buffer.seek(0)
-
-    # Upload to GCS bucket
-    blob = bucket.blob(gcs_file_path)
-    blob.upload_from_file(buffer, content_type="application/octet-stream")
-
-    if verbose:
-        print(f"Uploaded {len(data)} rows to GCS at path: {gcs_file_path}")
-
 if __name__ == "__main__":
+    # gunicorn (gunicorn.conf.py) serves push mode in production and flushes through its worker_exit hook
+    signal.signal(signal.SIGTERM, shutdown)
     port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port)
\ No newline at end of file
+    if CONSUMER_MODE == "pull":
+        # keep serving on PORT for Cloud Run health checks while the subscriber pulls
+        threading.Thread(target=app.run, kwargs={"host": "0.0.0.0", "port": port}, daemon=True).start()
+        run_pull_subscriber()
+    else:
+        app.run(host="0.0.0.0", port=port)
\ No newline at end of file
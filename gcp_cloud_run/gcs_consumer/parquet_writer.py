@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime, timezone
+from typing import Callable
+
+class RollingParquetWriter:
+    """
+    Rolling Parquet writer producing right-sized files under Hive-style partition paths in a GCS bucket.
+    Rows are grouped by partition, encoded into row groups of row_group_size rows and spooled to a local file per
+    partition, so memory holds at most one pending row group per partition. A partition's file is closed and uploaded
+    once it reaches target_file_rows or target_file_bytes, or max_file_age_sec after its first row, bounding both
+    object counts and the latency until the data lands in the bucket.
+
+    Files are written to <prefix>/<key>=<value>/.../part-<writer_id>-<seq>.parquet and every uploaded file is recorded
+    in its own manifest entry <prefix>/_manifests/<writer_id>/<seq>.json, so manifest writes stay constant in size.
+    Closed files are uploaded by the background thread outside the writer lock, so writes never wait on the bucket.
+    Files whose upload fails stay spooled and are retried on the next upload pass and on close, close raises if any
+    file is still not uploaded after its retries, so the caller can report data left on local disk.
+
+    Params:
+        bucket (Bucket): GCS bucket, or a LocalBucket, the files are uploaded to
+        prefix (str): Object path prefix, e.g. raw/phase
+        partition_fn (Callable): Returns the ordered partition values of a row as a dict, no partitions when None
+        target_file_rows (int): Number of rows that closes a file
+        target_file_bytes (int): Encoded size that closes a file
+        row_group_size (int): Number of rows per Parquet row group
+        max_file_age_sec (float): Maximum time since a file's first row before it is closed
+        compression (str): Parquet compression codec
+        use_dictionary (bool): Whether to dictionary encode columns
+        spool_dir (str): Directory for files being written, the system temp directory when None
+
+    Methods:
+        write_rows: Buffer rows as dicts, grouped by partition
+        write_table: Append a pyarrow Table to a partition's file
+        roll_expired: Close and upload every file older than max_file_age_sec
+        close: Close and upload every file and stop the background roller, raises if an upload keeps failing
+        stats: Writer counters
+    """
+
+    def __init__(self, bucket, prefix: str, partition_fn: Callable = None, target_file_rows: int = 500000,
+                 target_file_bytes: int = 128 * 1024 * 1024, row_group_size: int = 10000, max_file_age_sec: float = 300.0,
+                 compression: str = "zstd", use_dictionary: bool = True, spool_dir: str = None):
+        if row_group_size < 1 or target_file_rows < 1:
+            raise ValueError("Error with row_group_size or target_file_rows argument: must be at least 1")
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+        self.partition_fn = partition_fn
+        self.target_file_rows = target_file_rows
+        self.target_file_bytes = target_file_bytes
+        self.row_group_size = row_group_size
+        self.max_file_age_sec = max_file_age_sec
+        self.compression = compression
+        self.use_dictionary = use_dictionary
+        self.spool_dir = spool_dir
+        self.writer_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.files_written = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._file_seq = 0
+        self._uploads = []
+        self._partitions = {}
+        self._lock = threading.RLock()
+        # one upload pass at a time, between the background thread and close
+        self._upload_lock = threading.Lock()
+        self._upload_ready = threading.Event()
+        self._closed = threading.Event()
+        self._roller = threading.Thread(target=self._run_roller, name="parquet-roller", daemon=True)
+        self._roller.start()
+
+    def write_rows(self, rows: list) -> None:
+        """ Buffer rows as dicts, writing a row group whenever a partition has row_group_size pending rows """
+
+        with self._lock:
+            for row in rows:
+                part = self._get_partition(self.partition_fn(row) if self.partition_fn else {})
+                part.pending.append(row)
+                if len(part.pending) >= self.row_group_size:
+                    self._write_pending(part)
+                    self._roll_if_full(part)
+
+    def write_table(self, table: pa.Table, partition: dict = None) -> None:
+        """ Append a pyarrow Table to the file of a partition """
+
+        with self._lock:
+            part = self._get_partition(partition or {})
+            self._write_pending(part)
+            self._append_table(part, table)
+            self._roll_if_full(part)
+
+    def roll_expired(self) -> None:
+        """ Close and upload every file older than max_file_age_sec """
+
+        now = time.monotonic()
+        with self._lock:
+            for part in list(self._partitions.values()):
+                if part.opened_ts is not None and now - part.opened_ts >= self.max_file_age_sec:
+                    self._roll(part)
+
+    def close(self, max_retries: int = 3, retry_backoff_sec: float = 0.5) -> None:
+        """
+        Close and upload every file and stop the background roller.
+        Failed uploads are retried max_retries times with exponential backoff, a RuntimeError naming the spooled
+        files is raised if any are still not uploaded.
+        """
+
+        self._closed.set()
+        self._upload_ready.set()
+        self._roller.join()
+        with self._lock:
+            for part in list(self._partitions.values()):
+                self._roll(part)
+        self._upload_closed_files()
+
+        for attempt in range(max_retries):
+            if not self._uploads:
+                return
+            time.sleep(retry_backoff_sec * 2 ** attempt)
+            self._upload_closed_files()
+        if self._uploads:
+            spool_paths = [upload["spool_path"] for upload in self._uploads]
+            raise RuntimeError(f"Failed to upload {len(spool_paths)} parquet files on close, left spooled at: {spool_paths}")
+
+    def stats(self) -> dict:
+        """ Writer counters """
+
+        with self._lock:
+            return {
+                "files_written": self.files_written,
+                "rows_written": self.rows_written,
+                "bytes_written": self.bytes_written,
+                "open_files": sum(1 for part in self._partitions.values() if part.opened_ts is not None),
+                "pending_uploads": len(self._uploads)
+            }
+
+    def _get_partition(self, partition):
+        """ Open file state of a partition, keyed by its path """
+
+        partition_path = "/".join(f"{key}={value}" for key, value in partition.items())
+        part = self._partitions.get(partition_path)
+        if part is None:
+            part = self._partitions[partition_path] = _PartitionFile(partition_path, partition)
+        if part.opened_ts is None:
+            part.opened_ts = time.monotonic()
+
+        return part
+
+    def _write_pending(self, part):
+        """ Encode a partition's pending rows as a row group """
+
+        if part.pending:
+            table = pa.Table.from_pylist(part.pending)
+            part.pending = []
+            self._append_table(part, table)
+
+    def _append_table(self, part, table):
+        """ Write a table to the partition's spool file, starting a new file if the schema changed """
+
+        if part.writer is not None and not table.schema.equals(part.writer.schema):
+            try:
+                if set(table.schema.names) != set(part.writer.schema.names):
+                    raise ValueError("columns differ from the open file")
+                table = table.select(part.writer.schema.names).cast(part.writer.schema)
+            except (ValueError, pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                # incompatible columns cannot share a file
+                self._roll(part)
+                part.opened_ts = time.monotonic()
+        if part.writer is None:
+            fd, part.spool_path = tempfile.mkstemp(suffix=".parquet", dir=self.spool_dir)
+            os.close(fd)
+            part.writer = pq.ParquetWriter(part.spool_path, table.schema, compression=self.compression,
+                                           use_dictionary=self.use_dictionary)
+        part.writer.write_table(table, row_group_size=self.row_group_size)
+        part.rows += table.num_rows
+
+    def _roll_if_full(self, part):
+        if part.rows >= self.target_file_rows or (part.spool_path and os.path.getsize(part.spool_path) >= self.target_file_bytes):
+            self._roll(part)
+
+    def _roll(self, part):
+        """ Close a partition's file and queue it for upload """
+
+        self._write_pending(part)
+        part.opened_ts = None
+        if part.writer is None:
+            return
+        part.writer.close()
+
+        self._file_seq += 1
+        object_path = "/".join(p for p in [self.prefix, part.partition_path, f"part-{self.writer_id}-{self._file_seq:06d}.parquet"] if p)
+        self._uploads.append({
+            "spool_path": part.spool_path,
+            "seq": self._file_seq,
+            "path": object_path,
+            "rows": part.rows,
+            "bytes": os.path.getsize(part.spool_path),
+            "partition": {key: str(value) for key, value in part.partition.items()}
+        })
+        part.writer = None
+        part.spool_path = None
+        part.rows = 0
+        self._upload_ready.set()
+
+    def _upload_closed_files(self):
+        """ Upload closed files with a manifest entry each, files that fail stay queued for the next attempt """
+
+        with self._upload_lock:
+            with self._lock:
+                uploads = list(self._uploads)
+            for upload in uploads:
+                try:
+                    with open(upload["spool_path"], "rb") as file:
+                        self.bucket.blob(upload["path"]).upload_from_file(file, content_type="application/octet-stream")
+                except Exception as e:
+                    print(f"Error uploading {upload['path']}, retrying on next upload pass: {e}")
+                    continue
+                os.remove(upload["spool_path"])
+                with self._lock:
+                    self._uploads.remove(upload)
+                    self.files_written += 1
+                    self.rows_written += upload["rows"]
+                    self.bytes_written += upload["bytes"]
+
+                entry = {
+                    "path": upload["path"],
+                    "rows": upload["rows"],
+                    "bytes": upload["bytes"],
+                    "partition": upload["partition"],
+                    "written_at": datetime.now(timezone.utc).isoformat()
+                }
+                try:
+                    self.bucket.blob(f"{self.prefix}/_manifests/{self.writer_id}/{upload['seq']:06d}.json").upload_from_string(
+                        json.dumps(entry), content_type="application/json"
+                    )
+                except Exception as e:
+                    print(f"Error uploading manifest entry of {upload['path']}: {e}")
+
+    def _run_roller(self):
+        """ Background thread closing files on age and uploading closed files """
+
+        while not self._closed.is_set():
+            self._upload_ready.wait(timeout=min(self.max_file_age_sec / 4, 5.0))
+            self._upload_ready.clear()
+            self.roll_expired()
+            self._upload_closed_files()
+
+
+class _PartitionFile:
+    """ Spool file state of one partition: pending rows, open Parquet writer and rows written to it """
+
+    def __init__(self, partition_path, partition):
+        self.partition_path = partition_path
+        self.partition = partition
+        self.pending = []
+        self.writer = None
+        self.spool_path = None
+        self.rows = 0
+        self.opened_ts = None
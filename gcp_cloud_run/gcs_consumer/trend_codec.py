@@ -0,0 +1,101 @@
+import json
+import struct
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+
+TREND_ENCODINGS = ["json", "struct"]
+ENCODING_ATTRIBUTE = "encoding"
+STRUCT_V1 = "trend-struct-v1"
+STRUCT_V2 = "trend-struct-v2"
+
+# fixed layout of a struct v2 message, little-endian:
+#   time_ns int64 | 5 sensor channels float64 | time_sec and 4 totalizer fields float64 | chrom_unit | phase
+# strings are a uint8 length followed by utf-8 bytes, an empty phase or a NaN field means the field was not set.
+# every number is stored at full precision, so a decoded point matches the JSON encoding exactly.
+# v1 packed the sensor channels as float32, it is still decoded for messages published before v2
+SENSOR_FIELDS = ["uv_mau", "cond_mScm", "ph", "flow_mL_min", "pressure_bar"]
+TOTALIZER_FIELDS = ["totalized_volume_ml", "totalized_column_volumes", "phase_column_volumes", "phase_uv_auc"]
+_V1_NUMBERS = struct.Struct("<q5f5d")
+_V2_NUMBERS = struct.Struct("<q10d")
+_STRUCT_NUMBERS = {STRUCT_V1: _V1_NUMBERS, STRUCT_V2: _V2_NUMBERS}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAN = float("nan")
+
+def to_time_ns(timestamp: datetime) -> int:
+    """ UTC epoch nanoseconds of a timezone-aware datetime, exact so struct messages rebuild the same time_iso """
+
+    return (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+
+def encode_trend(data_point: dict, encoding: str = "struct") -> tuple:
+    """ Serialize a trend data point for Pub/Sub, returns the message bytes and the attributes identifying the encoding """
+
+    if encoding == "json":
+        return json.dumps(data_point).encode("utf-8"), {}
+    if encoding != "struct":
+        raise ValueError(f"Error with encoding argument: must be one of {TREND_ENCODINGS}")
+
+    chrom_unit = data_point["chrom_unit"].encode("utf-8")
+    phase = (data_point.get("phase") or "").encode("utf-8")
+    data = b"".join([
+        _V2_NUMBERS.pack(
+            int(data_point["time_ns"]),
+            *[data_point[field] for field in SENSOR_FIELDS],
+            data_point["time_sec"],
+            *[data_point.get(field, _NAN) for field in TOTALIZER_FIELDS]
+        ),
+        bytes([len(chrom_unit)]), chrom_unit,
+        bytes([len(phase)]), phase
+    ])
+
+    return data, {ENCODING_ATTRIBUTE: STRUCT_V2}
+
+def decode_trend(data: bytes, attributes: dict = None) -> dict:
+    """
+    Deserialize a trend data point from Pub/Sub message bytes, using the encoding named in the message attributes.
+    Messages without an encoding attribute are JSON, as published by older generators.
+    Struct messages are rebuilt with the same keys as the JSON data point, time_min and time_iso are derived from
+    time_sec and time_ns.
+    """
+
+    encoding = (attributes or {}).get(ENCODING_ATTRIBUTE)
+    if encoding is None:
+        return json.loads(data)
+    numbers_struct = _STRUCT_NUMBERS.get(encoding)
+    if numbers_struct is None:
+        raise ValueError(f"Unsupported trend message encoding: {encoding}")
+
+    numbers = numbers_struct.unpack_from(data)
+    offset = numbers_struct.size
+    unit_len = data[offset]
+    chrom_unit = data[offset + 1:offset + 1 + unit_len].decode("utf-8")
+    offset += 1 + unit_len
+    phase_len = data[offset]
+    phase = data[offset + 1:offset + 1 + phase_len].decode("utf-8")
+
+    time_ns = numbers[0]
+    time_sec = numbers[6]
+    data_point = {"time_sec": time_sec, "time_min": time_sec / 60}
+    data_point.update(zip(SENSOR_FIELDS, numbers[1:6]))
+    if phase:
+        data_point["phase"] = phase
+    data_point["time_iso"] = _time_iso(time_ns)
+    data_point["time_ns"] = time_ns
+    data_point["chrom_unit"] = chrom_unit
+    for field, value in zip(TOTALIZER_FIELDS, numbers[7:]):
+        if value == value:
+            data_point[field] = value
+
+    return data_point
+
+def _time_iso(time_ns):
+    """ datetime.isoformat() of a UTC epoch nanosecond timestamp, formatting only the seconds of each point """
+
+    seconds, microseconds = divmod(time_ns // 1000, 10**6)
+    minute_prefix = _minute_iso_prefix(seconds // 60)
+    if microseconds:
+        return f"{minute_prefix}:{seconds % 60:02d}.{microseconds:06d}+00:00"
+    return f"{minute_prefix}:{seconds % 60:02d}+00:00"
+
+@lru_cache(maxsize=4096)
+def _minute_iso_prefix(epoch_minute):
+    return (_EPOCH + timedelta(minutes=epoch_minute)).isoformat()[:16]
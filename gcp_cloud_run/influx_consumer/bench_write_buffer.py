@@ -0,0 +1,122 @@
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from write_buffer import InfluxWriteBuffer, to_line_protocol
+
+class WriteHandler(BaseHTTPRequestHandler):
+    """ Stand-in for the influxdb write endpoint, counts requests and line protocol records """
+
+    latency_sec = 0.0
+    # writes handled at once, like the connection pool and rate limits in front of influxdb
+    write_slots = threading.Semaphore(4)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.write_slots:
+            time.sleep(self.latency_sec)
+        with self.server.lock:
+            self.server.write_requests += 1
+            self.server.records += body.count(b"\n") + 1
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class WriteServer(ThreadingHTTPServer):
+    # accept every concurrent push worker without resetting connections
+    request_queue_size = 1024
+    daemon_threads = True
+
+def start_server(latency_sec, write_slots):
+    """ Start the stand-in write server on a free local port """
+
+    WriteHandler.latency_sec = latency_sec
+    WriteHandler.write_slots = threading.Semaphore(write_slots)
+    server = WriteServer(("127.0.0.1", 0), WriteHandler)
+    server.lock = threading.Lock()
+    server.write_requests = 0
+    server.records = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+def post_records(url, records):
+    """ Write line protocol records in one HTTP request """
+
+    request = urllib.request.Request(url, data="\n".join(records).encode("utf-8"), method="POST")
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+def make_points(n_points, n_units):
+    """ Line protocol records for n_points trend points spread over n_units chromatography units """
+
+    start_ns = time.time_ns()
+    return [
+        to_line_protocol({
+            "chrom_unit": f"CHR-{i % n_units:03d}", "time_ns": start_ns + i * 10**8, "time_sec": i * 0.1,
+            "uv_mau": 12.5, "cond_mScm": 4.2, "ph": 7.1, "flow_mL_min": 1500.0, "pressure_bar": 1.8
+        })
+        for i in range(n_points)
+    ]
+
+def run_case(name, records, concurrency, latency_sec, write_slots, submit):
+    """ Push records through submit from concurrent request workers, like Cloud Run push deliveries """
+
+    server = start_server(latency_sec, write_slots)
+    url = f"http://127.0.0.1:{server.server_port}/api/v2/write"
+    write_buffer = submit(url)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(write_buffer, records))
+    elapsed_sec = time.perf_counter() - start
+    server.shutdown()
+
+    return {
+        "case": name,
+        "points": len(records),
+        "elapsed_sec": round(elapsed_sec, 3),
+        "points_per_sec": round(len(records) / elapsed_sec, 1),
+        "write_requests": server.write_requests,
+        "write_requests_per_sec": round(server.write_requests / elapsed_sec, 1)
+    }
+
+def main(n_points, concurrency, latency_sec, write_slots, batch_size, flush_interval_sec):
+    records = make_points(n_points, n_units=10)
+
+    def unbuffered(url):
+        return lambda record: post_records(url, [record])
+
+    buffers = []
+    def buffered(url):
+        buffer = InfluxWriteBuffer(write_fn=lambda batch: post_records(url, batch), max_batch_size=batch_size,
+                                   flush_interval_sec=flush_interval_sec, max_concurrent_writes=write_slots)
+        buffers.append(buffer)
+        # each request waits for its batch to be written, as the push handler does before acking
+        return lambda record: buffer.submit(record).result()
+
+    results = [
+        run_case("unbuffered", records, concurrency, latency_sec, write_slots, unbuffered),
+        run_case("buffered", records, concurrency, latency_sec, write_slots, buffered)
+    ]
+    for buffer in buffers:
+        buffer.close()
+    results[1]["buffer_stats"] = buffers[0].stats()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare unbuffered and buffered influxdb writes against a local stand-in server")
+    parser.add_argument("--points", type=int, default=5000, help="Number of trend points to write")
+    parser.add_argument("--concurrency", type=int, default=80, help="Concurrent push requests, Cloud Run defaults to 80")
+    parser.add_argument("--latency_ms", type=float, default=20.0, help="Simulated write round trip latency")
+    parser.add_argument("--write_slots", type=int, default=4, help="Writes the stand-in server handles at once")
+    parser.add_argument("--batch_size", type=int, default=5000, help="Write buffer flush size")
+    parser.add_argument("--flush_interval_sec", type=float, default=0.05, help="Write buffer flush interval")
+    args = parser.parse_args()
+
+    main(args.points, args.concurrency, args.latency_ms / 1000, args.write_slots, args.batch_size, args.flush_interval_sec)
@@ -17,6 +17,9 @@ gcloud services enable artifactregistry.googleapis.com cloudbuild.googleapis.com
 echo "Configuring Docker auth for Artifact Registry..."
 gcloud auth configure-docker "${GCP_REGION}-docker.pkg.dev"
 
+echo "Checking shared modules are in sync..."
+python3 "${CHROM_STREAM_HOME}/gcp_cloud_run/sync_shared_modules.py" --check
+
 echo "Building via Google Cloud Build..."
 gcloud builds submit "${CHROM_STREAM_HOME}/gcp_cloud_run/influx_consumer" --tag "${IMAGE_PATH}"
 
@@ -0,0 +1,250 @@
+import csv
+import math
+from typing import Callable
+
+# trend data point fields scored for drift, with their golden_envelope column and the scale from stream to warehouse units
+DRIFT_SENSORS = {
+    "uv_mau": ("uv_mau", 1.0),
+    "cond_mScm": ("cond_ms_cm", 1.0),
+    "ph": ("ph", 1.0),
+    "flow_mL_min": ("flow_rate_lpm", 0.001),
+    "pressure_bar": ("pressure_bar", 1.0)
+}
+
+class GoldenEnvelope:
+    """
+    Golden batch profile of each recipe by cv bin, held in memory for O(1) lookups of a point's expected values.
+    Built from rows of the golden_envelope gold model, for example a CSV export of the table.
+
+    Params:
+        records (list): golden_envelope rows as dicts with recipe_name, bin_width_cv, cv_bin_start and the
+            <column>_mean and <column>_std of each sensor, column names in any case
+
+    Methods:
+        from_csv: Load an envelope from a CSV export of golden_envelope
+        bin_index: Index of the cv bin of a totalized column volume
+        lookup: Expected means and standard deviations of a recipe's cv bin
+    """
+
+    def __init__(self, records: list):
+        self.bin_width_cv = None
+        self.recipes = {}
+        columns = [column for column, _ in DRIFT_SENSORS.values()]
+        for record in records:
+            record = {key.lower(): value for key, value in record.items()}
+            bin_width_cv = float(record["bin_width_cv"])
+            if self.bin_width_cv is None:
+                self.bin_width_cv = bin_width_cv
+            elif not math.isclose(bin_width_cv, self.bin_width_cv):
+                raise ValueError("Error with records argument: all bins must have the same bin_width_cv")
+            # bins are stored densely by index, cv_bin_start is a multiple of the bin width
+            index = round(float(record["cv_bin_start"]) / bin_width_cv)
+            bins = self.recipes.setdefault(record["recipe_name"], [])
+            if len(bins) <= index:
+                bins.extend([None] * (index + 1 - len(bins)))
+            bins[index] = (
+                tuple(_to_float(record.get(f"{column}_mean")) for column in columns),
+                tuple(_to_float(record.get(f"{column}_std")) for column in columns)
+            )
+        if not self.recipes:
+            raise ValueError("Error with records argument: the envelope has no bins")
+
+    @classmethod
+    def from_csv(cls, path: str) -> "GoldenEnvelope":
+        """ Load an envelope from a CSV export of golden_envelope """
+
+        with open(path, newline="") as file:
+            return cls(list(csv.DictReader(file)))
+
+    def bin_index(self, batch_tot_cv: float) -> int:
+        """ Index of the cv bin of a totalized column volume """
+
+        return int(batch_tot_cv // self.bin_width_cv)
+
+    def lookup(self, recipe_name: str, bin_index: int):
+        """ Expected (means, stds) of a recipe's cv bin in DRIFT_SENSORS order, None outside the envelope """
+
+        bins = self.recipes.get(recipe_name)
+        if bins is None or not 0 <= bin_index < len(bins):
+            return None
+
+        return bins[bin_index]
+
+
+class DriftDetector:
+    """
+    Online drift detection of trend data points against a golden batch envelope.
+    Each point is placed in its cv bin by its streamed totalized_column_volumes and added to the running sums of the
+    unit's current bin, O(1) work per point. Once a unit moves on to the next bin, each sensor's mean over the finished
+    bin is scored as z = (bin mean - golden mean) / golden std, the same statistic the envelope was built from, and a
+    two-sided CUSUM and an EWMA of z are updated. An alert is raised when a CUSUM exceeds cusum_h, after which that
+    CUSUM restarts, or when the EWMA leaves ewma_limit standard deviations of the EWMA, raised again only after it
+    has returned. A unit's scores restart when its totalized column volumes go backwards, at the start of a new batch.
+    Points are expected per unit in time order.
+
+    Params:
+        envelope (GoldenEnvelope): Golden batch profile the points are compared against
+        alert_fn (Callable): Called with each alert event, alerts are only counted when None
+        unit_recipes (dict): Recipe of each chrom_unit, units not listed use default_recipe
+        default_recipe (str): Recipe of units missing from unit_recipes, the envelope's only recipe when None
+        ewma_lambda (float): Weight of the newest score in the EWMA, between 0 and 1
+        ewma_limit (float): EWMA alarm limit in asymptotic standard deviations of the EWMA
+        cusum_k (float): CUSUM allowance in standard deviations, half the shift to detect
+        cusum_h (float): CUSUM decision interval in standard deviations
+        min_std_fraction (float): Floor of a bin's std as a fraction of its mean, for bins from few golden batches
+
+    Methods:
+        update: Add a trend data point to its unit's bin, returns the alerts raised by scoring a finished bin
+        reset: Restart the scores of a unit
+        stats: Point and alert counters
+    """
+
+    def __init__(self, envelope: GoldenEnvelope, alert_fn: Callable = None, unit_recipes: dict = None,
+                 default_recipe: str = None, ewma_lambda: float = 0.2, ewma_limit: float = 3.0, cusum_k: float = 0.5,
+                 cusum_h: float = 5.0, min_std_fraction: float = 0.01):
+        if not 0 < ewma_lambda <= 1:
+            raise ValueError("Error with ewma_lambda argument: must be in (0, 1]")
+        if default_recipe is None and len(envelope.recipes) == 1:
+            default_recipe = next(iter(envelope.recipes))
+        self.envelope = envelope
+        self.alert_fn = alert_fn
+        self.unit_recipes = unit_recipes or {}
+        self.default_recipe = default_recipe
+        self.ewma_lambda = ewma_lambda
+        self.ewma_limit = ewma_limit * math.sqrt(ewma_lambda / (2 - ewma_lambda))
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.min_std_fraction = min_std_fraction
+        self.points = 0
+        self.bins_scored = 0
+        self.alerts = 0
+        self._sensors = [(field, scale) for field, (_, scale) in DRIFT_SENSORS.items()]
+        self._units = {}
+
+    def update(self, data_point: dict) -> list:
+        """ Add a trend data point to its unit's current cv bin, returns the alert events of the bin it finished """
+
+        self.points += 1
+        batch_tot_cv = data_point.get("totalized_column_volumes")
+        if batch_tot_cv is None:
+            return []
+        unit = data_point["chrom_unit"]
+        state = self._units.get(unit)
+        if state is None or batch_tot_cv < state.batch_tot_cv:
+            state = self._units[unit] = _UnitDrift(len(self._sensors))
+        state.batch_tot_cv = batch_tot_cv
+
+        alerts = []
+        bin_index = self.envelope.bin_index(batch_tot_cv)
+        if bin_index != state.bin_index:
+            if state.count:
+                alerts = self._score_bin(unit, state)
+            state.bin_index = bin_index
+            state.count = 0
+            state.sums = [0.0] * len(self._sensors)
+
+        sums = state.sums
+        for i, (field, scale) in enumerate(self._sensors):
+            sums[i] += data_point[field] * scale
+        state.count += 1
+        state.time_ns = data_point.get("time_ns")
+        state.time_iso = data_point.get("time_iso")
+
+        return alerts
+
+    def reset(self, unit: str) -> None:
+        """ Restart the scores of a unit """
+
+        self._units.pop(unit, None)
+
+    def stats(self) -> dict:
+        """ Point and alert counters """
+
+        return {"points": self.points, "bins_scored": self.bins_scored, "alerts": self.alerts, "units": len(self._units)}
+
+    def _score_bin(self, unit, state):
+        """ Update the CUSUMs and EWMAs of a unit with the sensor means of its finished bin """
+
+        expected = self.envelope.lookup(self.unit_recipes.get(unit, self.default_recipe), state.bin_index)
+        if expected is None:
+            return []
+        self.bins_scored += 1
+
+        alerts = []
+        means, stds = expected
+        ewma, cusum_high, cusum_low, ewma_alarm = state.ewma, state.cusum_high, state.cusum_low, state.ewma_alarm
+        lam, k, h, limit = self.ewma_lambda, self.cusum_k, self.cusum_h, self.ewma_limit
+        for i, (field, _) in enumerate(self._sensors):
+            mean = means[i]
+            if mean != mean:
+                continue
+            # bins from a single golden batch have no std
+            std = max(stds[i] if stds[i] == stds[i] else 0.0, abs(mean) * self.min_std_fraction, 1e-9)
+            value = state.sums[i] / state.count
+            z = (value - mean) / std
+
+            ewma[i] = lam * z + (1 - lam) * ewma[i]
+            high = cusum_high[i] = max(0.0, cusum_high[i] + z - k)
+            low = cusum_low[i] = max(0.0, cusum_low[i] - z - k)
+            if high > h:
+                alerts.append(self._alert(unit, state, field, "cusum_high", high, value, mean, std))
+                cusum_high[i] = 0.0
+            if low > h:
+                alerts.append(self._alert(unit, state, field, "cusum_low", low, value, mean, std))
+                cusum_low[i] = 0.0
+            if abs(ewma[i]) > limit:
+                if not ewma_alarm[i]:
+                    ewma_alarm[i] = True
+                    alerts.append(self._alert(unit, state, field, "ewma", ewma[i], value, mean, std))
+            else:
+                ewma_alarm[i] = False
+
+        if alerts:
+            self.alerts += len(alerts)
+            if self.alert_fn is not None:
+                for alert in alerts:
+                    self.alert_fn(alert)
+
+        return alerts
+
+    def _alert(self, unit, state, field, detector, score, value, mean, std):
+        # alerts are stamped with the last point of the bin that raised them
+        return {
+            "chrom_unit": unit,
+            "time_ns": state.time_ns,
+            "time_iso": state.time_iso,
+            "cv_bin_start": round(state.bin_index * self.envelope.bin_width_cv, 6),
+            "sensor": field,
+            "detector": detector,
+            "score": score,
+            "value": value,
+            "expected": mean,
+            "std": std
+        }
+
+
+class _UnitDrift:
+    """ Drift state of one unit: its last batch cv, the sensor sums of its current bin and the scores of each sensor """
+
+    __slots__ = ["batch_tot_cv", "bin_index", "count", "sums", "time_ns", "time_iso", "ewma", "cusum_high", "cusum_low",
+                 "ewma_alarm"]
+
+    def __init__(self, sensors):
+        self.batch_tot_cv = 0.0
+        self.bin_index = -1
+        self.count = 0
+        self.sums = [0.0] * sensors
+        self.time_ns = None
+        self.time_iso = None
+        self.ewma = [0.0] * sensors
+        self.cusum_high = [0.0] * sensors
+        self.cusum_low = [0.0] * sensors
+        self.ewma_alarm = [False] * sensors
+
+
+def _to_float(value):
+    """ Envelope value as float, NaN when missing """
+
+    if value is None or value == "":
+        return math.nan
+    return float(value)
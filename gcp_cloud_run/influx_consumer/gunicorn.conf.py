@@ -0,0 +1,20 @@
+import os
+
+# Production server for push mode: gunicorn -c gunicorn.conf.py main:app
+# Each worker process holds its own reorder and write buffers, threads share them and serve concurrent push requests.
+# Push requests hold their thread until their point's batched influxdb write, so threads should match the Cloud Run request concurrency.
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 80))
+worker_class = "gthread"
+
+# Cloud Run enforces the request timeout, and allows 10 seconds between SIGTERM and SIGKILL
+timeout = 0
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT_SEC", 8))
+accesslog = None
+
+def worker_exit(server, worker):
+    """ Write every buffered point once a worker has stopped serving requests """
+
+    from main import close_buffers
+    close_buffers()
@@ -1,27 +1,153 @@
+import time
+BOOT_TS = time.perf_counter()
+
 import os
+import sys
 import json
 import base64
+import signal
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from flask import Flask, request
-from influxdb_client_3 import InfluxDBClient3, Point
+from write_buffer import InfluxWriteBuffer, to_line_protocol, alert_to_line_protocol
+from reorder_buffer import ReorderBuffer
+from trend_codec import decode_trend
+from drift_detector import GoldenEnvelope, DriftDetector
+from request_metrics import RequestMetrics, StartupTimer, instrument_app
+
+# the influxdb and pub/sub clients are imported on first use, off the path to the first ack
+STARTUP = StartupTimer(BOOT_TS)
+STARTUP.mark("imports")
 
 # GCP CONFIG
 PROJECT_ID = os.environ["GCP_PROJECT_ID"]
+# push: one Pub/Sub push request per message, pull: streaming pull subscriber with batched processing and acks
+CONSUMER_MODE = os.environ.get("CONSUMER_MODE", "push")
+# create the influxdb client in the background at boot so the first write does not wait for it
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "true").lower() == "true"
 
 # INFLUXDB CONFIG
 TOKEN = os.environ["INFLUXDB_WRITE_TOKEN"]
 ORG = "Dev"
 HOST = "https://us-east-1-1.aws.cloud2.influxdata.com"
 DATABASE = os.environ["INFLUXDB_BUCKET"]
-influx_client = InfluxDBClient3(host=HOST, token=TOKEN, org=ORG)
+influx_client = None
+influx_client_lock = threading.Lock()
+
+# WRITE BUFFER CONFIG
+INFLUX_BATCH_SIZE = int(os.environ.get("INFLUX_BATCH_SIZE", 5000))
+# push requests hold their ack until the write, so each ordered unit advances about once per flush interval
+INFLUX_FLUSH_INTERVAL_SEC = float(os.environ.get("INFLUX_FLUSH_INTERVAL_SEC", 0.05 if CONSUMER_MODE == "push" else 0.5))
+INFLUX_MAX_RETRIES = int(os.environ.get("INFLUX_MAX_RETRIES", 3))
+# push requests wait this long for their batch to be written before nacking
+INFLUX_WRITE_TIMEOUT_SEC = float(os.environ.get("INFLUX_WRITE_TIMEOUT_SEC", 30))
+
+def get_influx_client():
+    """ Influxdb client created on first use and shared by all threads """
+    global influx_client
+
+    with influx_client_lock:
+        if influx_client is None:
+            from influxdb_client_3 import InfluxDBClient3
+            influx_client = InfluxDBClient3(host=HOST, token=TOKEN, org=ORG)
+
+    return influx_client
+
+def write_records(records: list) -> None:
+    """ Write a batch of line protocol records to influxdb in a single request """
+
+    get_influx_client().write(database=DATABASE, record=records)
+
+write_buffer = InfluxWriteBuffer(
+    write_fn=write_records,
+    max_batch_size=INFLUX_BATCH_SIZE,
+    flush_interval_sec=INFLUX_FLUSH_INTERVAL_SEC,
+    max_retries=INFLUX_MAX_RETRIES
+)
+
+# REORDER BUFFER CONFIG
+REORDER_WINDOW_SEC = float(os.environ.get("REORDER_WINDOW_SEC", 5))
+REORDER_MAX_SIZE = int(os.environ.get("REORDER_MAX_SIZE", 1000)) # events per unit
+REORDER_MAX_HOLD_SEC = float(os.environ.get("REORDER_MAX_HOLD_SEC", 2))
+# the ordered push subscription sends a unit's next point only once this one is acked, so in order points are
+# written at once instead of waiting out the reorder hold
+REORDER_RELEASE_IN_ORDER = os.environ.get("REORDER_RELEASE_IN_ORDER", str(CONSUMER_MODE == "push")).lower() == "true"
+
+def write_point(item: tuple) -> None:
+    """ Submit a released point to the write buffer and resolve its ack future once it is written """
+
+    data, ack_future = item
+    write_future = write_buffer.submit(to_line_protocol(data))
+    write_future.add_done_callback(lambda f: settle_point(data, ack_future, f.exception()))
+
+def settle_point(data: dict, ack_future: Future, error: Exception) -> None:
+    """ Resolve a point's ack future, a failed point is forgotten by the reorder buffer so its redelivery is written """
+
+    if error is None:
+        ack_future.set_result(None)
+        return
+    reorder_buffer.forget(data["chrom_unit"], int(data["time_ns"]))
+    ack_future.set_exception(error)
+
+# DRIFT DETECTION CONFIG
+# csv export of the golden_envelope gold model, drift detection is off when not set
+DRIFT_ENVELOPE_PATH = os.environ.get("DRIFT_ENVELOPE_PATH")
+DRIFT_ALERT_MEASUREMENT = os.environ.get("DRIFT_ALERT_MEASUREMENT", "drift_alert")
+
+def write_alert(alert: dict) -> None:
+    """ Write a drift alert to its own influxdb measurement, without holding any ack on it """
+
+    print(f"drift alert: {alert}")
+    write_buffer.submit(alert_to_line_protocol(alert, measurement=DRIFT_ALERT_MEASUREMENT))
+
+drift_detector = None
+if DRIFT_ENVELOPE_PATH:
+    drift_detector = DriftDetector(
+        GoldenEnvelope.from_csv(DRIFT_ENVELOPE_PATH),
+        alert_fn=write_alert,
+        # recipe of each chrom_unit as a json object, units not listed use the envelope's only recipe
+        unit_recipes=json.loads(os.environ.get("DRIFT_UNIT_RECIPES", "{}")),
+        ewma_lambda=float(os.environ.get("DRIFT_EWMA_LAMBDA", 0.2)),
+        ewma_limit=float(os.environ.get("DRIFT_EWMA_LIMIT", 3.0)),
+        cusum_k=float(os.environ.get("DRIFT_CUSUM_K", 0.5)),
+        cusum_h=float(os.environ.get("DRIFT_CUSUM_H", 5.0))
+    )
+
+def release_point(item: tuple) -> None:
+    """ Score a point released in order against the golden envelope, then write it """
+
+    if drift_detector is not None:
+        drift_detector.update(item[0])
+    write_point(item)
+
+def skip_duplicate(item: tuple) -> None:
+    """ Ack a redelivered point without writing it again """
+
+    item[1].set_result(None)
+
+# points are released to influxdb in timestamp order per unit, late points are still written since
+# influxdb accepts out of order writes but are not scored for drift
+reorder_buffer = ReorderBuffer(
+    release_fn=release_point,
+    window_ns=int(REORDER_WINDOW_SEC * 1e9),
+    max_size=REORDER_MAX_SIZE,
+    max_hold_sec=REORDER_MAX_HOLD_SEC,
+    on_late=write_point,
+    on_duplicate=skip_duplicate,
+    release_in_order=REORDER_RELEASE_IN_ORDER
+)
 
 # INITIALIZE GLOBALS
 last_timestamp_ns = {}
 last_flow_rate = {}
 totalized_volume_ml = {}
+TOTALIZER_LOCK = threading.Lock()
 
 
 # Cloud Run HTTP entry point
 app = Flask(__name__)
+METRICS = RequestMetrics(report_every_sec=float(os.environ.get("METRICS_REPORT_INTERVAL_SEC", 60)), boot_ts=BOOT_TS)
+instrument_app(app, METRICS)
 
 @app.route("/", methods=["POST"])
 def receive_pubsub_message():
@@ -36,80 +162,139 @@ def receive_pubsub_message():
     msg = envelope["message"]
 
     try:
-        data = base64.b64decode(msg["data"]).decode("utf-8")
-        event = json.loads(data)
+        # compact struct messages name their encoding in the attributes, json otherwise
+        event = decode_trend(base64.b64decode(msg["data"]), msg.get("attributes"))
 
-        # handle only new data for streaming
-        process_data(event)
+        ack_future = process_data(event)
+        # ack only once the point is stored so pub/sub redelivers anything lost in a failed batch
+        ack_future.result(timeout=INFLUX_WRITE_TIMEOUT_SEC)
         return "", 200
-    
+
+    except FutureTimeoutError:
+        print(f"Timed out waiting for influxdb write after {INFLUX_WRITE_TIMEOUT_SEC} sec")
+        return "Internal error: influxdb write timed out", 500
+
     except Exception as e:
         print(f"Error processing data from pub/sub: {e}")
         return f"Interal error: {e}", 500
 
 
-def process_data(data: dict) -> None:
-    """ Triggered automatically whenever a Pub/Sub message arrives """
-    
-    chrom_unit = data["chrom_unit"]
-    cur_ts = int(data["time_ns"])
+def process_data(data: dict) -> Future:
+    """ Buffer a trend data point for influxdb, returns a future resolved once the point is written or skipped as a duplicate """
 
-    # handle only new data for streaming
-    if last_timestamp_ns.get(chrom_unit, 0) >= cur_ts:
-        print(f"Skipping old event for {chrom_unit}")
-        return
+    ack_future = Future()
+    reorder_buffer.push(data["chrom_unit"], int(data["time_ns"]), (data, ack_future))
+
+    return ack_future
+
+def process_batch(events: list) -> list:
+    """ Buffer a batch of pulled trend data points, returns the write future of each point """
+
+    return [process_data(event) for event in events]
+
+def run_pull_subscriber() -> None:
+    """ Consume the trend subscription with a streaming pull instead of push requests """
+    global pull_subscriber
+    from pull_subscriber import PullSubscriber
 
-    point = (
-        Point("chromatography")
-        .tag("instrument", data["chrom_unit"])
-        .field("time_sec", data["time_sec"])
-        .field("uv_mau", data["uv_mau"])
-        .field("cond_mScm", data["cond_mScm"])
-        .field("ph", data["ph"])
-        .field("flow_mL_min", data["flow_mL_min"])
-        .field("pressure_bar", data["pressure_bar"])
-        .time(int(data["time_ns"])) 
+    pull_subscriber = PullSubscriber(
+        subscription_path=f"projects/{PROJECT_ID}/subscriptions/{os.environ['PUBSUB_SUBSCRIPTION_ID']}",
+        process_batch_fn=process_batch,
+        batch_size=int(os.environ.get("PULL_BATCH_SIZE", 500)),
+        max_latency_sec=float(os.environ.get("PULL_MAX_LATENCY_SEC", 0.2)),
+        flow_control_messages=int(os.environ.get("PULL_FLOW_CONTROL_MESSAGES", 5000)),
+        flow_control_bytes=int(os.environ.get("PULL_FLOW_CONTROL_BYTES", 100 * 1024 * 1024))
     )
+    pull_subscriber.run()
+
+pull_subscriber = None
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """ Request latency and buffer counters of this worker process """
+
+    return {"requests": METRICS.stats(), "reorder": reorder_buffer.stats(), "write_buffer": write_buffer.stats(),
+            "drift": drift_detector.stats() if drift_detector is not None else None}
+
+@app.route("/warmup", methods=["GET"])
+def warm_up():
+    """ Create the influxdb client, usable as a Cloud Run startup probe """
+
+    start_ts = time.perf_counter()
+    get_influx_client()
+
+    return {"warmup_sec": round(time.perf_counter() - start_ts, 3)}
+
+def close_buffers() -> None:
+    """ Stop pulling and write every buffered point, called on SIGTERM and by gunicorn when a worker exits """
+
+    if pull_subscriber is not None:
+        pull_subscriber.stop()
+    reorder_buffer.close()
+    print(f"Reorder buffer closed: {reorder_buffer.stats()}")
+    write_buffer.close()
+    print(f"Influxdb write buffer closed: {write_buffer.stats()}")
+    if drift_detector is not None:
+        print(f"Drift detector: {drift_detector.stats()}")
+    print(f"Request metrics: {METRICS.stats()}")
+
+def shutdown(signum, frame) -> None:
+    """ Flush buffered points before Cloud Run stops the container """
+
+    print(f"Received signal {signum}, flushing influxdb write buffer")
+    close_buffers()
+    sys.exit(0)
+
+STARTUP.mark("buffers")
+if WARMUP_ON_START:
+    threading.Thread(target=lambda: app.test_client().get("/warmup"), name="warmup", daemon=True).start()
+STARTUP.report()
 
-    influx_client.write(database=DATABASE, record=point)
-    print("data point submitted to influxdb")
-        
 # deprecated: totalized volume calculations done downstream of streaming
 def handle_event(event: dict) -> None:
     """ Process individual event from Pub/Sub and calculate totalized volumes """
     global last_timestamp_ns, last_flow_rate, totalized_volume_ml
 
-    # Calculate totalized volume
-    chrom_unit = event["chrom_unit"]
-    cur_ts = int(event["time_ns"])
-    cur_flow = event["flow_mL_min"]
+    # request threads share the per-unit totals
+    with TOTALIZER_LOCK:
+        # Calculate totalized volume
+        chrom_unit = event["chrom_unit"]
+        cur_ts = int(event["time_ns"])
+        cur_flow = event["flow_mL_min"]
 
-    last_ts = last_timestamp_ns.get(chrom_unit, None)
-    last_flow = last_flow_rate.get(chrom_unit, 0)
-    if chrom_unit not in totalized_volume_ml:
-        totalized_volume_ml[chrom_unit] = 0.0
+        last_ts = last_timestamp_ns.get(chrom_unit, None)
+        last_flow = last_flow_rate.get(chrom_unit, 0)
+        if chrom_unit not in totalized_volume_ml:
+            totalized_volume_ml[chrom_unit] = 0.0
 
-    if last_ts is not None:
-        # Calculate time difference in minutes
-        delta_min = (cur_ts - last_ts) / 1e9 / 60.0
-        # Average flow rate between last and current
-        avg_flow = (last_flow + cur_flow) / 2.0
-        # Calculate volume added since last event
-        delta_vol = avg_flow * delta_min
-        totalized_volume_ml[chrom_unit] += delta_vol
+        if last_ts is not None:
+            # Calculate time difference in minutes
+            delta_min = (cur_ts - last_ts) / 1e9 / 60.0
+            # Average flow rate between last and current
+            avg_flow = (last_flow + cur_flow) / 2.0
+            # Calculate volume added since last event
+            delta_vol = avg_flow * delta_min
+            totalized_volume_ml[chrom_unit] += delta_vol
 
-    # Calculate totalized column volumes (assuming 226 L column volume)
-    tot_col_vol = totalized_volume_ml[chrom_unit] / 1000.0 / 226 
+        # Calculate totalized column volumes (assuming 226 L column volume)
+        tot_col_vol = totalized_volume_ml[chrom_unit] / 1000.0 / 226 
 
-    last_timestamp_ns[chrom_unit] = cur_ts
-    last_flow_rate[chrom_unit] = cur_flow
+        last_timestamp_ns[chrom_unit] = cur_ts
+        last_flow_rate[chrom_unit] = cur_flow
 
-    # Add calculations to event
-    event["totalized_volume_ml"] = totalized_volume_ml[chrom_unit]
-    event["totalized_column_volumes"] = tot_col_vol
+        # Add calculations to event
+        event["totalized_volume_ml"] = totalized_volume_ml[chrom_unit]
+        event["totalized_column_volumes"] = tot_col_vol
 
     return event
 
 if __name__ == "__main__":
+    # gunicorn (gunicorn.conf.py) serves push mode in production and flushes through its worker_exit hook
+    signal.signal(signal.SIGTERM, shutdown)
     port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port)
\ No newline at end of file
+    if CONSUMER_MODE == "pull":
+        # keep serving on PORT for Cloud Run health checks while the subscriber pulls
+        threading.Thread(target=app.run, kwargs={"host": "0.0.0.0", "port": port}, daemon=True).start()
+        run_pull_subscriber()
+    else:
+        app.run(host="0.0.0.0", port=port)
\ No newline at end of file
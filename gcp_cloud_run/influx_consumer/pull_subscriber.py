@@ -0,0 +1,151 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable
+from google.cloud import pubsub_v1
+from trend_codec import decode_trend
+
+class PullSubscriber:
+    """
+    Streaming pull runtime for the consumers, an alternative to one Pub/Sub push request per message.
+    Received messages are collected into batches on size or age and handed to process_batch_fn as decoded events.
+    process_batch_fn returns one result per event: None when the event is fully handled or a Future that
+    resolves once it is stored. Messages are acked when their result is done and nacked on failure, so
+    Pub/Sub redelivers anything that was not processed.
+
+    Params:
+        subscription_path (str): Fully qualified Pub/Sub subscription path
+        process_batch_fn (Callable): Handles a list of decoded events, returns a list of None or Future per event
+        batch_size (int): Number of messages that triggers a batch
+        max_latency_sec (float): Maximum time a message waits before its batch is processed
+        flow_control_messages (int): Maximum number of unacked messages leased by this subscriber
+        flow_control_bytes (int): Maximum size of unacked messages leased by this subscriber
+        subscriber_client (pubsub_v1.SubscriberClient): Client to pull with, a new client when None
+
+    Methods:
+        run: Start the streaming pull and block until it is stopped
+        stop: Cancel the streaming pull and process the messages already received
+        stats: Message counters
+    """
+
+    def __init__(self, subscription_path: str, process_batch_fn: Callable, batch_size: int = 500,
+                 max_latency_sec: float = 0.2, flow_control_messages: int = 5000,
+                 flow_control_bytes: int = 100 * 1024 * 1024, subscriber_client=None):
+        self.subscription_path = subscription_path
+        self.process_batch_fn = process_batch_fn
+        self.batch_size = batch_size
+        self.max_latency_sec = max_latency_sec
+        self.flow_control = pubsub_v1.types.FlowControl(max_messages=flow_control_messages, max_bytes=flow_control_bytes)
+        self.subscriber = subscriber_client if subscriber_client is not None else pubsub_v1.SubscriberClient()
+        self.messages_received = 0
+        self.messages_acked = 0
+        self.messages_nacked = 0
+        self.batches_processed = 0
+        self._messages = queue.Queue()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._streaming_pull_future = None
+        self._batcher = threading.Thread(target=self._run_batcher, name="pull-batcher", daemon=True)
+
+    def run(self, timeout: float = None) -> None:
+        """ Start the streaming pull and block until it is stopped or timeout seconds pass """
+
+        self._batcher.start()
+        self._streaming_pull_future = self.subscriber.subscribe(
+            self.subscription_path, callback=self._messages.put, flow_control=self.flow_control
+        )
+        print(f"Pulling messages from: {self.subscription_path}")
+
+        # block on the streaming pull future, the idle process uses no CPU
+        try:
+            self._streaming_pull_future.result(timeout=timeout)
+        except TimeoutError:
+            self.stop()
+        except Exception as e:
+            if not self._stopping.is_set():
+                print(f"Streaming pull stopped with error: {e}")
+                self.stop()
+                raise
+
+    def stop(self) -> None:
+        """ Cancel the streaming pull and process the messages already received """
+
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._streaming_pull_future is not None:
+            self._streaming_pull_future.cancel()
+        if self._batcher.is_alive():
+            self._batcher.join()
+        print(f"Pull subscriber stopped: {self.stats()}")
+
+    def stats(self) -> dict:
+        """ Message counters """
+
+        with self._stats_lock:
+            return {
+                "messages_received": self.messages_received,
+                "messages_acked": self.messages_acked,
+                "messages_nacked": self.messages_nacked,
+                "batches_processed": self.batches_processed
+            }
+
+    def _run_batcher(self):
+        """ Collect received messages into batches on size or age and process them """
+
+        while True:
+            batch = []
+            try:
+                batch.append(self._messages.get(timeout=self.max_latency_sec))
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            deadline = time.monotonic() + self.max_latency_sec
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._messages.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process_batch(batch)
+
+    def _process_batch(self, batch):
+        """ Decode a batch of messages, process it and settle each message's ack """
+
+        with self._stats_lock:
+            self.messages_received += len(batch)
+            self.batches_processed += 1
+
+        try:
+            events = [decode_trend(message.data, message.attributes) for message in batch]
+            results = self.process_batch_fn(events)
+        except Exception as e:
+            print(f"Error processing batch of {len(batch)} messages from pub/sub: {e}")
+            for message in batch:
+                self._settle(message, ok=False)
+            return
+
+        for message, result in zip(batch, results):
+            if isinstance(result, Future):
+                result.add_done_callback(lambda future, message=message: self._settle(message, ok=future.exception() is None))
+            else:
+                self._settle(message, ok=True)
+
+    def _settle(self, message, ok):
+        """ Ack a processed message or nack it for redelivery, the client sends acks to Pub/Sub in batches """
+
+        if ok:
+            message.ack()
+        else:
+            message.nack()
+        with self._stats_lock:
+            if ok:
+                self.messages_acked += 1
+            else:
+                self.messages_nacked += 1
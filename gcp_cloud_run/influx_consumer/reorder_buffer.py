@@ -0,0 +1,181 @@
+import time
+import heapq
+import threading
+from collections import deque
+from typing import Callable
+
+class ReorderBuffer:
+    """
+    Per-unit watermark tracking with a bounded reorder window for out-of-order and redelivered Pub/Sub events.
+    Events are held in a min-heap per unit and released to release_fn in timestamp order once they fall behind the
+    unit's watermark, the newest event time seen minus window_ns. A unit's heap is also drained when it holds more
+    than max_size events or nothing has been released for max_hold_sec, bounding memory and latency.
+    With release_in_order, an event newer than every event of its unit while none are held is released at once,
+    for ordered subscriptions that deliver a unit's next event only after this one is acked.
+
+    Events at a timestamp already buffered or recently released are duplicates and go to on_duplicate.
+    New events behind the last released timestamp are late and go to on_late, they cannot be released in order.
+    Every operation is O(log n) in the number of buffered events of the unit. Each unit has its own lock, so
+    concurrent request threads only wait on each other for events of the same unit.
+
+    Params:
+        release_fn (Callable): Called with each released item, in timestamp order per unit
+        window_ns (int): Event time an event may arrive behind the newest event of its unit and still be reordered
+        max_size (int): Maximum number of events buffered per unit
+        max_hold_sec (float): Maximum time a unit's events are held without a release
+        history_size (int): Number of released timestamps remembered per unit to recognise redeliveries
+        on_late (Callable): Called with late items, dropped when None
+        on_duplicate (Callable): Called with duplicate items, dropped when None
+        release_in_order (bool): Release an event that arrives in order without holding it in the reorder window
+
+    Methods:
+        push: Add an event to its unit's reorder window
+        release_expired: Drain units that have held events longer than max_hold_sec
+        forget: Drop a released timestamp from its unit's history so a redelivery is released again
+        flush: Release every buffered event in timestamp order
+        close: Stop the background release thread and flush
+        stats: Event counters
+    """
+
+    def __init__(self, release_fn: Callable, window_ns: int = 5 * 10**9, max_size: int = 1000, max_hold_sec: float = 2.0,
+                 history_size: int = 10000, on_late: Callable = None, on_duplicate: Callable = None,
+                 release_in_order: bool = False):
+        self.release_fn = release_fn
+        self.window_ns = window_ns
+        self.max_size = max_size
+        self.max_hold_sec = max_hold_sec
+        self.history_size = history_size
+        self.on_late = on_late
+        self.on_duplicate = on_duplicate
+        self.release_in_order = release_in_order
+        self._units = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._releaser = threading.Thread(target=self._run_releaser, name="reorder-releaser", daemon=True)
+        self._releaser.start()
+
+    def push(self, unit: str, time_ns: int, item) -> None:
+        """ Add an event to its unit's reorder window, releasing every event that fell behind the watermark """
+
+        state = self._units.get(unit)
+        if state is None:
+            with self._lock:
+                state = self._units.setdefault(unit, _UnitState(history_size=self.history_size))
+
+        with state.lock:
+            state.counters["received"] += 1
+            if time_ns in state.buffered or time_ns in state.released:
+                state.counters["duplicates"] += 1
+                if self.on_duplicate is not None:
+                    self.on_duplicate(item)
+                return
+            if state.last_released_ns is not None and time_ns < state.last_released_ns:
+                state.counters["late"] += 1
+                if self.on_late is not None:
+                    self.on_late(item)
+                return
+
+            in_order = state.max_seen_ns is None or time_ns > state.max_seen_ns
+            if not in_order:
+                state.counters["reordered"] += 1
+            state.max_seen_ns = time_ns if state.max_seen_ns is None else max(state.max_seen_ns, time_ns)
+            if not state.heap:
+                state.last_release_ts = time.monotonic()
+
+            state.seq += 1
+            heapq.heappush(state.heap, (time_ns, state.seq, item))
+            state.buffered.add(time_ns)
+            if self.release_in_order and in_order and len(state.heap) == 1:
+                self._release_next(state)
+
+            watermark_ns = state.max_seen_ns - self.window_ns
+            while state.heap and (state.heap[0][0] <= watermark_ns or len(state.heap) > self.max_size):
+                self._release_next(state)
+
+    def release_expired(self) -> None:
+        """ Drain units that have held events longer than max_hold_sec without a release """
+
+        now = time.monotonic()
+        for state in list(self._units.values()):
+            with state.lock:
+                if state.heap and now - state.last_release_ts >= self.max_hold_sec:
+                    while state.heap:
+                        self._release_next(state)
+
+    def forget(self, unit: str, time_ns: int) -> None:
+        """ Drop a released timestamp from its unit's history, for events that failed downstream and will be redelivered """
+
+        state = self._units.get(unit)
+        if state is None:
+            return
+        with state.lock:
+            state.released.discard(time_ns)
+
+    def flush(self) -> None:
+        """ Release every buffered event in timestamp order """
+
+        for state in list(self._units.values()):
+            with state.lock:
+                while state.heap:
+                    self._release_next(state)
+
+    def close(self) -> None:
+        """ Stop the background release thread and flush """
+
+        self._closed.set()
+        self._releaser.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        """ Event counters """
+
+        stats = {"received": 0, "released": 0, "reordered": 0, "duplicates": 0, "late": 0, "buffered": 0}
+        for state in list(self._units.values()):
+            with state.lock:
+                for key, value in state.counters.items():
+                    stats[key] += value
+                stats["buffered"] += len(state.heap)
+
+        return stats
+
+    def _release_next(self, state):
+        """ Pop the oldest event of a unit and hand it to release_fn, caller must hold the unit's lock """
+
+        time_ns, _, item = heapq.heappop(state.heap)
+        state.buffered.discard(time_ns)
+        state.remember_released(time_ns)
+        state.last_released_ns = time_ns
+        state.last_release_ts = time.monotonic()
+        state.counters["released"] += 1
+        self.release_fn(item)
+
+    def _run_releaser(self):
+        """ Background thread releasing events of units that went quiet """
+
+        while not self._closed.wait(timeout=self.max_hold_sec / 2):
+            self.release_expired()
+
+
+class _UnitState:
+    """ Reorder window state of one unit: lock, pending events, buffered and recently released timestamps and watermark """
+
+    def __init__(self, history_size):
+        self.lock = threading.Lock()
+        self.counters = {"received": 0, "released": 0, "reordered": 0, "duplicates": 0, "late": 0}
+        self.seq = 0
+        self.heap = []
+        self.buffered = set()
+        self.released = set()
+        self.released_order = deque()
+        self.history_size = history_size
+        self.max_seen_ns = None
+        self.last_released_ns = None
+        self.last_release_ts = time.monotonic()
+
+    def remember_released(self, time_ns):
+        """ Keep a bounded history of released timestamps to recognise redeliveries """
+
+        self.released.add(time_ns)
+        self.released_order.append(time_ns)
+        if len(self.released_order) > self.history_size:
+            self.released.discard(self.released_order.popleft())
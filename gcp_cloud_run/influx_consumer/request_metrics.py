@@ -0,0 +1,136 @@
+import time
+import threading
+from collections import deque
+from flask import Flask, g, request
+
+class RequestMetrics:
+    """
+    Request counters and latency percentiles of a consumer process, shared by its request threads.
+    Latency percentiles are computed over the most recent window_size requests. The time from boot_ts to the first
+    successful response is kept as the process's time to first ack.
+
+    Params:
+        window_size (int): Number of recent request latencies kept for percentiles
+        report_every_sec (float): Interval between metrics reports printed from the request path, no reports when None
+        boot_ts (float): time.perf_counter() at process start, the creation time of the metrics when None
+
+    Methods:
+        start: Record the start of a request, returns its start timestamp
+        finish: Record the latency and status code of a finished request
+        stats: Request counters and latency percentiles in milliseconds
+    """
+
+    def __init__(self, window_size: int = 10000, report_every_sec: float = 60.0, boot_ts: float = None):
+        self.report_every_sec = report_every_sec
+        self.boot_ts = boot_ts if boot_ts is not None else time.perf_counter()
+        self.first_ack_sec = None
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._latencies_sec = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._start_ts = time.monotonic()
+        self._last_report_ts = self._start_ts
+
+    def start(self) -> float:
+        """ Record the start of a request, returns its start timestamp """
+
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        return time.perf_counter()
+
+    def finish(self, start_ts: float, status_code: int) -> None:
+        """ Record the latency and status code of a finished request """
+
+        finish_ts = time.perf_counter()
+        latency_sec = finish_ts - start_ts
+        first_ack = False
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            if status_code >= 500:
+                self.errors += 1
+            elif self.first_ack_sec is None:
+                self.first_ack_sec = finish_ts - self.boot_ts
+                first_ack = True
+            self._latencies_sec.append(latency_sec)
+            report = self.report_every_sec is not None and time.monotonic() - self._last_report_ts >= self.report_every_sec
+            if report:
+                self._last_report_ts = time.monotonic()
+
+        if first_ack:
+            print(f"first push acked {self.first_ack_sec:.3f} sec after boot, request latency {latency_sec:.3f} sec")
+        if report:
+            print(f"request metrics: {self.stats()}")
+
+    def stats(self) -> dict:
+        """ Request counters and latency percentiles in milliseconds """
+
+        with self._lock:
+            latencies_ms = sorted(latency_sec * 1000 for latency_sec in self._latencies_sec)
+            stats = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "first_ack_sec": round(self.first_ack_sec, 3) if self.first_ack_sec is not None else None,
+                "requests_per_sec": round(self.requests / max(time.monotonic() - self._start_ts, 1e-9), 2)
+            }
+        if latencies_ms:
+            stats["latency_ms"] = {
+                "p50": round(latencies_ms[int(0.50 * (len(latencies_ms) - 1))], 3),
+                "p95": round(latencies_ms[int(0.95 * (len(latencies_ms) - 1))], 3),
+                "p99": round(latencies_ms[int(0.99 * (len(latencies_ms) - 1))], 3),
+                "max": round(latencies_ms[-1], 3)
+            }
+
+        return stats
+
+
+class StartupTimer:
+    """
+    Breakdown of a consumer's boot time into named phases, logged once the process is ready to serve.
+
+    Params:
+        boot_ts (float): time.perf_counter() at process start
+
+    Methods:
+        mark: Close the current phase under a name
+        report: Print the phase durations and the total since boot
+    """
+
+    def __init__(self, boot_ts: float):
+        self.boot_ts = boot_ts
+        self.phases = {}
+        self._last_ts = boot_ts
+
+    def mark(self, phase: str) -> None:
+        """ Close the current phase under a name """
+
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last_ts
+        self._last_ts = now
+
+    def report(self) -> None:
+        """ Print the phase durations and the total since boot """
+
+        breakdown = ", ".join(f"{phase} {duration_sec:.3f}" for phase, duration_sec in self.phases.items())
+        print(f"startup: {breakdown}, total {self._last_ts - self.boot_ts:.3f} sec")
+
+
+def instrument_app(app: Flask, metrics: RequestMetrics) -> None:
+    """ Time every Pub/Sub push request of app, other routes such as /metrics are not recorded """
+
+    @app.before_request
+    def start_request_timer():
+        if request.method == "POST":
+            g.request_start_ts = metrics.start()
+
+    @app.after_request
+    def finish_request_timer(response):
+        if "request_start_ts" in g:
+            metrics.finish(g.request_start_ts, response.status_code)
+        return response
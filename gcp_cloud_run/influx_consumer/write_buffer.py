@@ -0,0 +1,182 @@
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+INFLUX_FIELDS = ["time_sec", "uv_mau", "cond_mScm", "ph", "flow_mL_min", "pressure_bar"]
+# running totals added by the generator's streaming totalizer, written when present
+TOTALIZER_FIELDS = ["totalized_volume_ml", "totalized_column_volumes", "phase_column_volumes", "phase_uv_auc"]
+
+def to_line_protocol(data: dict, measurement: str = "chromatography") -> str:
+    """ Format a trend data point as an InfluxDB line protocol record """
+
+    instrument = _escape_tag(data["chrom_unit"])
+    fields = ",".join(f"{field}={float(data[field])!r}" for field in INFLUX_FIELDS + TOTALIZER_FIELDS if field in data)
+
+    return f"{measurement},instrument={instrument} {fields} {int(data['time_ns'])}"
+
+def alert_to_line_protocol(alert: dict, measurement: str = "drift_alert") -> str:
+    """ Format a drift alert event as an InfluxDB line protocol record, tagged by instrument, sensor and detector """
+
+    tags = f"instrument={_escape_tag(alert['chrom_unit'])},sensor={_escape_tag(alert['sensor'])},detector={alert['detector']}"
+    fields = ",".join(f"{field}={float(alert[field])!r}" for field in ["score", "value", "expected", "std", "cv_bin_start"])
+
+    return f"{measurement},{tags} {fields} {int(alert['time_ns'])}"
+
+def _escape_tag(value):
+    return str(value).replace(",", "\\,").replace(" ", "\\ ").replace("=", "\\=")
+
+class InfluxWriteBuffer:
+    """
+    Batches InfluxDB writes from concurrent requests into bulk line protocol writes.
+    A background thread flushes the buffer when it reaches max_batch_size records or when the oldest
+    buffered record has waited flush_interval_sec, retrying failed writes with exponential backoff.
+    Every submitted record gets a future that resolves once its batch is written, so callers can hold
+    the Pub/Sub ack until the data is stored.
+
+    Params:
+        write_fn (Callable): Writes a list of line protocol records in one request
+        max_batch_size (int): Number of buffered records that triggers a flush
+        flush_interval_sec (float): Maximum time a record waits in the buffer before a flush
+        max_retries (int): Number of times a failed write is retried before its records fail
+        retry_backoff_sec (float): Delay before the first retry, doubled on each further retry
+        max_concurrent_writes (int): Number of batch writes allowed in flight at once
+
+    Methods:
+        submit: Buffer a line protocol record, returns a future resolved when it is written
+        flush: Write all buffered records now
+        close: Flush remaining records and stop the background flusher
+        stats: Write counters
+    """
+
+    def __init__(self, write_fn: Callable, max_batch_size: int = 5000, flush_interval_sec: float = 0.5,
+                 max_retries: int = 3, retry_backoff_sec: float = 0.2, max_concurrent_writes: int = 4):
+        self.write_fn = write_fn
+        self.max_batch_size = max_batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.max_retries = max_retries
+        self.retry_backoff_sec = retry_backoff_sec
+        self.records_written = 0
+        self.records_failed = 0
+        self.write_requests = 0
+        self.write_retries = 0
+        self._buffer = []
+        self._oldest_ts = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._writers = ThreadPoolExecutor(max_workers=max_concurrent_writes, thread_name_prefix="influx-writer")
+        self._flusher = threading.Thread(target=self._run_flusher, name="influx-flusher", daemon=True)
+        self._flusher.start()
+
+    def submit(self, record: str) -> Future:
+        """ Buffer a line protocol record, returns a future resolved when it is written """
+
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("InfluxWriteBuffer is closed")
+            if not self._buffer:
+                # wake the idle flusher so it starts timing the new batch
+                self._oldest_ts = time.monotonic()
+                self._condition.notify()
+            self._buffer.append((record, future))
+            if len(self._buffer) >= self.max_batch_size:
+                self._condition.notify()
+
+        return future
+
+    def flush(self) -> None:
+        """ Write all buffered records now """
+
+        with self._condition:
+            batch = self._take_batch()
+        self._write_batch(batch)
+
+    def close(self) -> None:
+        """ Flush remaining records and stop the background flusher """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._flusher.join()
+        self._writers.shutdown(wait=True)
+        self.flush()
+
+    def stats(self) -> dict:
+        """ Write counters """
+
+        with self._condition:
+            buffered = len(self._buffer)
+
+        return {
+            "records_written": self.records_written,
+            "records_failed": self.records_failed,
+            "write_requests": self.write_requests,
+            "write_retries": self.write_retries,
+            "buffered": buffered
+        }
+
+    def _run_flusher(self):
+        """ Background thread writing the buffer on size or age """
+
+        while True:
+            with self._condition:
+                while not self._closed and not self._flush_due():
+                    timeout = None
+                    if self._buffer:
+                        timeout = max(self.flush_interval_sec - (time.monotonic() - self._oldest_ts), 0)
+                    self._condition.wait(timeout=timeout)
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            self._writers.submit(self._write_batch, batch)
+
+    def _flush_due(self):
+        if not self._buffer:
+            return False
+        return len(self._buffer) >= self.max_batch_size or time.monotonic() - self._oldest_ts >= self.flush_interval_sec
+
+    def _take_batch(self):
+        """ Swap out the current buffer, caller must hold the condition """
+
+        batch = self._buffer
+        self._buffer = []
+        self._oldest_ts = None
+        return batch
+
+    def _write_batch(self, batch):
+        """ Write a batch with retries and resolve the futures of its records """
+
+        if not batch:
+            return
+        records = [record for record, _ in batch]
+
+        error = None
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            attempts += 1
+            try:
+                self.write_fn(records)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff_sec * 2 ** attempt)
+
+        with self._stats_lock:
+            self.write_requests += attempts
+            self.write_retries += attempts - 1
+            if error is None:
+                self.records_written += len(records)
+            else:
+                self.records_failed += len(records)
+        if error is not None:
+            print(f"Error writing {len(records)} records to influxdb after {attempts} attempts: {error}")
+
+        for _, future in batch:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
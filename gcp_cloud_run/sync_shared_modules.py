@@ -0,0 +1,61 @@
+import os
+import sys
+import shutil
+import filecmp
+import argparse
+
+# modules shared by the data generator and the Cloud Run consumers, each image is built from its own directory
+# so the consumers carry copies. the first path of each module is its source, edit it there and run this script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_MODULES = {
+    "trend_codec.py": ["python_data_generation/src", "gcp_cloud_run/gcs_consumer", "gcp_cloud_run/influx_consumer"],
+    "parquet_writer.py": ["python_data_generation/src", "gcp_cloud_run/gcs_consumer"],
+    "drift_detector.py": ["python_data_generation/src", "gcp_cloud_run/influx_consumer"],
+    "reorder_buffer.py": ["gcp_cloud_run/influx_consumer", "gcp_cloud_run/gcs_consumer"],
+    "pull_subscriber.py": ["gcp_cloud_run/influx_consumer", "gcp_cloud_run/gcs_consumer"],
+    "request_metrics.py": ["gcp_cloud_run/influx_consumer", "gcp_cloud_run/gcs_consumer"],
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Copy shared modules from their source to every consumer")
+    parser.add_argument('--check', action='store_true', help='Only report copies that differ from their source, exit 1 if any')
+
+    return parser.parse_args(argv)
+
+def stale_copies(repo_root: str = REPO_ROOT) -> list:
+    """ Relative paths of the copies that differ from their source module """
+
+    stale = []
+    for module, dirs in SHARED_MODULES.items():
+        source = os.path.join(repo_root, dirs[0], module)
+        for copy_dir in dirs[1:]:
+            copy_path = os.path.join(repo_root, copy_dir, module)
+            if not os.path.exists(copy_path) or not filecmp.cmp(source, copy_path, shallow=False):
+                stale.append(os.path.join(copy_dir, module))
+
+    return stale
+
+def sync(repo_root: str = REPO_ROOT) -> list:
+    """ Copy every source module over its stale copies, returns the copies written """
+
+    stale = stale_copies(repo_root)
+    for copy_path in stale:
+        module = os.path.basename(copy_path)
+        shutil.copyfile(os.path.join(repo_root, SHARED_MODULES[module][0], module), os.path.join(repo_root, copy_path))
+
+    return stale
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.check:
+        stale = stale_copies()
+        for copy_path in stale:
+            print(f"{copy_path} differs from its source, run python gcp_cloud_run/sync_shared_modules.py")
+        return 1 if stale else 0
+
+    for copy_path in sync():
+        print(f"updated {copy_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
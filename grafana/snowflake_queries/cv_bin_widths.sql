@@ -0,0 +1,4 @@
+-- options of a $bin_width_cv dashboard variable, for panels with a fixed resolution
+SELECT DISTINCT BIN_WIDTH_CV
+FROM CHROM_STREAM_DB.TEST_SCHEMA__T1_GOLD.TREND_CV_BINS
+ORDER BY BIN_WIDTH_CV;
\ No newline at end of file
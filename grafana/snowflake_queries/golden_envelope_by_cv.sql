@@ -0,0 +1,21 @@
+-- golden batch envelope of the selected recipe to overlay on the live and historical runs
+SELECT
+  CV_BIN_START + BIN_WIDTH_CV / 2 AS BATCH_TOT_CV,
+  BATCH_COUNT,
+  UV_MAU_MEAN,
+  UV_MAU_MEAN - 3 * UV_MAU_STD AS UV_MAU_LOWER,
+  UV_MAU_MEAN + 3 * UV_MAU_STD AS UV_MAU_UPPER,
+  UV_MAU_P05,
+  UV_MAU_P95,
+  COND_MS_CM_MEAN,
+  COND_MS_CM_P05,
+  COND_MS_CM_P95,
+  PH_MEAN,
+  PH_P05,
+  PH_P95,
+  PRESSURE_BAR_MEAN,
+  PRESSURE_BAR_P05,
+  PRESSURE_BAR_P95
+FROM CHROM_STREAM_DB.TEST_SCHEMA__T1_GOLD.GOLDEN_ENVELOPE
+WHERE RECIPE_NAME = '${recipe_name}'
+ORDER BY CV_BIN_START;
\ No newline at end of file
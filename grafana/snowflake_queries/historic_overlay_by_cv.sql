@@ -0,0 +1,26 @@
+-- overlay of the selected historical batches by cv, at the finest bin width that keeps each batch under
+-- $max_bins rows across the zoomed cv range $cv_min to $cv_max, falling back to the coarsest width
+WITH resolution AS (
+  SELECT
+    COALESCE(
+      MIN(CASE WHEN (${cv_max} - ${cv_min}) / BIN_WIDTH_CV <= ${max_bins} THEN BIN_WIDTH_CV END),
+      MAX(BIN_WIDTH_CV)
+    ) AS BIN_WIDTH_CV
+  FROM (SELECT DISTINCT BIN_WIDTH_CV FROM CHROM_STREAM_DB.TEST_SCHEMA__T1_GOLD.TREND_CV_BINS)
+)
+SELECT
+  b.RUN_NUMBER,
+  b.BATCH_TOT_CV,
+  b.UV_MAU_MIN,
+  b.UV_MAU_MEAN,
+  b.UV_MAU_MAX,
+  b.FLOW_RATE_LPM_MEAN,
+  b.PRESSURE_BAR_MEAN,
+  b.PH_MEAN,
+  b.COND_MS_CM_MEAN
+FROM CHROM_STREAM_DB.TEST_SCHEMA__T1_GOLD.TREND_CV_BINS b
+INNER JOIN resolution r
+ON b.BIN_WIDTH_CV = r.BIN_WIDTH_CV
+WHERE b.BATCH_ID IN (${batch_ids:csv})
+AND b.BATCH_TOT_CV BETWEEN ${cv_min} AND ${cv_max}
+ORDER BY b.RUN_NUMBER, b.BATCH_TOT_CV;
\ No newline at end of file
@@ -1,9 +1,11 @@
 SELECT 
   BATCH_TOT_CV,
-  UV_MAU,
-  FLOW_RATE_LPM,
-  PRESSURE_BAR,
-  PH,
-  COND_MS_CM
-FROM CHROM_STREAM_DB.TEST_SCHEMA__T1_GOLD.TREND_BASE
-WHERE BATCH_ID = 1;
\ No newline at end of file
+  UV_MAU_MEAN AS UV_MAU,
+  FLOW_RATE_LPM_MEAN AS FLOW_RATE_LPM,
+  PRESSURE_BAR_MEAN AS PRESSURE_BAR,
+  PH_MEAN AS PH,
+  COND_MS_CM_MEAN AS COND_MS_CM
+FROM CHROM_STREAM_DB.TEST_SCHEMA__T1_GOLD.TREND_CV_BINS
+WHERE BATCH_ID = 1
+AND BIN_WIDTH_CV = 0.01
+ORDER BY BATCH_TOT_CV;
\ No newline at end of file
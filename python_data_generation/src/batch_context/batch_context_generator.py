@@ -2,6 +2,8 @@ import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 
+from template_registry import load_trend_template
+
 class BatchContextGenerator:
     """
     Data generation functions for simulating batch context data streaming
@@ -11,11 +13,7 @@ class BatchContextGenerator:
     """
 
     def __init__(self, template_path: str, recipe_name: str, batch_id: str, chrom_id: str, execution_time: datetime, holds: bool=True):
-        self.template_data = pd.read_csv(template_path)
-        if holds is False:
-            self.template_data = self.template_data[self.template_data["flow_setpoint_L_min"] > 0]
-            # reset time_min to 0.5 minute increments without holds
-            self.template_data["time_min"] = np.arange(0, len(self.template_data) * 0.5, 0.5)
+        self.template_data = load_trend_template(template_path, holds=holds)
         self.simulated_batch_data = self._generate_batch_data(recipe_name=recipe_name, batch_id=batch_id, chrom_id=chrom_id, execution_time=execution_time)
         self.simulated_phase_data = self._generate_phase_data(execution_time=execution_time)
     
@@ -1,14 +1,18 @@
 import os
+import heapq
 import yaml
 import argparse
-import time
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 from google.cloud import storage
 from multiprocessing import Process, Queue
 
 from batch_context.batch_context_generator import BatchContextGenerator
-from gcp_utils import parquet_to_gcs
+from parquet_writer import RollingParquetWriter
+from gcp_utils import event_partition
+from pacing import DeadlineScheduler
+from transport import iter_queue
+from local_sinks import write_to_local_sink
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Batch Context Data Generation Simulator")
@@ -32,7 +36,11 @@ def main():
         config["column_ids"] = ["chrom_1", "chrom_2", "chrom_3", "chrom_4"]
         config["batch_delay_sec"] = 0
         config["stream_rate_adjust_factor"] = 1000
+        config["pacing_policy"] = "catch_up"
+        config["pacing_max_lag_sec"] = None
+        config["parquet_writer"] = {"target_file_rows": 100000, "row_group_size": 10000, "max_file_age_sec": 300, "compression": "zstd"}
         config["local_test"] = True
+        config["local_sink"] = {"type": "null", "output_dir": "local_output"}
     elif args.config:
         config = load_config(args.config)
     else:
@@ -48,29 +56,30 @@ def main():
     build_batch_args = {key: val for key, val in config.items() 
                         if key in ["number_of_runs", "column_ids", "execution_time", "batch_delay_sec"]}
     build_batch_args["template_path"] = template_path
-    batch_context, phase_generators = build_batch_context(**build_batch_args)
+    batch_context, event_timeline = build_batch_context(**build_batch_args)
 
-    # Setup GCS upload processes or local print based on test mode
+    # Setup GCS upload processes or local sink based on test mode
     if not config["local_test"]:
         gcs_bucket = os.environ["GCP_BATCH_BUCKET"]
         client = storage.Client()
         bucket = client.bucket(gcs_bucket)
-        batch_process = Process(target=send_event_to_gcs, args=(batch_queue, bucket, "batch"))
-        phase_process = Process(target=send_event_to_gcs, args=(phase_queue, bucket, "phase"))
+        batch_process = Process(target=send_event_to_gcs, args=(batch_queue, bucket, "batch"), kwargs={"writer_options": config["parquet_writer"]})
+        phase_process = Process(target=send_event_to_gcs, args=(phase_queue, bucket, "phase"), kwargs={"writer_options": config["parquet_writer"]})
     else:
-        batch_process = Process(target=print_event, args=(batch_queue, "batch"))
-        phase_process = Process(target=print_event, args=(phase_queue, "phase"))
+        batch_process = Process(target=write_to_local_sink, args=(batch_queue, "batch", config["local_sink"]),
+                                kwargs={"writer_options": config["parquet_writer"]})
+        phase_process = Process(target=write_to_local_sink, args=(phase_queue, "phase", config["local_sink"]),
+                                kwargs={"writer_options": config["parquet_writer"]})
 
     # Start processes to generate events and send to GCS
     processes = [
         Process(target=generate_batch_context_events, args=(
             batch_queue,
             phase_queue,
-            config["number_of_runs"],
-            batch_context,
-            phase_generators,
+            event_timeline,
             config["stream_rate_adjust_factor"],
-            config["batch_delay_sec"]
+            config["pacing_policy"],
+            config["pacing_max_lag_sec"]
         )),
         batch_process,
         phase_process
@@ -83,10 +92,9 @@ def main():
     return
 
 def build_batch_context(number_of_runs, column_ids, template_path, execution_time, batch_delay_sec, holds=True):
-    """ Generate batch context dataset """
+    """ Generate batch context dataset and its time-ordered event timeline """
     
     batch_context = {}
-    phase_generators = {}
 
     # Collect Batch Data
     batch_id = 0
@@ -96,81 +104,85 @@ def build_batch_context(number_of_runs, column_ids, template_path, execution_tim
             if run == 0:
                 batch_start_ts = execution_time
                 batch_context[col] = []
-                phase_generators[col] = []
             else:
                 batch_start_ts = batch_context[col][run-1].simulated_batch_data.iloc[-1]["event_ts"] + timedelta(seconds=batch_delay_sec)
             cur_batch_context = BatchContextGenerator(template_path=template_path, recipe_name="affinity_chrom_v1", 
                                                       batch_id=batch_id, chrom_id=col, execution_time=batch_start_ts, holds=holds)
-            cur_phase_generator = BatchContextGenerator.get_event_generator(cur_batch_context.simulated_phase_data)
             batch_context[col].append(cur_batch_context)
-            phase_generators[col].append(cur_phase_generator)
 
-    return batch_context, phase_generators
-
-def generate_batch_context_events(batch_queue, phase_queue, number_of_runs, batch_context, phase_generators, stream_rate_adjust_factor, batch_delay_sec):
-    """ Generate batch context events and push to queue """    
-
-    for run in range(number_of_runs):
-        active_generators = []
-        for col_key, gen_list in phase_generators.items():
-            gen = gen_list[run]
-            active_generators.append((col_key, gen))
-        
-        streaming = True
-        while streaming:
-            streaming = False
-
-            for col_key, gen in active_generators:
-                try:
-                    phase_event = next(gen)
-                    batch_data = batch_context[col_key][run].simulated_batch_data
-                    batch_event = batch_data[batch_data["event_ts"] == phase_event["event_ts"]].reset_index(drop=True)
-                    if not batch_event.empty:
-                        batch_queue.put(batch_event)
-                        
-                    phase_event["batch_id"] = batch_data["batch_id"][0]
-                    phase_queue.put(pd.DataFrame([phase_event]))
-
-                    phase_data = batch_context[col_key][run].simulated_phase_data
-                    cur_phase_idx = phase_data.index[
-                        phase_data["event_ts"] == phase_event["event_ts"]
-                    ]
-                    streaming = True
-                except StopIteration:
-                    continue
-            
-            try:
-                time_delay = phase_data["event_ts"].iloc[cur_phase_idx[0] + 1] - phase_data["event_ts"].iloc[cur_phase_idx[0]]
-                time.sleep(time_delay.total_seconds() / stream_rate_adjust_factor)
-            except IndexError:
-                break
-
-        time.sleep(batch_delay_sec / stream_rate_adjust_factor)
+    event_timeline = build_event_timeline(batch_context)
+
+    return batch_context, event_timeline
+
+def build_event_timeline(batch_context):
+    """
+    Merge the phase events of every column and run into one time-ordered timeline.
+    Each entry carries its phase event and, at batch boundaries, the matching batch event.
+    """
+
+    batch_timelines = []
+    for col, batch_list in batch_context.items():
+        for cur_batch_context in batch_list:
+            # batch boundaries keyed by timestamp for O(1) lookup while walking the phase events
+            batch_events = {}
+            for batch_event in cur_batch_context.simulated_batch_data.to_dict("records"):
+                batch_events.setdefault(batch_event["event_ts"], batch_event)
+            batch_id = cur_batch_context.simulated_batch_data["batch_id"][0]
+
+            batch_timeline = []
+            for phase_event in cur_batch_context.simulated_phase_data.to_dict("records"):
+                phase_event["batch_id"] = batch_id
+                phase_event["chrom_id"] = col
+                batch_timeline.append({
+                    "event_ts": phase_event["event_ts"],
+                    "chrom_id": col,
+                    "phase_event": phase_event,
+                    "batch_event": batch_events.pop(phase_event["event_ts"], None)
+                })
+            batch_timelines.append(batch_timeline)
+
+    # k-way merge of the already sorted per-batch timelines
+    return list(heapq.merge(*batch_timelines, key=lambda event: event["event_ts"]))
+
+def generate_batch_context_events(batch_queue, phase_queue, event_timeline, stream_rate_adjust_factor, pacing_policy="catch_up", pacing_max_lag_sec=None):
+    """ Generate batch context events from the merged event timeline and push to queue """    
+
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=stream_rate_adjust_factor, policy=pacing_policy,
+                                  max_lag_sec=pacing_max_lag_sec)
+    batch_event_count = 0
+    phase_event_count = 0
+
+    prev_event_ts = None
+    for event in event_timeline:
+        if prev_event_ts is not None and event["event_ts"] > prev_event_ts:
+            scheduler.wait((event["event_ts"] - prev_event_ts).total_seconds())
+        prev_event_ts = event["event_ts"]
+
+        if event["batch_event"] is not None:
+            batch_queue.put(pd.DataFrame([event["batch_event"]]))
+            batch_event_count += 1
+
+        phase_queue.put(pd.DataFrame([event["phase_event"]]))
+        phase_event_count += 1
 
     # signal completion to queues
     batch_queue.put("EOF")
     phase_queue.put("EOF")
+    print(f"batch context pacing: {scheduler.report()}")
+
+    return batch_event_count, phase_event_count
+
+def send_event_to_gcs(event_queue, bucket, event_type, producer_count=1, writer_options=None):
+    """
+    Submit batch or phase context events to GCS through a rolling parquet writer,
+    partitioned as raw/<event_type>/chrom_unit=<chrom_id>/date=<event date>/batch_id=<batch_id>/
+    """
 
-def send_event_to_gcs(event_queue, bucket, event_type):
-    """ Submit batch or phase context event to GCS """
-
-    while True:
-        event = event_queue.get()
-        if isinstance(event, str) and event == "EOF":
-            break
-        phase_str = f"phase_{event['phase'][0]}_" if event_type == "phase" else ""
-        ts = event["event_ts"][0].strftime("%Y-%m-%dT%H-%M-%S")
-        gcs_file_path = f"raw/{event_type}/batch_{event['batch_id'][0]}_{phase_str}context_{ts}.parquet"
-        parquet_to_gcs(data=event, gcs_file_path=gcs_file_path, bucket=bucket)
-
-def print_event(event_queue, event_type):
-    """ Print batch or phase context event from queue """
-
-    while True:
-        event = event_queue.get()
-        if isinstance(event, str) and event == "EOF":
-            break
-        print(f"{event_type} event: {event}")
+    writer = RollingParquetWriter(bucket, prefix=f"raw/{event_type}", partition_fn=event_partition, **(writer_options or {}))
+    for event in iter_queue(event_queue, producer_count=producer_count):
+        writer.write_rows(event.to_dict("records"))
+    writer.close()
+    print(f"{event_type} event parquet writer: {writer.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,407 @@
+import os
+import sys
+import json
+import time
+import queue
+import yaml
+import resource
+import argparse
+import platform
+import tempfile
+import contextlib
+import traceback
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from multiprocessing import Process, Queue
+
+from time_series_trends.trend_generator import TrendGenerator
+from time_series_trends.main import publish_trend_to_pubsub
+from batch_context.main import build_batch_context, send_event_to_gcs
+from sample_results.main import build_sample_dataset, send_sample_to_gcs
+from transport import BatchedQueueWriter, iter_queue
+from local_gcp import LocalBucket, LocalPublisherClient
+from local_sinks import LOCAL_SINK_TYPES, write_to_local_sink
+from trend_codec import TREND_ENCODINGS, encode_trend, decode_trend, to_time_ns
+from totalizer import TrendTotalizer
+from drift_detector import GoldenEnvelope, DriftDetector, DRIFT_SENSORS
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Data Generation Throughput Benchmarks")
+    parser.add_argument('--config', type=str, default=None, help='Path to YAML configuration file')
+    parser.add_argument('--quick_run', action='store_true', help='Run in quick mode for testing')
+    parser.add_argument('--output', type=str, default=None, help='Path to write JSON results, printed to console when not set')
+    parser.add_argument('--only', type=str, nargs="*", default=None, help='Benchmark names to run, all when not set')
+
+    return parser.parse_args()
+
+def load_config(config_path):
+    with open(config_path) as file:
+        return yaml.safe_load(file)
+
+def main():
+
+    # load configuration arguments
+    args = parse_args()
+    if args.quick_run:
+        config = {}
+        config["trend_resolution_hz"] = [0.1, 1]
+        config["holds"] = [False]
+        config["number_of_columns"] = [4]
+        config["number_of_runs"] = [2]
+        config["stream_points"] = 10000
+        config["transport_points"] = 20000
+        config["transport_batch_size"] = [1, 500]
+        config["sink_points"] = 2000
+        config["drift_units"] = [100]
+        config["drift_points"] = 20000
+    elif args.config:
+        config = load_config(args.config)
+    else:
+        raise ValueError("Either --config must be provided or --quick_run must be set.")
+
+    results = run_benchmarks(config, only=args.only)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+        print(f"benchmark results written to: {args.output}")
+    else:
+        print(output)
+
+    return
+
+def run_benchmarks(config, only=None):
+    """ Run each benchmark case in its own process and collect machine-readable results """
+
+    benchmarks = {
+        "generate_dataset": benchmark_generate_dataset,
+        "stream_generators": benchmark_stream_generators,
+        "build_batch_context": benchmark_build_batch_context,
+        "build_sample_dataset": benchmark_build_sample_dataset,
+        "queue_transport": benchmark_queue_transport,
+        "trend_encoding": benchmark_trend_encoding,
+        "sinks": benchmark_sinks,
+        "drift_detection": benchmark_drift_detection
+    }
+
+    results = []
+    for name, benchmark in benchmarks.items():
+        if only and name not in only:
+            continue
+        for case in benchmark(config):
+            results.append(run_case(name, *case))
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results
+    }
+
+def run_case(benchmark_name, case_fn, params, poll_sec=1.0):
+    """
+    Run one benchmark case in a child process so its peak RSS is measured in isolation.
+    A case that raises or whose process dies is reported with an error instead of measurements.
+    """
+
+    result_queue = Queue()
+    process = Process(target=_run_case_process, args=(case_fn, params, result_queue))
+    process.start()
+    result = None
+    while result is None:
+        # the child flushes its result to the queue before it exits
+        exited = process.exitcode is not None
+        try:
+            result = result_queue.get(timeout=poll_sec)
+        except queue.Empty:
+            if exited:
+                result = {"error": f"case process exited with code {process.exitcode} without a result"}
+    process.join()
+
+    return {"benchmark": benchmark_name, "params": params, **result}
+
+def _run_case_process(case_fn, params, result_queue):
+    """ Child process entry point: run case_fn with console output discarded and report its measurements or error """
+
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start_ts = time.perf_counter()
+            points, latencies_sec = case_fn(**params)
+            elapsed_sec = time.perf_counter() - start_ts
+        result = summarize(points, elapsed_sec, latencies_sec)
+    except Exception as error:
+        traceback.print_exc()
+        result = {"error": repr(error)}
+
+    result_queue.put(result)
+
+def summarize(points, elapsed_sec, latencies_sec):
+    """ Throughput, latency percentiles and peak RSS of a finished case """
+
+    latencies_ms = np.asarray(latencies_sec, dtype=float) * 1000
+    return {
+        "points": points,
+        "elapsed_sec": round(elapsed_sec, 6),
+        "points_per_sec": round(points / elapsed_sec, 2) if elapsed_sec > 0 else None,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies_ms, 50)), 6),
+            "p95": round(float(np.percentile(latencies_ms, 95)), 6),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 6),
+            "max": round(float(latencies_ms.max()), 6)
+        } if len(latencies_ms) else None,
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024), 2)
+    }
+
+def template_path(file_name):
+    return os.path.join(os.getenv("PYTHONPATH"), "data", file_name)
+
+# Benchmark cases: each benchmark yields (case function, params), case functions return (points, per item latencies in seconds)
+def benchmark_generate_dataset(config):
+    for hz in config["trend_resolution_hz"]:
+        for holds in config["holds"]:
+            yield case_generate_dataset, {"trend_resolution_hz": hz, "holds": holds}
+
+def case_generate_dataset(trend_resolution_hz, holds):
+    trend_gen = TrendGenerator(template_path("good_trend_template.csv"), holds=holds)
+    start_ts = time.perf_counter()
+    simulated_data = trend_gen.generate_dataset(trend_resolution_hz=trend_resolution_hz)
+
+    return len(simulated_data), [time.perf_counter() - start_ts]
+
+def benchmark_stream_generators(config):
+    for hz in config["trend_resolution_hz"]:
+        for mode in ["per_row", "row_view", "lazy"]:
+            yield case_stream_generator, {"mode": mode, "trend_resolution_hz": hz, "max_points": config["stream_points"]}
+
+def case_stream_generator(mode, trend_resolution_hz, max_points):
+    trend_gen = TrendGenerator(template_path("good_trend_template.csv"), holds=True)
+    if mode == "lazy":
+        stream = trend_gen.get_lazy_stream_generator(trend_resolution_hz=trend_resolution_hz)
+    elif mode == "row_view":
+        stream = TrendGenerator.get_row_stream_generator(trend_gen.generate_dataset(trend_resolution_hz=trend_resolution_hz))
+    else:
+        stream = TrendGenerator.get_stream_generator(trend_gen.generate_dataset(trend_resolution_hz=trend_resolution_hz))
+
+    return _time_iterator(stream, max_points)
+
+def benchmark_build_batch_context(config):
+    for columns in config["number_of_columns"]:
+        for runs in config["number_of_runs"]:
+            for holds in config["holds"]:
+                yield case_build_batch_context, {"number_of_columns": columns, "number_of_runs": runs, "holds": holds}
+
+def case_build_batch_context(number_of_columns, number_of_runs, holds):
+    start_ts = time.perf_counter()
+    _, event_timeline = build_batch_context(
+        number_of_runs=number_of_runs, column_ids=[f"chrom_{n}" for n in range(number_of_columns)],
+        template_path=template_path("good_trend_template.csv"), execution_time=datetime.now(timezone.utc),
+        batch_delay_sec=1000, holds=holds
+    )
+
+    return len(event_timeline), [time.perf_counter() - start_ts]
+
+def benchmark_build_sample_dataset(config):
+    for columns in config["number_of_columns"]:
+        for runs in config["number_of_runs"]:
+            yield case_build_sample_dataset, {"number_of_columns": columns, "number_of_runs": runs}
+
+def case_build_sample_dataset(number_of_columns, number_of_runs):
+    column_ids = [f"chrom_{n}" for n in range(number_of_columns)]
+    start_ts = time.perf_counter()
+    sample_results = build_sample_dataset(
+        template_path=template_path("sample_result.json"), number_of_runs=number_of_runs, column_ids=column_ids,
+        sampling_ts_buffer_sec=300, noise_def={"absorbance": (0, 0.16), "temperature": (0, 1.0)}, noise_scale=1.0,
+        batch_quality={col: ["good"] * number_of_runs for col in column_ids}, retest_delay_sec=60,
+        batch_duration_sec=10180, batch_delay_sec=1000, execution_time=datetime.now(timezone.utc)
+    )
+
+    return len(sample_results), [time.perf_counter() - start_ts]
+
+def benchmark_queue_transport(config):
+    for batch_size in config["transport_batch_size"]:
+        yield case_queue_transport, {"transport_batch_size": batch_size, "points": config["transport_points"]}
+
+def case_queue_transport(transport_batch_size, points):
+    queue = Queue()
+    result_queue = Queue()
+    consumer = Process(target=_consume_timed_points, args=(queue, result_queue))
+    consumer.start()
+
+    writer = BatchedQueueWriter(queue, batch_size=transport_batch_size, max_latency_sec=0.05)
+    for n in range(points):
+        writer.put({"n": n, "sent_ts": time.perf_counter(), "uv_mau": 1.0, "chrom_unit": "chrom_1"})
+    writer.close()
+
+    latencies_sec = result_queue.get()
+    consumer.join()
+
+    return points, latencies_sec
+
+def _consume_timed_points(queue, result_queue):
+    """ Transport consumer process: end-to-end latency from put to get, perf_counter is system-wide on Linux """
+
+    latencies_sec = [time.perf_counter() - data_point["sent_ts"] for data_point in iter_queue(queue)]
+    result_queue.put(latencies_sec)
+
+def benchmark_trend_encoding(config):
+    for encoding in TREND_ENCODINGS:
+        yield case_trend_encoding, {"encoding": encoding, "points": config["transport_points"]}
+
+def case_trend_encoding(encoding, points):
+    """ Encode and decode each trend point as a Pub/Sub message """
+
+    data_points = [dict(_trend_point(n), phase="Load") for n in range(points)]
+    latencies_sec = []
+    for data_point in data_points:
+        start_ts = time.perf_counter()
+        data, attributes = encode_trend(data_point, encoding=encoding)
+        decode_trend(data, attributes)
+        latencies_sec.append(time.perf_counter() - start_ts)
+
+    return points, latencies_sec
+
+def benchmark_sinks(config):
+    for stream, cloud_sink in [("trend", "publish_trend"), ("phase", "send_event_to_gcs"), ("sample", "send_sample_to_gcs")]:
+        yield case_sink, {"sink": cloud_sink, "stream": stream, "points": config["sink_points"]}
+        for sink_type in LOCAL_SINK_TYPES:
+            yield case_sink, {"sink": f"local_{sink_type}", "stream": stream, "points": config["sink_points"]}
+
+def case_sink(sink, stream, points):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bucket = LocalBucket(tmp_dir)
+        if stream == "trend":
+            items = [_trend_point(n) for n in range(points)]
+        elif stream == "phase":
+            _, event_timeline = build_batch_context(
+                number_of_runs=1, column_ids=[f"chrom_{n}" for n in range(max(1, points // 28))],
+                template_path=template_path("good_trend_template.csv"), execution_time=datetime.now(timezone.utc),
+                batch_delay_sec=0, holds=False
+            )
+            items = [_phase_event_frame(event) for event in event_timeline[:points]]
+        else:
+            items = list(_sample_documents(points))
+
+        timed_queue = TimedQueue(items)
+        if sink.startswith("local_"):
+            write_to_local_sink(timed_queue, stream, {"type": sink.removeprefix("local_"), "output_dir": tmp_dir})
+        elif sink == "publish_trend":
+            publish_trend_to_pubsub(timed_queue, publisher_client=LocalPublisherClient(keep_messages=False))
+        elif sink == "send_event_to_gcs":
+            send_event_to_gcs(timed_queue, bucket, "phase")
+        else:
+            send_sample_to_gcs(timed_queue, bucket)
+
+    return len(items), timed_queue.latencies_sec()
+
+def benchmark_drift_detection(config):
+    for units in config["drift_units"]:
+        yield case_drift_detection, {"units": units, "points": config["drift_points"]}
+
+def case_drift_detection(units, points):
+    """ Score 10 Hz trend points of many units against a golden envelope, the units taking turns point by point """
+
+    trend_gen = TrendGenerator(template_path("good_trend_template.csv"), holds=False)
+    detector = DriftDetector(_golden_envelope(trend_gen))
+    rows_per_unit = -(-points // units)
+    totalizer = TrendTotalizer()
+    rows = []
+    for data_point in trend_gen.get_lazy_stream_generator(trend_resolution_hz=10):
+        rows.append(totalizer.process(dict(data_point, chrom_unit="chrom_0")))
+        if len(rows) >= rows_per_unit:
+            break
+
+    unit_ids = [f"chrom_{n}" for n in range(units)]
+    latencies_sec = []
+    for data_point in rows:
+        for unit in unit_ids:
+            data_point["chrom_unit"] = unit
+            start_ts = time.perf_counter()
+            detector.update(data_point)
+            latencies_sec.append(time.perf_counter() - start_ts)
+
+    return len(latencies_sec), latencies_sec
+
+def _golden_envelope(trend_gen, golden_batches=5, bin_width_cv=0.05):
+    """ Envelope of a few simulated batches binned by cv, shaped like golden_envelope rows """
+
+    batch_bins = []
+    for batch in range(golden_batches):
+        dataset = trend_gen.generate_dataset(trend_resolution_hz=0.2)
+        totalizer = TrendTotalizer()
+        dataset["batch_tot_cv"] = [
+            totalizer.process({"chrom_unit": "golden", **row})["totalized_column_volumes"]
+            for row in dataset[["time_sec", "uv_mau", "flow_mL_min"]].to_dict("records")
+        ]
+        dataset["flow_mL_min"] /= 1000
+        dataset["cv_bin_start"] = (dataset["batch_tot_cv"] // bin_width_cv) * bin_width_cv
+        batch_bins.append(dataset.groupby("cv_bin_start")[list(DRIFT_SENSORS)].mean())
+
+    bins = pd.concat(batch_bins).groupby(level=0)
+    records = []
+    for (cv_bin_start, means), (_, stds) in zip(bins.mean().iterrows(), bins.std().iterrows()):
+        record = {"recipe_name": "golden", "bin_width_cv": bin_width_cv, "cv_bin_start": cv_bin_start}
+        for field, (column, _) in DRIFT_SENSORS.items():
+            record[f"{column}_mean"] = means[field]
+            record[f"{column}_std"] = stds[field]
+        records.append(record)
+
+    return GoldenEnvelope(records)
+
+def _sample_documents(points):
+    column_ids = [f"chrom_{n}" for n in range(max(1, points // 2))]
+    sample_results = build_sample_dataset(
+        template_path=template_path("sample_result.json"), number_of_runs=1, column_ids=column_ids,
+        sampling_ts_buffer_sec=300, noise_def={"absorbance": (0, 0.16), "temperature": (0, 1.0)}, noise_scale=1.0,
+        batch_quality={col: ["good"] for col in column_ids}, retest_delay_sec=60,
+        batch_duration_sec=10180, batch_delay_sec=0, execution_time=datetime.now(timezone.utc)
+    )
+    for n, document in enumerate(sample_results):
+        if n >= points:
+            break
+        yield document
+
+class TimedQueue:
+    """ Pre-filled in-process queue recording when each item is taken, used to time sink functions per item """
+
+    def __init__(self, items):
+        self.items = list(items) + ["EOF"]
+        self.get_ts = []
+
+    def get(self):
+        self.get_ts.append(time.perf_counter())
+        return self.items[len(self.get_ts) - 1]
+
+    def latencies_sec(self):
+        return np.diff(self.get_ts).tolist()
+
+def _trend_point(n):
+    timestamp = datetime.now(timezone.utc)
+    return {
+        "time_sec": float(n), "time_min": n / 60.0, "uv_mau": 3.5, "cond_mScm": 9.4, "ph": 7.2,
+        "flow_mL_min": 60000.0, "pressure_bar": 1.9, "time_iso": timestamp.isoformat(),
+        "time_ns": to_time_ns(timestamp), "chrom_unit": f"chrom_{n % 4}"
+    }
+
+def _phase_event_frame(event):
+    return pd.DataFrame([event["phase_event"]])
+
+def _time_iterator(iterator, max_points):
+    """ Consume up to max_points items, recording the time taken to produce each one """
+
+    latencies_sec = []
+    prev_ts = time.perf_counter()
+    for n, _ in enumerate(iterator):
+        now = time.perf_counter()
+        latencies_sec.append(now - prev_ts)
+        prev_ts = now
+        if n + 1 >= max_points:
+            break
+
+    return len(latencies_sec), latencies_sec
+
+if __name__ == "__main__":
+    main()
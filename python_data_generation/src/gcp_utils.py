@@ -1,49 +1,283 @@
 from google.cloud import pubsub_v1
 from google.cloud.storage.bucket import Bucket
+from collections import OrderedDict
 from typing import Callable
+import itertools
 import json
 import os
+import queue
+import time
+import threading
 import pandas as pd
 import io
 
+from trend_codec import encode_trend
+
 # GCP
 CREDENTIALS = os.environ["GOOGLE_APPLICATION_CREDENTIALS"]
 PROJECT_ID = os.environ["GCP_PROJECT_ID"]
 TOPIC_ID = "chrom-sensor-readings"   # name of topic
 SUBSCRIPTION_ID = os.environ["PUBSUB_STREAMING_SUB_ID"]
-publisher = pubsub_v1.PublisherClient(
-    publisher_options=pubsub_v1.types.PublisherOptions(enable_message_ordering=True)
-)
+TOPIC_PATH = pubsub_v1.PublisherClient.topic_path(PROJECT_ID, TOPIC_ID)
+
+# client of the one-off publish function, created on first use so importing this module opens no connection
+_publisher = None
+_publisher_lock = threading.Lock()
+
+def _get_publisher() -> pubsub_v1.PublisherClient:
+    """ Ordered publisher client shared by publish calls, created on first use """
 
-def publish(message: dict) -> None:
-    """ Publish message formatted as dictionary to GCP Pub/Sub """
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = pubsub_v1.PublisherClient(
+                publisher_options=pubsub_v1.types.PublisherOptions(enable_message_ordering=True)
+            )
 
-    topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
+    return _publisher
+
+def publish(message: dict, verbose: bool = False):
+    """ Publish message formatted as dictionary to GCP Pub/Sub, returns the delivery future """
 
     ordering_key = message.get("chrom_unit", "default")
 
-    future = publisher.publish(
-        topic_path,
+    future = _get_publisher().publish(
+        TOPIC_PATH,
         json.dumps(message).encode("utf-8"),
         source="python_time_series_trend_generator",
         ordering_key=ordering_key
     )
 
-    print(f"publishing data to pubsub: {message}")
+    if verbose:
+        print(f"publishing data to pubsub: {message}")
+
+    return future
+
+class TrendPublisher:
+    """
+    High-throughput Pub/Sub publisher for trend data points.
+    Messages are batched by the client library, outstanding publishes are bounded by flow control and
+    delivery futures are tracked in the background with retries, keeping per chrom_unit ordering keys.
+    A failed publish pauses its ordering key: the key's failed message and every later one are held, and a retry
+    thread resumes the key after a backoff and republishes them in their original order.
+
+    Params:
+        client (PublisherClient): Publisher client to use, created from the batch and flow control settings when None
+        topic_id (str): Pub/Sub topic to publish to
+        max_messages (int): Maximum number of messages per publish batch
+        max_bytes (int): Maximum size in bytes of a publish batch
+        max_latency_sec (float): Maximum time a message waits before its batch is sent
+        flow_control_messages (int): Maximum number of outstanding messages before publish blocks
+        flow_control_bytes (int): Maximum outstanding bytes before publish blocks
+        max_retries (int): Number of times the held messages of a failed ordering key are republished
+        report_every_sec (float): Interval between throughput reports, no periodic report when None
+        encoding (str): Message encoding, compact struct or json, see trend_codec
+
+    Methods:
+        publish: Publish a message formatted as dictionary without waiting for delivery
+        flush: Wait until every outstanding message is delivered or has failed
+        stats: Throughput and error counters
+        close: Flush outstanding messages and print final counters
+    """
+
+    def __init__(self, client=None, topic_id: str = TOPIC_ID, max_messages: int = 1000, max_bytes: int = 1_000_000,
+                 max_latency_sec: float = 0.05, flow_control_messages: int = 10_000, flow_control_bytes: int = 10_000_000,
+                 max_retries: int = 3, report_every_sec: float = 30.0, encoding: str = "struct"):
+        if client is None:
+            client = pubsub_v1.PublisherClient(
+                batch_settings=pubsub_v1.types.BatchSettings(
+                    max_messages=max_messages,
+                    max_bytes=max_bytes,
+                    max_latency=max_latency_sec
+                ),
+                publisher_options=pubsub_v1.types.PublisherOptions(
+                    enable_message_ordering=True,
+                    flow_control=pubsub_v1.types.PublishFlowControl(
+                        message_limit=flow_control_messages,
+                        byte_limit=flow_control_bytes,
+                        limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.BLOCK
+                    )
+                )
+            )
+        self.client = client
+        self.topic_path = client.topic_path(PROJECT_ID, topic_id)
+        self.max_retries = max_retries
+        self.report_every_sec = report_every_sec
+        self.encoding = encoding
+        self.published = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.bytes_published = 0
+        self._outstanding = 0
+        self._condition = threading.Condition()
+        self._start_ts = time.monotonic()
+        self._last_report_ts = self._start_ts
+        self._keys = {}
+        self._sequence = itertools.count()
+        self._retry_queue = queue.Queue()
+        self._retry_thread = threading.Thread(target=self._retry_loop, name="pubsub-retry", daemon=True)
+        self._retry_thread.start()
+
+    def publish(self, message: dict) -> None:
+        """ Publish message formatted as dictionary without waiting for delivery """
+
+        data, attributes = encode_trend(message, encoding=self.encoding)
+        ordering_key = message.get("chrom_unit", "default")
+        with self._condition:
+            state = self._keys.get(ordering_key)
+            if state is None:
+                state = self._keys[ordering_key] = _OrderingKeyState()
+
+        with state.send_lock:
+            with self._condition:
+                self._outstanding += 1
+                self.published += 1
+                self.bytes_published += len(data)
+                sequence = next(self._sequence)
+                state.pending[sequence] = (data, attributes)
+                # a paused key holds new messages until the retry thread republishes the failed ones before them
+                send = not state.paused
+                if send:
+                    state.inflight.add(sequence)
+            if send:
+                self._send(data, attributes, ordering_key, sequence)
+
+        if self.report_every_sec is not None and time.monotonic() - self._last_report_ts >= self.report_every_sec:
+            self._last_report_ts = time.monotonic()
+            print(f"pubsub publisher stats: {self.stats()}")
+
+    def flush(self, timeout: float = None) -> bool:
+        """ Wait until every outstanding message is delivered or has failed, returns False on timeout """
+
+        with self._condition:
+            return self._condition.wait_for(lambda: self._outstanding == 0, timeout=timeout)
+
+    def stats(self) -> dict:
+        """ Throughput and error counters """
+
+        elapsed_sec = max(time.monotonic() - self._start_ts, 1e-9)
+        with self._condition:
+            return {
+                "published": self.published,
+                "delivered": self.delivered,
+                "retried": self.retried,
+                "failed": self.failed,
+                "outstanding": self._outstanding,
+                "bytes_published": self.bytes_published,
+                "messages_per_sec": round(self.delivered / elapsed_sec, 2)
+            }
+
+    def close(self, timeout: float = None) -> None:
+        """ Flush outstanding messages and print final counters """
+
+        self.flush(timeout=timeout)
+        print(f"pubsub publisher stats: {self.stats()}")
+
+    def _send(self, data, attributes, ordering_key, sequence):
+        """ Submit message to the client and track its delivery future """
+
+        future = self.client.publish(
+            self.topic_path,
+            data,
+            source="python_time_series_trend_generator",
+            ordering_key=ordering_key,
+            **attributes
+        )
+        future.add_done_callback(lambda f: self._on_done(f, ordering_key, sequence))
+
+    def _on_done(self, future, ordering_key, sequence):
+        """ Delivery callback, runs on the client's background threads and never blocks """
+
+        error = future.exception()
+        with self._condition:
+            state = self._keys[ordering_key]
+            state.inflight.discard(sequence)
+            if error is None:
+                state.pending.pop(sequence, None)
+                state.attempt = 0
+                self.delivered += 1
+                self._outstanding -= 1
+            else:
+                # the client fails every later message of the paused key, one retry republishes them all
+                state.paused = True
+                state.error = error
+                if not state.retry_scheduled:
+                    state.retry_scheduled = True
+                    state.attempt += 1
+                    self._retry_queue.put((time.monotonic() + min(0.1 * 2 ** (state.attempt - 1), 5.0), ordering_key))
+            self._condition.notify_all()
+
+    def _retry_loop(self):
+        """ Republish the held messages of failed ordering keys once their backoff has passed """
+
+        while True:
+            retry_ts, ordering_key = self._retry_queue.get()
+            time.sleep(max(0.0, retry_ts - time.monotonic()))
+            self._retry_key(ordering_key)
+
+    def _retry_key(self, ordering_key):
+        """ Resume a paused ordering key and republish its held messages in publish order """
+
+        state = self._keys[ordering_key]
+        with state.send_lock:
+            with self._condition:
+                # messages sent before the key paused fail too, wait until their callbacks have run
+                self._condition.wait_for(lambda: not state.inflight)
+                state.retry_scheduled = False
+                state.paused = False
+                if state.attempt > self.max_retries:
+                    print(f"Error publishing to pubsub after {state.attempt} attempts, dropping {len(state.pending)} "
+                          f"messages of {ordering_key}: {state.error}")
+                    self.failed += len(state.pending)
+                    self._outstanding -= len(state.pending)
+                    state.pending.clear()
+                    state.attempt = 0
+                    self._condition.notify_all()
+                    retry = []
+                else:
+                    retry = list(state.pending.items())
+                    self.retried += len(retry)
+                    state.inflight.update(sequence for sequence, _ in retry)
+
+            self.client.resume_publish(self.topic_path, ordering_key)
+            for sequence, (data, attributes) in retry:
+                self._send(data, attributes, ordering_key, sequence)
+
+class _OrderingKeyState:
+    """ Messages of one ordering key not yet delivered, in publish order, and the key's retry state """
+
+    __slots__ = ["pending", "inflight", "paused", "retry_scheduled", "attempt", "error", "send_lock"]
+
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.inflight = set()
+        self.paused = False
+        self.retry_scheduled = False
+        self.attempt = 0
+        self.error = None
+        # held while a message of the key is handed to the client, so publish order is kept across retries
+        self.send_lock = threading.Lock()
+
+def subscribe(callback_fn: Callable, flow_control_messages: int = 1000, flow_control_bytes: int = 100 * 1024 * 1024,
+              timeout: float = None) -> None:
+    """ Stream messages from the trend subscription to callback_fn, blocking until stopped or timeout seconds pass """
 
-def subscribe(callback_fn: Callable) -> None:
     subscriber = pubsub_v1.SubscriberClient()
     subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_ID)
+    flow_control = pubsub_v1.types.FlowControl(max_messages=flow_control_messages, max_bytes=flow_control_bytes)
 
     print(f"Listening for messages from: {subscription_path}")
-    subscriber.subscribe(subscription_path, callback=callback_fn)
+    streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback_fn, flow_control=flow_control)
 
-    # Keep process running
-    try:
-        while True:
-            pass
-    except KeyboardInterrupt:
-        print("Stopped")
+    # block on the streaming pull instead of spinning so the idle process uses no CPU
+    with subscriber:
+        try:
+            streaming_pull_future.result(timeout=timeout)
+        except (KeyboardInterrupt, TimeoutError):
+            streaming_pull_future.cancel()
+            streaming_pull_future.result()
+            print("Stopped")
 
 def parquet_to_gcs(data: pd.DataFrame, gcs_file_path: str, bucket: Bucket, verbose: bool = True) -> None:
     """ Upload local parquet file to GCS bucket """
@@ -62,7 +296,6 @@ def parquet_to_gcs(data: pd.DataFrame, gcs_file_path: str, bucket: Bucket, verbo
     if verbose:
         print(f"Uploaded {len(data)} rows to GCS at path: {gcs_file_path}")
 
-
 def json_to_gcs(data: dict, gcs_file_path: str, bucket: Bucket, verbose: bool = True) -> None:
     """ Upload local json file to GCS bucket """
 
@@ -81,4 +314,17 @@ def json_to_gcs(data: dict, gcs_file_path: str, bucket: Bucket, verbose: bool =
     if verbose:
         print(f"Uploaded sample result json to GCS bucket: {data["sample_metadata"]}")
 
+def trend_partition(data_point: dict) -> dict:
+    """ Hive partition values of a trend data point, matching the raw/trend layout written by the gcs consumer """
+
+    return {"chrom_unit": data_point["chrom_unit"], "date": data_point["time_iso"][:10]}
+
+def event_partition(event: dict) -> dict:
+    """ Hive partition values of a batch or phase context event """
+
+    return {"chrom_unit": event["chrom_id"], "date": event["event_ts"].date().isoformat(), "batch_id": event["batch_id"]}
+
+def sample_object_path(sample_event: dict) -> str:
+    """ Object path of a sample result document """
 
+    return f"raw/sample_{sample_event['sample_metadata']['sample_id']}_results_{sample_event['test_metadata']['date']}.json"
@@ -0,0 +1,127 @@
+from concurrent.futures import Future
+import os
+import shutil
+import threading
+
+class LocalPublisherClient:
+    """
+    In-process stand-in for pubsub_v1.PublisherClient used for tests and benchmarks.
+    Published messages are kept in memory and their futures resolve immediately. Like the real client, a failed
+    publish pauses its ordering key and later publishes to the key fail until it is resumed.
+
+    Params:
+        fail_every (int): Fail every n-th publish to an unpaused ordering key to exercise retry handling, never fail
+            when None
+        keep_messages (bool): Whether to keep published messages in memory
+
+    Methods:
+        topic_path: Build the fully qualified topic path
+        publish: Record a message and return its resolved future
+        resume_publish: Record that a paused ordering key was resumed
+    """
+
+    def __init__(self, fail_every: int = None, keep_messages: bool = True):
+        self.fail_every = fail_every
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.publish_calls = 0
+        self.accepted_calls = 0
+        self.resumed_keys = []
+        self.paused_keys = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def topic_path(project_id: str, topic_id: str) -> str:
+        """ Build the fully qualified topic path """
+
+        return f"projects/{project_id}/topics/{topic_id}"
+
+    def publish(self, topic: str, data: bytes, ordering_key: str = "", **attributes) -> Future:
+        """ Record a message and return its resolved future """
+
+        future = Future()
+        with self._lock:
+            self.publish_calls += 1
+            paused = ordering_key in self.paused_keys
+            if not paused:
+                self.accepted_calls += 1
+            fail = paused or (self.fail_every is not None and self.accepted_calls % self.fail_every == 0)
+            if fail and ordering_key:
+                self.paused_keys.add(ordering_key)
+            if not fail and self.keep_messages:
+                self.messages.append({"topic": topic, "data": data, "ordering_key": ordering_key, "attributes": attributes})
+            message_id = str(self.publish_calls)
+
+        if paused:
+            future.set_exception(RuntimeError(f"ordering key {ordering_key} is paused, message {message_id} not published"))
+        elif fail:
+            future.set_exception(RuntimeError(f"simulated publish failure for message {message_id}"))
+        else:
+            future.set_result(message_id)
+
+        return future
+
+    def resume_publish(self, topic: str, ordering_key: str) -> None:
+        """ Record that a paused ordering key was resumed """
+
+        with self._lock:
+            self.resumed_keys.append(ordering_key)
+            self.paused_keys.discard(ordering_key)
+
+
+class LocalBucket:
+    """
+    Local filesystem stand-in for google.cloud.storage.bucket.Bucket used for tests, benchmarks and local runs.
+    Objects are written under root_dir at their object path, e.g. root_dir/raw/batch/<file>.parquet
+
+    Params:
+        root_dir (str): Directory holding the bucket objects
+        name (str): Bucket name
+
+    Methods:
+        blob: Get a blob handle for an object path
+        list_blob_names: Object paths currently stored in the bucket
+    """
+
+    def __init__(self, root_dir: str, name: str = "local-bucket"):
+        self.root_dir = root_dir
+        self.name = name
+        os.makedirs(root_dir, exist_ok=True)
+
+    def blob(self, blob_name: str):
+        """ Get a blob handle for an object path """
+
+        return LocalBlob(bucket=self, name=blob_name)
+
+    def list_blob_names(self) -> list:
+        """ Object paths currently stored in the bucket """
+
+        blob_names = []
+        for dir_path, _, file_names in os.walk(self.root_dir):
+            for file_name in file_names:
+                blob_names.append(os.path.relpath(os.path.join(dir_path, file_name), self.root_dir).replace(os.sep, "/"))
+
+        return sorted(blob_names)
+
+
+class LocalBlob:
+    """ Object handle of a LocalBucket, supporting the upload and download calls used by this project """
+
+    def __init__(self, bucket: LocalBucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root_dir, *name.split("/"))
+
+    def upload_from_file(self, file_obj, content_type: str = None) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as file:
+            shutil.copyfileobj(file_obj, file)
+
+    def upload_from_string(self, data, content_type: str = None) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as file:
+            file.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+    def download_as_bytes(self) -> bytes:
+        with open(self.path, "rb") as file:
+            return file.read()
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import pandas as pd
+
+from parquet_writer import RollingParquetWriter
+from local_gcp import LocalBucket
+from gcp_utils import json_to_gcs, trend_partition, event_partition, sample_object_path
+from transport import iter_queue
+
+LOCAL_SINK_TYPES = ["print", "null", "ndjson", "parquet", "gcs"]
+STREAMS = ["trend", "batch", "phase", "sample"]
+
+class LocalSink:
+    """
+    Local destination for one generated stream in local_test mode, selected by the local_sink config.
+    Trend data points and sample documents arrive as dicts, batch and phase events as one-row DataFrames.
+
+    Params:
+        stream (str): Stream written by the sink, one of trend, batch, phase or sample
+        sink_type (str): Where records go
+            print: print every record to stdout, for eyeballing small runs
+            null: count records only, to profile the generators without sink cost
+            ndjson: buffered newline delimited JSON file per stream, output_dir/<stream>.ndjson
+            parquet: rolling parquet files per stream under output_dir/<stream>/
+            gcs: local filesystem bucket under output_dir with the raw/... object paths of the cloud pipeline
+        output_dir (str): Directory the ndjson, parquet and gcs sinks write to
+        ndjson_buffer_bytes (int): Write buffer size of the ndjson file
+        writer_options (dict): RollingParquetWriter options of the parquet and gcs sinks
+
+    Methods:
+        write: Write one item from the stream
+        close: Flush and close any open files
+        stats: Item and record counters
+    """
+
+    def __init__(self, stream: str, sink_type: str = "null", output_dir: str = "local_output",
+                 ndjson_buffer_bytes: int = 1024 * 1024, writer_options: dict = None):
+        if stream not in STREAMS:
+            raise ValueError(f"Error with stream argument: must be one of {STREAMS}")
+        if sink_type not in LOCAL_SINK_TYPES:
+            raise ValueError(f"Error with sink_type argument: must be one of {LOCAL_SINK_TYPES}")
+        self.stream = stream
+        self.sink_type = sink_type
+        self.output_dir = output_dir
+        self.items = 0
+        self.records = 0
+        self._file = None
+        self._writer = None
+        self._bucket = None
+        self._start_ts = time.monotonic()
+
+        if sink_type in ["ndjson", "parquet", "gcs"]:
+            os.makedirs(output_dir, exist_ok=True)
+        if sink_type == "ndjson":
+            self._file = open(os.path.join(output_dir, f"{stream}.ndjson"), "w", buffering=ndjson_buffer_bytes)
+        elif sink_type == "parquet":
+            self._writer = RollingParquetWriter(LocalBucket(output_dir), prefix=stream, **(writer_options or {}))
+        elif sink_type == "gcs":
+            self._bucket = LocalBucket(output_dir)
+            if stream == "trend":
+                self._writer = RollingParquetWriter(self._bucket, prefix="raw/trend", partition_fn=trend_partition,
+                                                    **(writer_options or {}))
+            elif stream in ["batch", "phase"]:
+                self._writer = RollingParquetWriter(self._bucket, prefix=f"raw/{stream}", partition_fn=event_partition,
+                                                    **(writer_options or {}))
+
+    def write(self, item) -> None:
+        """ Write one trend data point, context event or sample document """
+
+        self.items += 1
+        if self.sink_type == "print":
+            self.records += len(item) if isinstance(item, pd.DataFrame) else 1
+            print(f"{self.stream} data: {item}")
+        elif self.sink_type == "null":
+            self.records += len(item) if isinstance(item, pd.DataFrame) else 1
+        elif self.sink_type == "ndjson":
+            rows = item.to_dict("records") if isinstance(item, pd.DataFrame) else [item]
+            for row in rows:
+                self._file.write(json.dumps(row, default=_json_default))
+                self._file.write("\n")
+            self.records += len(rows)
+        elif self.sink_type == "gcs" and self.stream == "sample":
+            # sample results land as one json document each, as in send_sample_to_gcs
+            json_to_gcs(data=item, gcs_file_path=sample_object_path(item), bucket=self._bucket, verbose=False)
+            self.records += 1
+        else:
+            rows = item.to_dict("records") if isinstance(item, pd.DataFrame) else [item]
+            self._writer.write_rows(rows)
+            self.records += len(rows)
+
+    def close(self) -> None:
+        """ Flush and close any open files """
+
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+    def stats(self) -> dict:
+        """ Item and record counters """
+
+        elapsed_sec = time.monotonic() - self._start_ts
+        stats = {
+            "sink": self.sink_type,
+            "items": self.items,
+            "records": self.records,
+            "records_per_sec": round(self.records / elapsed_sec, 1) if elapsed_sec > 0 else None
+        }
+        if self._writer is not None:
+            stats["files_written"] = self._writer.stats()["files_written"]
+
+        return stats
+
+
+def _json_default(value):
+    """ JSON encoding of event timestamps and numpy scalars """
+
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def write_to_local_sink(queue, stream, sink_config, producer_count=1, writer_options=None) -> None:
+    """ Drain a stream's queue into the local sink described by sink_config and print its counters """
+
+    # a bare `type: null` in yaml loads as None
+    sink_type = sink_config["type"] or "null"
+    sink = LocalSink(stream, sink_type=sink_type, output_dir=sink_config["output_dir"],
+                     ndjson_buffer_bytes=sink_config.get("ndjson_buffer_bytes", 1024 * 1024), writer_options=writer_options)
+    for item in iter_queue(queue, producer_count=producer_count):
+        sink.write(item)
+    sink.close()
+    print(f"{stream} local sink: {sink.stats()}")
@@ -4,12 +4,18 @@ import yaml
 import argparse
 from datetime import datetime, timedelta, timezone
 import random
+import time
+import queue
+import threading
+import traceback
 from multiprocessing import Process, Queue
 from google.cloud import storage
 
-from time_series_trends.main import generate_stream, publish_trend_to_pubsub, print_trend
-from batch_context.main import build_batch_context, generate_batch_context_events, send_event_to_gcs, print_event
-from sample_results.main import build_sample_dataset, generate_sample_result_events, send_sample_to_gcs, print_sample
+from time_series_trends.main import generate_stream, publish_trend_to_pubsub
+from batch_context.main import build_batch_context, generate_batch_context_events, send_event_to_gcs
+from sample_results.main import build_sample_dataset, generate_sample_result_events, send_sample_to_gcs
+from local_sinks import write_to_local_sink
+from transport import EOF
 
 batch_queue = Queue()
 phase_queue = Queue()
@@ -39,6 +45,9 @@ def main():
         # Quick run trend requirements:
         config["trend_resolution_hz"] = 0.1
         config["stream_rate_adjust_factor"] = 1000
+        config["pacing_policy"] = "catch_up"
+        config["pacing_max_lag_sec"] = None
+        config["fleet_workers"] = 1
         config["holds"] = False
         config["number_of_runs"] = 2
         config["number_of_columns"] = 4
@@ -59,11 +68,25 @@ def main():
             }
         }
         config["local_test"] = True
+        config["local_sink"] = {"type": "null", "output_dir": "local_output"}
 
         # Quick run sampling requirements:
         config["sampling_ts_buffer_sec"] = 0
         config["retest_delay_sec"] = 0
 
+        # Quick run transport requirements:
+        config["transport_batch_size"] = 500
+        config["transport_max_latency_sec"] = 0.5
+
+        # Quick run trend generation mode:
+        config["lazy_generation"] = True
+        config["template_cache_dir"] = None
+        config["stream_state_dir"] = None
+        config["trend_encoding"] = "struct"
+
+        # Quick run gcs file requirements:
+        config["parquet_writer"] = {"target_file_rows": 100000, "row_group_size": 10000, "max_file_age_sec": 300, "compression": "zstd"}
+
     elif args.config:
         config = load_config(args.config)
     else:
@@ -84,7 +107,7 @@ def main():
                 batch_quality[cur_col_id].append("good")
     
     # pre-load datasets
-    batch_context, phase_generators = build_batch_context(
+    batch_context, event_timeline = build_batch_context(
         number_of_runs=config["number_of_runs"], 
         column_ids=col_ids, 
         template_path=batch_template_path,
@@ -108,25 +131,78 @@ def main():
         execution_time=start_time
     )
 
+    # fleet mode splits the columns into shards, each generated by its own worker process
+    fleet_workers = max(1, min(config["fleet_workers"], len(col_ids)))
+
     if config["local_test"]:
-        trend_process = Process(target=print_trend, args=(trend_queue,))
-        batch_process = Process(target=print_event, args=(batch_queue, "batch"))
-        phase_process = Process(target=print_event, args=(phase_queue, "phase"))
-        sample_process = Process(target=print_sample, args=(sample_queue,))
+        trend_process = Process(target=write_to_local_sink, args=(trend_queue, "trend", config["local_sink"], fleet_workers),
+                                kwargs={"writer_options": config["parquet_writer"]})
+        batch_process = Process(target=write_to_local_sink, args=(batch_queue, "batch", config["local_sink"], fleet_workers),
+                                kwargs={"writer_options": config["parquet_writer"]})
+        phase_process = Process(target=write_to_local_sink, args=(phase_queue, "phase", config["local_sink"], fleet_workers),
+                                kwargs={"writer_options": config["parquet_writer"]})
+        sample_process = Process(target=write_to_local_sink, args=(sample_queue, "sample", config["local_sink"], fleet_workers))
     else:
-        trend_process = Process(target=publish_trend_to_pubsub, args=(trend_queue,))
+        trend_process = Process(target=publish_trend_to_pubsub, args=(trend_queue, fleet_workers),
+                                kwargs={"encoding": config["trend_encoding"]})
         gcs_bucket_batch = os.environ["GCP_BATCH_BUCKET"]
         gcs_bucket_sample = os.environ["GCP_SAMPLE_BUCKET"]
         client = storage.Client()
         bucket_batch = client.bucket(gcs_bucket_batch)
         bucket_sample = client.bucket(gcs_bucket_sample)
-        batch_process = Process(target=send_event_to_gcs, args=(batch_queue, bucket_batch, "batch"))
-        phase_process = Process(target=send_event_to_gcs, args=(phase_queue, bucket_batch, "phase"))
-        sample_process = Process(target=send_sample_to_gcs, args=(sample_queue, bucket_sample))
+        batch_process = Process(target=send_event_to_gcs, args=(batch_queue, bucket_batch, "batch", fleet_workers),
+                                kwargs={"writer_options": config["parquet_writer"]})
+        phase_process = Process(target=send_event_to_gcs, args=(phase_queue, bucket_batch, "phase", fleet_workers),
+                                kwargs={"writer_options": config["parquet_writer"]})
+        sample_process = Process(target=send_sample_to_gcs, args=(sample_queue, bucket_sample, fleet_workers))
 
     # configure parallel streaming
-    processes = [
-        Process(target=generate_stream, args=(
+    if fleet_workers > 1:
+        report_queue = Queue()
+        generator_processes = []
+        for shard_no in range(fleet_workers):
+            shard_col_ids = col_ids[shard_no::fleet_workers]
+            generator_processes.append(Process(target=run_shard, args=(
+                shard_no, shard_col_ids, config, batch_quality, event_timeline,
+                sample_results, start_time, report_queue
+            )))
+    else:
+        generator_processes = [
+            Process(target=target, args=args, kwargs=kwargs)
+            for target, args, kwargs in get_generator_targets(col_ids, config, batch_quality, event_timeline,
+                                                              sample_results, start_time)
+        ]
+    processes = generator_processes + [
+        trend_process,
+        batch_process,
+        phase_process,
+        sample_process
+    ]
+
+    for process in processes:
+        process.start()
+
+    if fleet_workers > 1:
+        shard_reports = collect_shard_reports(report_queue, generator_processes)
+
+    for process in processes:
+        process.join()
+
+    if fleet_workers > 1:
+        for shard_report in shard_reports:
+            print(f"fleet shard report: {shard_report}")
+        total_points = sum(shard_report["trend_points"] for shard_report in shard_reports)
+        elapsed_sec = max(shard_report["elapsed_sec"] for shard_report in shard_reports)
+        print(f"fleet total: {total_points} trend points from {len(col_ids)} columns at {total_points / max(elapsed_sec, 1e-9):.1f} points/sec")
+        failed_shards = [shard_report["shard"] for shard_report in shard_reports if shard_report["errors"]]
+        if failed_shards:
+            raise RuntimeError(f"Error with fleet shards {failed_shards}: see the shard reports above")
+
+def get_generator_targets(col_ids, config, batch_quality, event_timeline, sample_results, start_time):
+    """ Trend, batch context and sample result generator functions with their arguments for a set of columns """
+
+    return [
+        (generate_stream, (
             trend_queue,
             config["trend_resolution_hz"],
             config["stream_rate_adjust_factor"],
@@ -138,32 +214,95 @@ def main():
             config["time_between_batches_sec"],
             config["noise_def"]["trend_noise"],
             start_time
-        )),
-        Process(target=generate_batch_context_events, args=(
+        ), {
+            "transport_batch_size": config["transport_batch_size"],
+            "transport_max_latency_sec": config["transport_max_latency_sec"],
+            "lazy_generation": config["lazy_generation"],
+            "template_cache_dir": config["template_cache_dir"],
+            "pacing_policy": config["pacing_policy"],
+            "pacing_max_lag_sec": config["pacing_max_lag_sec"],
+            "stream_state_dir": config["stream_state_dir"]
+        }),
+        (generate_batch_context_events, (
             batch_queue,
             phase_queue,
-            config["number_of_runs"], 
-            batch_context, 
-            phase_generators, 
+            [event for event in event_timeline if event["chrom_id"] in col_ids], 
             config["stream_rate_adjust_factor"], 
-            config["time_between_batches_sec"]
-        )),
-        Process(target=generate_sample_result_events, args=(
+            config["pacing_policy"],
+            config["pacing_max_lag_sec"]
+        ), {}),
+        (generate_sample_result_events, (
             sample_queue,
-            sample_results, 
-            config["stream_rate_adjust_factor"]
-        )),
-        trend_process,
-        batch_process,
-        phase_process,
-        sample_process
+            sample_results.filter_columns(col_ids), 
+            config["stream_rate_adjust_factor"],
+            config["pacing_policy"],
+            config["pacing_max_lag_sec"]
+        ), {})
     ]
 
-    for process in processes:
-        process.start()
+def run_shard(shard_no, shard_col_ids, config, batch_quality, event_timeline, sample_results, start_time, report_queue):
+    """ Run the trend, batch context and sample result generators for one shard of columns and report its throughput """
 
-    for process in processes:
-        process.join()
+    start_ts = time.monotonic()
+    results = {"trend": 0, "batch_context": (0, 0), "sample": 0}
+    errors = {}
+    output_queues = {"trend": [trend_queue], "batch_context": [batch_queue, phase_queue], "sample": [sample_queue]}
+
+    def run_generator(name, target, args, kwargs):
+        try:
+            results[name] = target(*args, **kwargs)
+        except Exception as error:
+            traceback.print_exc()
+            errors[name] = repr(error)
+            # the failed generator never signalled end of stream, do it so its sinks still finish
+            for output_queue in output_queues[name]:
+                output_queue.put(EOF)
+
+    threads = [
+        threading.Thread(target=run_generator, args=(name, target, args, kwargs))
+        for name, (target, args, kwargs) in zip(
+            ["trend", "batch_context", "sample"],
+            get_generator_targets(shard_col_ids, config, batch_quality, event_timeline, sample_results, start_time)
+        )
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed_sec = time.monotonic() - start_ts
+    batch_events, phase_events = results["batch_context"]
+    report_queue.put({
+        "shard": shard_no,
+        "columns": len(shard_col_ids),
+        "trend_points": results["trend"],
+        "batch_events": batch_events,
+        "phase_events": phase_events,
+        "sample_events": results["sample"],
+        "elapsed_sec": round(elapsed_sec, 3),
+        "trend_points_per_sec": round(results["trend"] / elapsed_sec, 1),
+        "errors": errors
+    })
+
+def collect_shard_reports(report_queue, shard_processes, poll_sec=1.0):
+    """ Wait for the report of every fleet shard, a shard that exits without reporting is reported as failed """
+
+    reports = {}
+    while len(reports) < len(shard_processes):
+        # a shard's report is flushed to the queue before its process exits
+        exited = [shard_no for shard_no, process in enumerate(shard_processes) if process.exitcode is not None]
+        try:
+            shard_report = report_queue.get(timeout=poll_sec)
+            reports[shard_report["shard"]] = shard_report
+        except queue.Empty:
+            for shard_no in exited:
+                if shard_no not in reports:
+                    reports[shard_no] = {
+                        "shard": shard_no, "trend_points": 0, "batch_events": 0, "phase_events": 0, "sample_events": 0,
+                        "elapsed_sec": 0.0, "errors": {"shard": f"exited with code {shard_processes[shard_no].exitcode} without a report"}
+                    }
+
+    return [reports[shard_no] for shard_no in sorted(reports)]
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
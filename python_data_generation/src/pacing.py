@@ -0,0 +1,82 @@
+import time
+
+PACING_POLICIES = ["catch_up", "drop", "as_fast_as_possible"]
+
+class DeadlineScheduler:
+    """
+    Real-time pacing for the event generators. Each wait advances an absolute deadline on the monotonic clock,
+    so time spent generating, serializing and queueing events is absorbed instead of accumulating as drift.
+
+    Params:
+        stream_rate_adjust_factor (float): Speed-up factor applied to simulated time delays
+        policy (str): How missed deadlines are handled
+            catch_up: emit without sleeping until the schedule is met again
+            drop: drop the missed time and re-anchor the schedule once lag exceeds max_lag_sec
+            as_fast_as_possible: never sleep, for replay and load tests
+        max_lag_sec (float): Lag tolerated by the drop policy before the schedule is re-anchored, one tick (the
+            latest non-zero delay between deadlines) when None
+
+    Methods:
+        wait: Sleep until the next deadline, sim_delay_sec of simulated time after the previous one
+        report: Summary of pacing lag
+    """
+
+    def __init__(self, stream_rate_adjust_factor: float = 1.0, policy: str = "catch_up", max_lag_sec: float = None):
+        if policy not in PACING_POLICIES:
+            raise ValueError(f"Error with policy argument: must be one of {PACING_POLICIES}")
+        if stream_rate_adjust_factor <= 0:
+            raise ValueError("Error with stream_rate_adjust_factor argument: must be greater than 0")
+        self.stream_rate_adjust_factor = stream_rate_adjust_factor
+        self.policy = policy
+        self.max_lag_sec = max_lag_sec
+        self.wait_count = 0
+        self.late_count = 0
+        self.lag_sec = 0.0
+        self.peak_lag_sec = 0.0
+        self.dropped_sec = 0.0
+        self._deadline = None
+        self._tick_sec = 0.0
+
+    def wait(self, sim_delay_sec: float) -> float:
+        """ Sleep until the next deadline and return the current lag behind schedule in seconds """
+
+        self.wait_count += 1
+        if self.policy == "as_fast_as_possible":
+            return 0.0
+
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        delay_sec = sim_delay_sec / self.stream_rate_adjust_factor
+        self._deadline += delay_sec
+        if delay_sec > 0:
+            self._tick_sec = delay_sec
+
+        lag_sec = now - self._deadline
+        if lag_sec <= 0:
+            time.sleep(-lag_sec)
+            lag_sec = 0.0
+        else:
+            self.late_count += 1
+            max_lag_sec = self._tick_sec if self.max_lag_sec is None else self.max_lag_sec
+            if self.policy == "drop" and lag_sec > max_lag_sec:
+                # give up on the missed time instead of bursting to catch up
+                self.dropped_sec += lag_sec
+                self._deadline = now
+
+        self.lag_sec = lag_sec
+        self.peak_lag_sec = max(self.peak_lag_sec, lag_sec)
+
+        return lag_sec
+
+    def report(self) -> dict:
+        """ Summary of pacing lag """
+
+        return {
+            "policy": self.policy,
+            "waits": self.wait_count,
+            "late_waits": self.late_count,
+            "current_lag_sec": round(self.lag_sec, 6),
+            "peak_lag_sec": round(self.peak_lag_sec, 6),
+            "dropped_sec": round(self.dropped_sec, 6)
+        }
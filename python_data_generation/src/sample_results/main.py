@@ -2,14 +2,16 @@ from google.cloud import storage
 import os
 import pandas as pd
 import json
-import time
 import yaml
 import argparse
 from datetime import datetime, timedelta, timezone
 from multiprocessing import Process, Queue
 
-from sample_results.sample_result_generator import SampleResultGenerator
-from gcp_utils import json_to_gcs
+from sample_results.sample_result_generator import SampleResultGenerator, SampleResultSet
+from gcp_utils import json_to_gcs, sample_object_path
+from pacing import DeadlineScheduler
+from transport import iter_queue
+from local_sinks import write_to_local_sink
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Sample Result File Generation Simulator")
@@ -46,7 +48,10 @@ def main():
         config["batch_duration_sec"] = 10180
         config["batch_delay_sec"] = 0
         config["stream_rate_adjust_factor"] = 1000
+        config["pacing_policy"] = "catch_up"
+        config["pacing_max_lag_sec"] = None
         config["local_test"] = True
+        config["local_sink"] = {"type": "null", "output_dir": "local_output"}
     elif args.config:
         config = load_config(args.config)
     else:
@@ -58,24 +63,26 @@ def main():
     sample_queue = Queue()
 
     # build sample result dataset
-    build_sample_dataset_args = {key: value for key, value in config.items() if key not in ["stream_rate_adjust_factor", "local_test"]}
+    build_sample_dataset_args = {key: value for key, value in config.items() if key not in ["stream_rate_adjust_factor", "pacing_policy", "pacing_max_lag_sec", "local_test", "local_sink"]}
     sample_results = build_sample_dataset(**build_sample_dataset_args)
 
-    # Setup GCS upload process or local print based on test mode
+    # Setup GCS upload process or local sink based on test mode
     if not config["local_test"]:
         gcs_bucket = os.environ["GCS_SAMPLE_BUCKET"]
         client = storage.Client()
         bucket = client.bucket(gcs_bucket)
         sample_process = Process(target=send_sample_to_gcs, args=(sample_queue, bucket))
     else:
-        sample_process = Process(target=print_sample, args=(sample_queue,))
+        sample_process = Process(target=write_to_local_sink, args=(sample_queue, "sample", config["local_sink"]))
 
     # Start processes to generate events and send to GCS
     processes = [
         Process(target=generate_sample_result_events, args=(
             sample_queue,
             sample_results,
-            config["stream_rate_adjust_factor"]
+            config["stream_rate_adjust_factor"],
+            config["pacing_policy"],
+            config["pacing_max_lag_sec"]
         )),
         sample_process
     ]
@@ -93,136 +100,82 @@ def build_sample_dataset(template_path: str, number_of_runs: int, column_ids: li
 
     sample_result_generator = SampleResultGenerator(template_path=template_path, noise_def=noise_def, noise_scale=noise_scale)
 
-    sample_results = []
+    # collect per-sample metadata, pre and post chrom samples for each batch in run then column order
+    samples = {key: [] for key in ["instrument_ids", "sample_ids", "sample_types", "batch_ids", "column_ids", "measurement_ts", "target_titers"]}
 
+    execution_time = execution_time.astimezone(timezone.utc).replace(tzinfo=None)
     batch_id = 0
     sample_id = 0
-    test_id = 0
     for run in range(number_of_runs):
         for idx, col in enumerate(column_ids):
             batch_id += 1
             instrument_id = f"solovpe_{idx+1}"
-            sample_id += 1
-            test_id += 1
             if run == 0:
                 pre_sample_ts = execution_time - timedelta(seconds=sampling_ts_buffer_sec)
                 post_sample_ts = execution_time + timedelta(seconds=(batch_duration_sec + sampling_ts_buffer_sec))
             else:
                 pre_sample_ts = execution_time + timedelta(seconds=(run + 1)*(batch_duration_sec + batch_delay_sec)) - timedelta(seconds=sampling_ts_buffer_sec)
                 post_sample_ts = execution_time + timedelta(seconds=(run + 1)*(batch_duration_sec + batch_delay_sec)) + timedelta(seconds=(batch_duration_sec + sampling_ts_buffer_sec))
-        
-            # Generate pre-chrom sample results
-            cur_pre_sample_result = collect_results_by_sample(
-                 sample_result_generator=sample_result_generator, test_id=test_id,
-                 instrument_id=instrument_id, sample_id=sample_id, sample_type="pre-affinity",
-                 batch_id=batch_id, column_id=col, sample_ts=pre_sample_ts, target_titer=1.0,
-                 retest_delay_sec=retest_delay_sec
-            )
-            test_id = cur_pre_sample_result[-1]["test_metadata"]["test_id"]
-            sample_results.extend(cur_pre_sample_result)
-
-            # Generate post-chrom sample results
-            sample_id += 1
-            test_id += 1
             bad_run = batch_quality[col][run] == "bad"
-            target_titer = 4.5 if bad_run else 5.0
-            cur_post_sample_result = collect_results_by_sample(
-                 sample_result_generator=sample_result_generator, test_id=test_id,
-                 instrument_id=instrument_id, sample_id=sample_id, sample_type="post-affinity",
-                 batch_id=batch_id, column_id=col, sample_ts=post_sample_ts, target_titer=target_titer,
-                 retest_delay_sec=retest_delay_sec
-            )
-            test_id = cur_post_sample_result[-1]["test_metadata"]["test_id"]
-            sample_results.extend(cur_post_sample_result)
+
+            for sample_type, sample_ts, target_titer in [("pre-affinity", pre_sample_ts, 1.0),
+                                                         ("post-affinity", post_sample_ts, 4.5 if bad_run else 5.0)]:
+                sample_id += 1
+                samples["instrument_ids"].append(instrument_id)
+                samples["sample_ids"].append(sample_id)
+                samples["sample_types"].append(sample_type)
+                samples["batch_ids"].append(batch_id)
+                samples["column_ids"].append(col)
+                samples["measurement_ts"].append(sample_ts)
+                samples["target_titers"].append(target_titer)
+
+    # generate all tests and retests at once, documents are assembled at emission time
+    sample_results = sample_result_generator.generate_sample_result_set(
+        retest_delay_sec=retest_delay_sec,
+        **samples
+    )
 
     return sample_results
 
-def generate_sample_result_events(sample_queue, sample_results, stream_rate_adjust_factor):
+def generate_sample_result_events(sample_queue, sample_results, stream_rate_adjust_factor, pacing_policy="catch_up", pacing_max_lag_sec=None):
     """ Generate sample result events """ 
 
-    sorted_sample_results = sorted(sample_results, key=lambda x: datetime.strptime(x["test_metadata"]["date"], "%Y-%m-%dT%H:%M:%SZ"))
-    sample_event_generator = SampleResultGenerator.get_event_generator(simulated_data=sorted_sample_results)
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=stream_rate_adjust_factor, policy=pacing_policy,
+                                  max_lag_sec=pacing_max_lag_sec)
 
-    sample_event = next(sample_event_generator)
-    streaming = True
-    while streaming:
-        streaming = False
+    if isinstance(sample_results, SampleResultSet):
+        sample_event_generator = sample_results.get_event_generator()
+    else:
+        sorted_sample_results = sorted(sample_results, key=lambda x: datetime.strptime(x["test_metadata"]["date"], "%Y-%m-%dT%H:%M:%SZ"))
+        sample_event_generator = SampleResultGenerator.get_event_generator(simulated_data=sorted_sample_results)
 
-        try:
-            sample_queue.put(sample_event)
+    # an empty result set still ends the stream below
+    sample_event_count = 0
+    sample_event = next(sample_event_generator, None)
+    while sample_event is not None:
+        sample_queue.put(sample_event)
+        sample_event_count += 1
 
-            cur_test_ts = datetime.strptime(sample_event["test_metadata"]["date"], "%Y-%m-%dT%H:%M:%SZ")
+        cur_test_ts = datetime.strptime(sample_event["test_metadata"]["date"], "%Y-%m-%dT%H:%M:%SZ")
 
-            sample_event = next(sample_event_generator)
+        sample_event = next(sample_event_generator, None)
+        if sample_event is not None:
             next_test_ts = datetime.strptime(sample_event["test_metadata"]["date"], "%Y-%m-%dT%H:%M:%SZ")
             time_delay = next_test_ts - cur_test_ts
-            time.sleep(time_delay.total_seconds() / stream_rate_adjust_factor)
-            streaming = True
-        except StopIteration:
-            continue
+            scheduler.wait(time_delay.total_seconds())
 
     # signal completion to queue
     sample_queue.put("EOF")
+    print(f"sample result pacing: {scheduler.report()}")
 
+    return sample_event_count
 
-def collect_results_by_sample(sample_result_generator, test_id, instrument_id, sample_id, sample_type, batch_id, column_id, sample_ts, target_titer, retest_delay_sec, bad_run=False):
-    """ generate and compile sample results for a given run """
-
-    # generate sample result
-    test_results = []
-    sample_result = sample_result_generator.generate_sample_result(
-        test_id=test_id,
-        instrument_id=instrument_id,
-        sample_id=sample_id,
-        sample_type=sample_type,
-        batch_id=batch_id,
-        column_id=column_id,
-        measurement_ts=sample_ts,
-        target_titer=target_titer,
-        bad_run=bad_run
-    )
-    test_results.append(sample_result)
-    
-    # retest if measurement failed validation until successful measurment
-    retest_ts = sample_ts
-    test_failed = sample_result["system_status"]["scan_result"] == "fail"
-    while test_failed:
-        test_id += 1
-        retest_ts += timedelta(seconds=retest_delay_sec)
-        retest_sample_result = sample_result_generator.generate_sample_result(
-            test_id=test_id,
-            instrument_id=instrument_id,
-            sample_id=sample_id,
-            sample_type=sample_type,
-            batch_id=batch_id,
-            column_id=column_id,
-            measurement_ts=retest_ts,
-            target_titer=target_titer,
-            bad_run=bad_run
-        )
-        test_results.append(retest_sample_result)
-        test_failed = retest_sample_result["system_status"]["scan_result"] == "fail"
-
-    return test_results
-
-def send_sample_to_gcs(sample_queue, bucket):
+
+def send_sample_to_gcs(sample_queue, bucket, producer_count=1):
     """ Submit sample result event to GCS """
 
-    while True:
-        sample_event = sample_queue.get()
-        if sample_event == "EOF":
-            break
-        gcs_file_path = f"raw/sample_{sample_event['sample_metadata']['sample_id']}_results_{sample_event['test_metadata']['date']}.json"
-        json_to_gcs(data=sample_event, gcs_file_path=gcs_file_path, bucket=bucket)
-        
-def print_sample(sample_queue):
-    """ Print batch or phase context event from queue """
-
-    while True:
-        sample_event = sample_queue.get()
-        if sample_event == "EOF":
-            break
-        print(f"sample data: {sample_event["sample_metadata"]}")
+    for sample_event in iter_queue(sample_queue, producer_count=producer_count):
+        json_to_gcs(data=sample_event, gcs_file_path=sample_object_path(sample_event), bucket=bucket)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,6 +5,8 @@ from datetime import datetime, timezone
 import json
 import copy
 
+from template_registry import load_json_template
+
 class SampleResultGenerator:
     """
     Generate simluated SoloVPE Protein Concentration results
@@ -29,111 +31,101 @@ class SampleResultGenerator:
         self.noise_scale = noise_scale
     
     def _read_json(self, template_path):
-        """ read json template """
-        with open(template_path) as file:
-            template_data = json.load(file)
-            
-        return template_data
-    
-    def _calculate_trend_params(self, raw_data):
-        """ calculate raw data slope, intercept, and r-square """
-        
-        # slope
-        n = len(raw_data)
-        sum_pathlength = 0
-        sum_absorbance = 0
-        sum_pathlength_squared = 0
-        sum_pathlength_absorbace = 0
-        for data_point in raw_data:
-            sum_pathlength += data_point["pathlength_mm"]
-            sum_absorbance += data_point["absorbance"]
-            sum_pathlength_squared += data_point["pathlength_mm"]**2
-            sum_pathlength_absorbace += (data_point["pathlength_mm"] * data_point["absorbance"])
-        
-        numerator = (n * sum_pathlength_absorbace - sum_pathlength * sum_absorbance)
-        denominator = (n * sum_pathlength_squared - sum_pathlength**2)
-        if denominator == 0:
-            raise ValueError("Error in slope calculation: denominator cannot equate to 0.")
-        slope = numerator / denominator
-
-        # intercept
-        mean_absorbance = sum_absorbance / n
-        mean_pathlength = sum_pathlength / n
-        intercept = mean_absorbance - slope * mean_pathlength
-
-        # r-square
-        ss_res = 0
-        ss_tot = 0
-        for data_point in raw_data:
-            predicted_absorbance = data_point["pathlength_mm"] * slope + intercept
-            ss_res += (data_point["absorbance"] - predicted_absorbance)**2
-            ss_tot += (data_point["absorbance"] - mean_absorbance)**2
-        if ss_tot == 0:
-            raise ValueError("Error in r-square calculation: denominator cannot equate to 0.")
-        r_square = 1 - ss_res / ss_tot
-
-        trend_params = {
-            "n": n,
-            "slope": slope,
-            "intercept": intercept,
-            "r_square": r_square
-        }
-
-        return trend_params
+        """ read json template, parsed once per process with a copy per generator """
 
+        return load_json_template(template_path)
     
-    def generate_sample_result(self, test_id: int, instrument_id: str, sample_id: int, sample_type: str, batch_id: int, column_id: str, measurement_ts: datetime, target_titer: float, bad_run: bool = False):
+    def generate_sample_result_set(self, instrument_ids: list, sample_ids: list, sample_types: list, batch_ids: list, column_ids: list,
+                                   measurement_ts: np.ndarray, target_titers: np.ndarray, retest_delay_sec: int, first_test_id: int = 1):
+        """
+        Generate simulated results for many samples at once.
+        Every sample is measured and retested until its scan passes, with noise drawn and the linear regression
+        fit for all pending measurements in one NumPy pass per retest round. Test ids are numbered in sample
+        order starting at first_test_id. JSON documents are only assembled by the returned SampleResultSet.
+        """
+
         rng = np.random.default_rng()
+        raw_data_points = self.template_data["measurement"]["raw_data_points"]
+        template_pathlength = np.array([point["pathlength_mm"] for point in raw_data_points], dtype=float)
+        template_absorbance = np.array([point["absorbance"] for point in raw_data_points], dtype=float)
+        target_titers = np.asarray(target_titers, dtype=float)
+        measurement_ts = np.asarray(measurement_ts, dtype="datetime64[s]")
+
+        # measure every pending sample, keep failed scans pending for the next retest round
+        rounds = []
+        pending = np.arange(len(target_titers))
+        attempt = 0
+        while len(pending) > 0:
+            pathlength = template_pathlength[None, :] / target_titers[pending, None]
+            absorbance = template_absorbance[None, :] + rng.normal(self.noise_def["absorbance"][0], self.noise_def["absorbance"][1],
+                                                                   (len(pending), len(template_absorbance)))
+            temperature = self.template_data["test_metadata"]["temperature_c"] + rng.normal(self.noise_def["temperature"][0],
+                                                                                             self.noise_def["temperature"][1], len(pending))
+            trend_params = self._calculate_trend_params_bulk(pathlength=pathlength, absorbance=absorbance)
+            passed = (trend_params["error"] == "") & (trend_params["r_square"] >= 0.999)
+
+            rounds.append({
+                "sample_index": pending,
+                "attempt": np.full(len(pending), attempt),
+                "temperature": temperature,
+                "pathlength": pathlength,
+                "absorbance": absorbance,
+                "passed": passed,
+                **trend_params
+            })
+            pending = pending[~passed]
+            attempt += 1
+
+        # order tests by sample then attempt so test ids follow the per-sample retest sequence
+        tests = {key: np.concatenate([r[key] for r in rounds]) for key in rounds[0].keys()}
+        order = np.lexsort((tests["attempt"], tests["sample_index"]))
+        tests = {key: values[order] for key, values in tests.items()}
+        sample_index = tests.pop("sample_index")
+        attempt = tests.pop("attempt")
+
+        return SampleResultSet(
+            template_data=self.template_data,
+            test_id=np.arange(first_test_id, first_test_id + len(sample_index)),
+            instrument_id=np.asarray(instrument_ids, dtype=object)[sample_index],
+            sample_id=np.asarray(sample_ids)[sample_index],
+            sample_type=np.asarray(sample_types, dtype=object)[sample_index],
+            batch_id=np.asarray(batch_ids)[sample_index],
+            column_id=np.asarray(column_ids, dtype=object)[sample_index],
+            measurement_ts=measurement_ts[sample_index] + attempt * np.timedelta64(int(retest_delay_sec), "s"),
+            target_titer=target_titers[sample_index],
+            **tests
+        )
 
-        # initialize scan_result data
-        simulated_data = copy.deepcopy(self.template_data)
-        simulated_data["system_status"]["scan_result"] = "fail"
-        
-        # generate simulated metadata
-        simulated_data["instrument"]["id"] = instrument_id
-        simulated_data["sample_metadata"] = {
-            "sample_id": sample_id,
-            "sample_type": sample_type,
-            "batch_id": batch_id,
-            "column_id": column_id
+    @staticmethod
+    def _calculate_trend_params_bulk(pathlength, absorbance):
+        """ calculate slope, intercept, and r-square for each row of a samples x points matrix """
+
+        n = pathlength.shape[1]
+        sum_pathlength = pathlength.sum(axis=1)
+        sum_absorbance = absorbance.sum(axis=1)
+        numerator = n * (pathlength * absorbance).sum(axis=1) - sum_pathlength * sum_absorbance
+        denominator = n * (pathlength ** 2).sum(axis=1) - sum_pathlength ** 2
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = numerator / denominator
+            intercept = sum_absorbance / n - slope * sum_pathlength / n
+            predicted_absorbance = pathlength * slope[:, None] + intercept[:, None]
+            ss_res = ((absorbance - predicted_absorbance) ** 2).sum(axis=1)
+            ss_tot = ((absorbance - absorbance.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+            r_square = 1 - ss_res / ss_tot
+
+        error = np.full(len(slope), "", dtype=object)
+        error[ss_tot == 0] = "Error in r-square calculation: denominator cannot equate to 0."
+        error[denominator == 0] = "Error in slope calculation: denominator cannot equate to 0."
+
+        return {
+            "n": np.full(len(slope), n),
+            "slope": slope,
+            "intercept": intercept,
+            "r_square": r_square,
+            "error": error
         }
-        simulated_data["test_metadata"]["test_id"] = test_id
-        simulated_data["test_metadata"]["date"] = datetime.strftime(measurement_ts, "%Y-%m-%dT%H:%M:%SZ")
-        simulated_data["test_metadata"]["temperature_c"] = simulated_data["test_metadata"]["temperature_c"] + rng.normal(self.noise_def["temperature"][0], self.noise_def["temperature"][1])
-
-        # correct pathlength and absorbance readings for target titer
-        if target_titer != 1:
-            simulated_data["test_metadata"]["pathlength_range_mm"]["min"] = simulated_data["test_metadata"]["pathlength_range_mm"]["min"] / target_titer
-            simulated_data["test_metadata"]["pathlength_range_mm"]["max"] = simulated_data["test_metadata"]["pathlength_range_mm"]["max"] / target_titer
-                
-        # generate simulated raw data 
-        for data_point in simulated_data["measurement"]["raw_data_points"]:
-            if target_titer != 1:
-                data_point["pathlength_mm"]  = data_point["pathlength_mm"] / target_titer
-            data_point["absorbance"] = data_point["absorbance"] + rng.normal(self.noise_def["absorbance"][0], self.noise_def["absorbance"][1])
-
-        # generate calculated results
-        try:
-            trend_params = self._calculate_trend_params(raw_data=simulated_data["measurement"]["raw_data_points"])
-
-            simulated_data["measurement"]["linear_regression"] = {
-                "slope_abs_per_mm": trend_params["slope"],
-                "intercept": trend_params["intercept"],
-                "r_squared": trend_params["r_square"],
-                "num_points_used": trend_params["n"]
-            }
-
-            simulated_data["measurement"]["concentration"]["protein_concentration_mg_mL"] = trend_params["slope"] / 1.45
 
-            if trend_params["r_square"] >= 0.999:
-                simulated_data["system_status"]["scan_result"] = "success"
-            else:
-                 simulated_data["system_status"]["messages"].append("Linearity check failed: R-square below acceptable threshold (<0.9990).")
-        except ValueError as e:
-            simulated_data["system_status"]["errors"].append(str(e))
-
-        return simulated_data
-    
     @staticmethod
     def get_event_generator(simulated_data, test_mode=False):
         """ Generator function to produce sample result json files at specified frequency """
@@ -145,4 +137,87 @@ class SampleResultGenerator:
         for n, result in enumerate(sorted_data):
             yield result
             if test_mode and n >= 5:
-                break
\ No newline at end of file
+                break
+
+
+class SampleResultSet:
+    """
+    Columnar set of simulated SoloVPE results, one entry per test, created by
+    SampleResultGenerator.generate_sample_result_set. JSON documents following the sample
+    result template are only assembled when requested so large datasets stay as NumPy arrays until emission.
+
+    Methods:
+        get_document: Assemble the sample result json document for one test
+        get_event_generator: Generator function to produce sample result documents ordered by measurement time
+        filter_columns: Subset of results measured for the given column ids
+    """
+
+    def __init__(self, template_data: dict, **arrays):
+        self.template_data = template_data
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.arrays["test_id"])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.get_document(idx)
+
+    def get_document(self, idx: int) -> dict:
+        """ Assemble the sample result json document for one test """
+
+        data = self.arrays
+        target_titer = float(data["target_titer"][idx])
+        template_metadata = self.template_data["test_metadata"]
+
+        document = copy.deepcopy(self.template_data)
+        document["system_status"]["scan_result"] = "success" if data["passed"][idx] else "fail"
+        document["instrument"]["id"] = data["instrument_id"][idx]
+        document["sample_metadata"] = {
+            "sample_id": int(data["sample_id"][idx]),
+            "sample_type": data["sample_type"][idx],
+            "batch_id": int(data["batch_id"][idx]),
+            "column_id": data["column_id"][idx]
+        }
+        document["test_metadata"]["test_id"] = int(data["test_id"][idx])
+        document["test_metadata"]["date"] = np.datetime_as_string(data["measurement_ts"][idx], unit="s") + "Z"
+        document["test_metadata"]["temperature_c"] = float(data["temperature"][idx])
+        if target_titer != 1:
+            document["test_metadata"]["pathlength_range_mm"]["min"] = template_metadata["pathlength_range_mm"]["min"] / target_titer
+            document["test_metadata"]["pathlength_range_mm"]["max"] = template_metadata["pathlength_range_mm"]["max"] / target_titer
+
+        document["measurement"]["raw_data_points"] = [
+            {"pathlength_mm": pathlength, "absorbance": absorbance}
+            for pathlength, absorbance in zip(data["pathlength"][idx].tolist(), data["absorbance"][idx].tolist())
+        ]
+
+        if data["error"][idx]:
+            document["system_status"]["errors"].append(data["error"][idx])
+            return document
+
+        document["measurement"]["linear_regression"] = {
+            "slope_abs_per_mm": float(data["slope"][idx]),
+            "intercept": float(data["intercept"][idx]),
+            "r_squared": float(data["r_square"][idx]),
+            "num_points_used": int(data["n"][idx])
+        }
+        document["measurement"]["concentration"]["protein_concentration_mg_mL"] = float(data["slope"][idx]) / 1.45
+        if not data["passed"][idx]:
+            document["system_status"]["messages"].append("Linearity check failed: R-square below acceptable threshold (<0.9990).")
+
+        return document
+
+    def get_event_generator(self, test_mode=False):
+        """ Generator function to produce sample result documents ordered by measurement time """
+
+        order = np.argsort(self.arrays["measurement_ts"], kind="stable")
+        for n, idx in enumerate(order):
+            yield self.get_document(idx)
+            if test_mode and n >= 5:
+                break
+
+    def filter_columns(self, column_ids: list):
+        """ Subset of results measured for the given column ids """
+
+        mask = np.isin(self.arrays["column_id"], list(column_ids))
+        return SampleResultSet(self.template_data, **{key: values[mask] for key, values in self.arrays.items()})
@@ -0,0 +1,132 @@
+import os
+import copy
+import json
+import numpy as np
+import pandas as pd
+
+# parsed templates keyed by (absolute template path, holds) for trends and absolute template path for json
+TREND_TEMPLATES = {}
+JSON_TEMPLATES = {}
+
+def load_trend_template(template_path: str, holds: bool = True, cache_dir: str = None) -> pd.DataFrame:
+    """
+    Return the parsed trend template for template_path, parsing the CSV at most once per process.
+    The holds and no-holds variants are each derived once and shared by every generator.
+
+    When cache_dir is set, the parsed variant is persisted there as one .npy file per column and later
+    processes memory-map those files instead of re-parsing the CSV. The persisted files are only used while
+    the CSV keeps the size and modification time they were persisted from.
+
+    The column arrays of the cached frame are read-only, so a caller writing into them raises instead of changing
+    the template of every later generator.
+    """
+
+    key = (os.path.abspath(template_path), holds)
+    if key not in TREND_TEMPLATES:
+        template_data = None
+        if cache_dir:
+            template_data = _read_npy_template(_npy_template_dir(template_path, holds, cache_dir), template_path)
+        if template_data is None:
+            # memory-mapped columns are opened read-only already
+            template_data = _read_only(_parse_trend_template(template_path, holds))
+            if cache_dir:
+                persist_trend_template(template_data, _npy_template_dir(template_path, holds, cache_dir), template_path)
+        TREND_TEMPLATES[key] = template_data
+
+    # shallow copy shares the parsed column data while keeping the cached frame's columns intact
+    return TREND_TEMPLATES[key].copy(deep=False)
+
+def load_json_template(template_path: str) -> dict:
+    """
+    Return a copy of the parsed json template for template_path, reading the file at most once per process.
+    Each caller gets its own deep copy, so changes to it never reach the cached template.
+    """
+
+    key = os.path.abspath(template_path)
+    if key not in JSON_TEMPLATES:
+        with open(template_path) as file:
+            JSON_TEMPLATES[key] = json.load(file)
+
+    return copy.deepcopy(JSON_TEMPLATES[key])
+
+def persist_trend_template(template_data: pd.DataFrame, npy_dir: str, template_path: str = None) -> None:
+    """
+    Write each template column to npy_dir as a .npy file that can be memory-mapped by child processes.
+    Every file is written under a temporary name and renamed into place, and columns.json, written last, records
+    the columns and the source CSV they were parsed from. Processes sharing npy_dir never read a partial file,
+    and a process that has memory-mapped a column keeps its data when another one replaces it.
+    """
+
+    os.makedirs(npy_dir, exist_ok=True)
+    for col in template_data.columns:
+        values = template_data[col].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        _write_atomic(os.path.join(npy_dir, f"{col}.npy"), lambda file, values=values: np.save(file, values))
+    manifest = {"columns": list(template_data.columns), "source": _source_stamp(template_path)}
+    _write_atomic(os.path.join(npy_dir, "columns.json"), lambda file: file.write(json.dumps(manifest).encode("utf-8")))
+
+def clear_templates() -> None:
+    """ Drop all parsed templates held by this process """
+
+    TREND_TEMPLATES.clear()
+    JSON_TEMPLATES.clear()
+
+def _parse_trend_template(template_path, holds):
+    """ Read trend template CSV and derive the requested holds variant """
+
+    template_data = pd.read_csv(template_path)
+    if holds is False:
+        template_data = template_data[template_data["flow_setpoint_L_min"] > 0].reset_index(drop=True)
+        # reset time_min to 0.5 minute increments without holds
+        template_data["time_min"] = np.arange(0, len(template_data) * 0.5, 0.5)
+
+    return template_data
+
+def _read_only(template_data):
+    """ Rebuild a template frame over read-only copies of its column arrays """
+
+    data = {}
+    for col in template_data.columns:
+        values = np.array(template_data[col].to_numpy(), copy=True)
+        values.setflags(write=False)
+        data[col] = values
+
+    return pd.DataFrame(data, copy=False)
+
+def _write_atomic(path, write_fn):
+    """ Write a file through write_fn under a temporary name and rename it into place """
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        write_fn(file)
+    os.replace(tmp_path, path)
+
+def _source_stamp(template_path):
+    """ Size and modification time of a template CSV, identifying the version its columns were persisted from """
+
+    if template_path is None:
+        return None
+    stat = os.stat(template_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _npy_template_dir(template_path, holds, cache_dir):
+    """ Directory holding the persisted .npy columns for a template variant """
+
+    template_name = os.path.splitext(os.path.basename(template_path))[0]
+    return os.path.join(cache_dir, f"{template_name}_{'holds' if holds else 'no_holds'}")
+
+def _read_npy_template(npy_dir, template_path=None):
+    """ Memory-map persisted template columns as a read-only DataFrame, None if nothing or a stale version was persisted """
+
+    columns_path = os.path.join(npy_dir, "columns.json")
+    if not os.path.exists(columns_path):
+        return None
+    with open(columns_path) as file:
+        manifest = json.load(file)
+    # caches written before the source stamp was recorded are a bare column list
+    if not isinstance(manifest, dict) or manifest["source"] != _source_stamp(template_path):
+        return None
+
+    data = {col: np.load(os.path.join(npy_dir, f"{col}.npy"), mmap_mode="r") for col in manifest["columns"]}
+    return pd.DataFrame(data, copy=False)
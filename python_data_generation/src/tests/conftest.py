@@ -40,6 +40,10 @@ def good_trend_with_holds_fixture(noise_def_fixture):
 def bad_trend_with_holds_fixture(noise_def_fixture):
     return TrendGenerator(bad_template_path, noise_def=noise_def_fixture, holds=True)
 
+@pytest.fixture
+def good_trend_no_noise_with_holds_fixture(noise_def_fixture):
+    return TrendGenerator(good_template_path, noise_def=noise_def_fixture, noise_scale=0.0, holds=True)
+
 # Batch Context Generator Fixtures
 @pytest.fixture
 def good_batch_context_with_holds():
@@ -0,0 +1,40 @@
+import os
+import json
+import pytest
+
+from benchmarks.main import run_benchmarks, run_case
+
+def failing_case(points):
+    raise ValueError(f"no {points} points")
+
+def dying_case(points):
+    os._exit(3)
+
+def test_benchmark_results_machine_readable():
+    config = {
+        "trend_resolution_hz": [0.1],
+        "holds": [False],
+        "number_of_columns": [2],
+        "number_of_runs": [1],
+        "stream_points": 100,
+        "transport_points": 100,
+        "transport_batch_size": [10],
+        "sink_points": 20,
+        "drift_units": [2],
+        "drift_points": 100
+    }
+    results = json.loads(json.dumps(run_benchmarks(config, only=["generate_dataset", "queue_transport", "trend_encoding", "sinks", "drift_detection"])))
+
+    assert {result["benchmark"] for result in results["results"]} == {"generate_dataset", "queue_transport", "trend_encoding", "sinks", "drift_detection"}
+    for result in results["results"]:
+        assert result["points"] > 0
+        assert result["points_per_sec"] > 0
+        assert result["peak_rss_mb"] > 0
+        assert set(result["latency_ms"].keys()) == {"p50", "p95", "p99", "max"}
+
+def test_benchmark_case_errors_are_reported():
+    failed = run_case("failing", failing_case, {"points": 10}, poll_sec=0.2)
+    died = run_case("dying", dying_case, {"points": 10}, poll_sec=0.2)
+
+    assert failed["error"] == "ValueError('no 10 points')"
+    assert "code 3" in died["error"]
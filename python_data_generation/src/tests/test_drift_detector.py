@@ -0,0 +1,63 @@
+import pytest
+
+from drift_detector import GoldenEnvelope, DriftDetector, DRIFT_SENSORS
+
+def envelope_records(bins=20, bin_width_cv=0.1):
+    records = []
+    for n in range(bins):
+        record = {"RECIPE_NAME": "recipe_a", "BIN_WIDTH_CV": bin_width_cv, "CV_BIN_START": n * bin_width_cv}
+        for column, _ in DRIFT_SENSORS.values():
+            record[f"{column.upper()}_MEAN"] = 10.0
+            record[f"{column.upper()}_STD"] = 1.0
+        records.append(record)
+    return records
+
+def batch_points(unit="chrom_1", bins=20, uv_shift=0.0, shift_from_bin=0):
+    # ten points per 0.1 cv bin
+    for n in range(bins * 10):
+        batch_tot_cv = n * 0.01 + 0.001
+        yield {
+            "chrom_unit": unit, "time_ns": n * 10**9, "totalized_column_volumes": batch_tot_cv,
+            "uv_mau": 10.0 + (uv_shift if n >= shift_from_bin * 10 else 0.0), "cond_mScm": 10.0, "ph": 10.0,
+            "flow_mL_min": 10000.0, "pressure_bar": 10.0
+        }
+
+def test_points_on_the_golden_profile_raise_no_alerts():
+    detector = DriftDetector(GoldenEnvelope(envelope_records()))
+    alerts = [alert for data_point in batch_points() for alert in detector.update(data_point)]
+
+    assert alerts == []
+    assert detector.stats()["bins_scored"] == 19
+
+def test_sustained_shift_raises_cusum_and_ewma_alerts():
+    alerts = []
+    detector = DriftDetector(GoldenEnvelope(envelope_records()), alert_fn=alerts.append)
+    for data_point in batch_points(uv_shift=2.0, shift_from_bin=5):
+        detector.update(data_point)
+
+    assert {alert["sensor"] for alert in alerts} == {"uv_mau"}
+    assert {alert["detector"] for alert in alerts} == {"cusum_high", "ewma"}
+    # the ewma alert is raised once per excursion
+    assert len([alert for alert in alerts if alert["detector"] == "ewma"]) == 1
+    assert min(alert["cv_bin_start"] for alert in alerts) >= 0.5
+
+def test_new_batch_restarts_unit_scores():
+    detector = DriftDetector(GoldenEnvelope(envelope_records()))
+    for data_point in batch_points(uv_shift=2.0, bins=6):
+        detector.update(data_point)
+    alerts = [alert for data_point in batch_points() for alert in detector.update(data_point)]
+
+    assert alerts == []
+
+def test_points_outside_the_envelope_are_not_scored():
+    detector = DriftDetector(GoldenEnvelope(envelope_records(bins=5)), unit_recipes={"chrom_2": "recipe_b"})
+    for data_point in batch_points(unit="chrom_1", uv_shift=5.0):
+        detector.update(data_point)
+    for data_point in batch_points(unit="chrom_2", uv_shift=5.0):
+        detector.update(data_point)
+
+    assert detector.stats()["bins_scored"] == 5
+
+def test_envelope_rejects_mixed_bin_widths():
+    with pytest.raises(ValueError):
+        GoldenEnvelope(envelope_records(bin_width_cv=0.1) + envelope_records(bin_width_cv=0.05))
@@ -0,0 +1,20 @@
+import sys
+from multiprocessing import Process, Queue
+
+from main import collect_shard_reports
+
+def report_shard(report_queue, shard_no):
+    report_queue.put({"shard": shard_no, "trend_points": 10, "elapsed_sec": 1.0, "errors": {}})
+
+def test_collect_shard_reports_flags_silent_exits():
+    report_queue = Queue()
+    processes = [Process(target=report_shard, args=(report_queue, 0)), Process(target=sys.exit, args=(3,))]
+    for process in processes:
+        process.start()
+    shard_reports = collect_shard_reports(report_queue, processes, poll_sec=0.2)
+    for process in processes:
+        process.join()
+
+    assert [shard_report["shard"] for shard_report in shard_reports] == [0, 1]
+    assert shard_reports[0]["errors"] == {}
+    assert "code 3" in shard_reports[1]["errors"]["shard"]
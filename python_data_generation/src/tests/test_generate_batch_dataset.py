@@ -2,7 +2,13 @@ import pytest
 import os
 import pandas as pd
 
+from datetime import datetime, timezone
+
 from batch_context.batch_context_generator import BatchContextGenerator
+from batch_context.main import build_batch_context
+
+good_template_path = os.path.join(os.getenv("PYTHONPATH"), "data", "good_trend_template.csv")
+execution_time = datetime.now(timezone.utc)
 
 def test_phases_exist(good_batch_context_with_holds, good_batch_context_no_holds, bad_batch_context_with_holds, bad_batch_context_no_holds):
     for bc in [good_batch_context_with_holds, good_batch_context_no_holds,
@@ -34,3 +40,27 @@ def test_batches_no_holds_time_change(good_batch_context_with_holds, good_batch_
     assert not gbc_phases.equals(gbc_noholds_phases)
 
 
+
+def test_event_timeline_merged_in_time_order():
+    column_ids = ["chrom_1", "chrom_2", "chrom_3"]
+    batch_context, event_timeline = build_batch_context(number_of_runs=2, column_ids=column_ids, template_path=good_template_path,
+                                                        execution_time=execution_time, batch_delay_sec=1000, holds=False)
+    event_ts = [event["event_ts"] for event in event_timeline]
+    phase_event_count = sum(len(bc.simulated_phase_data) for batch_list in batch_context.values() for bc in batch_list)
+
+    assert event_ts == sorted(event_ts)
+    assert len(event_timeline) == phase_event_count
+    assert {event["chrom_id"] for event in event_timeline} == set(column_ids)
+
+def test_event_timeline_batch_boundaries():
+    batch_context, event_timeline = build_batch_context(number_of_runs=2, column_ids=["chrom_1", "chrom_2"], template_path=good_template_path,
+                                                        execution_time=execution_time, batch_delay_sec=0, holds=False)
+    batch_events = [event["batch_event"] for event in event_timeline if event["batch_event"] is not None]
+
+    assert len(batch_events) == 8
+    for batch_id in range(1, 5):
+        assert [e["event"] for e in batch_events if e["batch_id"] == batch_id] == ["batch_start", "batch_end"]
+    for event in event_timeline:
+        assert event["phase_event"]["batch_id"] in range(1, 5)
+        if event["batch_event"] is not None:
+            assert event["batch_event"]["event_ts"] == event["phase_event"]["event_ts"]
@@ -1,4 +1,6 @@
 import pytest
+import numpy as np
+import pandas as pd
 
 def test_simulated_dataset_shape(noise_def_fixture, good_trend_with_holds_fixture):
     trend_resolution = 0.1
@@ -20,4 +22,34 @@ def test_unique_dataset_generation(noise_def_fixture, bad_trend_with_holds_fixtu
     simulated_df_1 = bad_trend_with_holds_fixture.generate_dataset(trend_resolution_hz=trend_resolution)
     simulated_df_2 = bad_trend_with_holds_fixture.generate_dataset(trend_resolution_hz=trend_resolution)
 
-    assert not simulated_df_1.equals(simulated_df_2)
\ No newline at end of file
+    assert not simulated_df_1.equals(simulated_df_2)
+
+def test_chunked_dataset_matches_eager(good_trend_no_noise_with_holds_fixture):
+    trend_resolution = 0.1
+    trend_gen = good_trend_no_noise_with_holds_fixture
+
+    eager_df = trend_gen.generate_dataset(trend_resolution_hz=trend_resolution)
+    chunks = list(trend_gen.generate_dataset_chunks(trend_resolution_hz=trend_resolution, chunk_size=250))
+    chunked_df = pd.concat([pd.DataFrame(chunk) for chunk in chunks], ignore_index=True)
+
+    assert len(chunks) == int(np.ceil(len(eager_df) / 250))
+    assert list(chunked_df.columns) == list(eager_df.columns)
+    assert np.allclose(chunked_df.to_numpy(), eager_df.to_numpy())
+    assert trend_gen.get_duration_sec(trend_resolution) == eager_df["time_sec"].iloc[-1]
+
+def test_chunked_dataset_noise_statistics(noise_def_fixture, good_trend_with_holds_fixture, good_trend_no_noise_with_holds_fixture):
+    trend_resolution = 1.0
+    baseline_df = good_trend_no_noise_with_holds_fixture.generate_dataset(trend_resolution_hz=trend_resolution)
+
+    chunks = good_trend_with_holds_fixture.generate_dataset_chunks(trend_resolution_hz=trend_resolution, chunk_size=1000)
+    chunked_df = pd.concat([pd.DataFrame(chunk) for chunk in chunks], ignore_index=True)
+
+    residual = chunked_df["uv_mau"] - baseline_df["uv_mau"]
+    assert abs(residual.mean()) < 0.1
+    assert abs(residual.std() - noise_def_fixture["uv_mau"][1]) < 0.1
+
+def test_lazy_stream_generator_test_mode(good_trend_no_holds_fixture):
+    records = list(good_trend_no_holds_fixture.get_lazy_stream_generator(trend_resolution_hz=0.1, test_mode=True))
+
+    assert len(records) == 6
+    assert records[1]["time_sec"] == 10.0
@@ -15,3 +15,25 @@ def test_stream_generator_test_mode(bad_trend_no_holds_fixture):
 
     records = list(stream_generator) 
     assert len(records) == 6
+
+def test_batch_stream_generator_batches(good_trend_no_holds_fixture):
+    simulated_df = good_trend_no_holds_fixture.generate_dataset(trend_resolution_hz=0.1)
+    batches = list(TrendGenerator.get_batch_stream_generator(simulated_data=simulated_df, batch_size=100))
+
+    assert sum(len(batch["time_sec"]) for batch in batches) == len(simulated_df)
+    assert all(len(batch["time_sec"]) == 100 for batch in batches[:-1])
+    assert all(batch["uv_mau"].flags["C_CONTIGUOUS"] for batch in batches)
+
+def test_row_stream_generator_matches_per_row(bad_trend_no_holds_fixture):
+    simulated_df = bad_trend_no_holds_fixture.generate_dataset(trend_resolution_hz=0.1)
+    row_records = list(TrendGenerator.get_row_stream_generator(simulated_data=simulated_df, batch_size=64))
+    per_row_records = list(TrendGenerator.get_stream_generator(simulated_data=simulated_df))
+
+    assert row_records == per_row_records
+
+def test_row_stream_generator_test_mode(good_trend_no_holds_fixture):
+    simulated_df = good_trend_no_holds_fixture.generate_dataset(trend_resolution_hz=0.1)
+    records = list(TrendGenerator.get_row_stream_generator(simulated_data=simulated_df, test_mode=True))
+
+    assert len(records) == 6
+    assert isinstance(records[0]["uv_mau"], float)
@@ -0,0 +1,48 @@
+import json
+import pytest
+import pandas as pd
+from datetime import datetime, timezone
+
+from local_sinks import LocalSink
+from local_gcp import LocalBucket
+
+def trend_points(n):
+    return [{"time_sec": float(i), "uv_mau": 1.0, "time_iso": "2025-01-01T00:00:00+00:00", "chrom_unit": f"chrom_{i % 2}"} for i in range(n)]
+
+def phase_event(batch_id):
+    return pd.DataFrame([{"batch_id": batch_id, "chrom_id": "chrom_1", "phase": "Load", "event_ts": datetime(2025, 1, 1, tzinfo=timezone.utc)}])
+
+def test_null_sink_counts_only(tmp_path):
+    sink = LocalSink("phase", sink_type="null", output_dir=str(tmp_path / "out"))
+    for batch_id in range(3):
+        sink.write(phase_event(batch_id))
+    sink.close()
+
+    assert sink.stats()["records"] == 3
+    assert not (tmp_path / "out").exists()
+
+def test_ndjson_sink_writes_one_line_per_record(tmp_path):
+    sink = LocalSink("trend", sink_type="ndjson", output_dir=str(tmp_path))
+    for data_point in trend_points(10):
+        sink.write(data_point)
+    sink.close()
+
+    lines = (tmp_path / "trend.ndjson").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == trend_points(10)
+
+def test_gcs_sink_matches_cloud_object_paths(tmp_path):
+    trend_sink = LocalSink("trend", sink_type="gcs", output_dir=str(tmp_path))
+    for data_point in trend_points(10):
+        trend_sink.write(data_point)
+    trend_sink.close()
+    phase_sink = LocalSink("phase", sink_type="gcs", output_dir=str(tmp_path))
+    phase_sink.write(phase_event(1))
+    phase_sink.close()
+
+    files = [name for name in LocalBucket(str(tmp_path)).list_blob_names() if name.endswith(".parquet")]
+    assert len([name for name in files if name.startswith("raw/trend/chrom_unit=chrom_0/date=2025-01-01/")]) == 1
+    assert len([name for name in files if name.startswith("raw/phase/chrom_unit=chrom_1/date=2025-01-01/batch_id=1/")]) == 1
+
+def test_unknown_sink_type_raises():
+    with pytest.raises(ValueError):
+        LocalSink("trend", sink_type="stdout")
@@ -0,0 +1,59 @@
+import pytest
+import time
+
+from pacing import DeadlineScheduler
+
+def test_scheduler_absorbs_work_time():
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=100, policy="catch_up")
+    start_ts = time.monotonic()
+    for _ in range(10):
+        time.sleep(0.005)
+        scheduler.wait(1.0)
+
+    # 10 waits of 1 sec / 100 = 0.1 sec regardless of the 0.005 sec of work per event
+    assert time.monotonic() - start_ts < 0.13
+
+def test_scheduler_catch_up_reports_lag():
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=1000, policy="catch_up")
+    scheduler.wait(0)
+    time.sleep(0.05)
+    lag_sec = scheduler.wait(1.0)
+
+    assert lag_sec > 0.04
+    assert scheduler.report()["late_waits"] == 1
+    assert scheduler.report()["dropped_sec"] == 0
+
+def test_scheduler_drop_reanchors():
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=1000, policy="drop")
+    scheduler.wait(0)
+    time.sleep(0.05)
+    scheduler.wait(1.0)
+    start_ts = time.monotonic()
+    scheduler.wait(20.0)
+
+    assert scheduler.report()["dropped_sec"] > 0.04
+    assert time.monotonic() - start_ts >= 0.015
+
+def test_scheduler_drop_tolerates_one_tick():
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=10, policy="drop")
+    scheduler.wait(0)
+    scheduler.wait(0.5)
+    time.sleep(0.07)
+    scheduler.wait(0.5)
+
+    # about 0.02 sec of lag is within the 0.05 sec tick, so the schedule is kept
+    assert scheduler.report()["late_waits"] == 1
+    assert scheduler.report()["dropped_sec"] == 0
+
+def test_scheduler_as_fast_as_possible():
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=1, policy="as_fast_as_possible")
+    start_ts = time.monotonic()
+    for _ in range(100):
+        scheduler.wait(10.0)
+
+    assert time.monotonic() - start_ts < 0.1
+    assert scheduler.report()["waits"] == 100
+
+def test_scheduler_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(policy="sometimes")
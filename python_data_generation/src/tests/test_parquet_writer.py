@@ -0,0 +1,111 @@
+import io
+import json
+import time
+import pytest
+import pyarrow.parquet as pq
+
+from local_gcp import LocalBucket, LocalBlob
+from parquet_writer import RollingParquetWriter
+
+def make_rows(n, units=("chrom_1", "chrom_2")):
+    return [{"chrom_id": units[i % len(units)], "date": "2025-01-01", "batch_id": i % 2 + 1, "value": float(i)} for i in range(n)]
+
+def partition(row):
+    return {"chrom_unit": row["chrom_id"], "date": row["date"], "batch_id": row["batch_id"]}
+
+def read_blob(bucket, path):
+    return pq.read_table(io.BytesIO(bucket.blob(path).download_as_bytes()))
+
+def test_writer_rolls_files_by_rows_and_partition(tmp_path):
+    bucket = LocalBucket(str(tmp_path))
+    writer = RollingParquetWriter(bucket, prefix="raw/phase", partition_fn=partition, target_file_rows=100, row_group_size=25)
+    writer.write_rows(make_rows(450))
+    writer.close()
+
+    files = [name for name in bucket.list_blob_names() if name.endswith(".parquet")]
+    # chrom_1 rows are all batch 1 and chrom_2 rows batch 2: 225 rows per partition in files of 100, 100 and 25 rows
+    assert len(files) == 6
+    assert all(name.startswith(("raw/phase/chrom_unit=chrom_1/date=2025-01-01/batch_id=1/",
+                                "raw/phase/chrom_unit=chrom_2/date=2025-01-01/batch_id=2/")) for name in files)
+    assert sum(read_blob(bucket, name).num_rows for name in files) == 450
+
+    metadata = pq.ParquetFile(io.BytesIO(bucket.blob(files[0]).download_as_bytes())).metadata
+    assert metadata.num_row_groups == 4
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+def test_writer_manifest_lists_files(tmp_path):
+    bucket = LocalBucket(str(tmp_path))
+    writer = RollingParquetWriter(bucket, prefix="raw/batch", partition_fn=partition, target_file_rows=1000)
+    writer.write_rows(make_rows(10))
+    writer.close()
+
+    manifest_paths = [name for name in bucket.list_blob_names() if name.startswith(f"raw/batch/_manifests/{writer.writer_id}/")]
+    manifest = [json.loads(bucket.blob(path).download_as_bytes()) for path in manifest_paths]
+    assert len(manifest) == 2
+    assert sorted(entry["path"] for entry in manifest) == [name for name in bucket.list_blob_names() if name.endswith(".parquet")]
+    assert sum(entry["rows"] for entry in manifest) == writer.stats()["rows_written"] == 10
+
+def test_writer_uploads_outside_the_write_path(tmp_path, monkeypatch):
+    upload_from_file = LocalBlob.upload_from_file
+    uploading = []
+
+    def slow_upload(blob, file_obj, **kwargs):
+        uploading.append(blob)
+        time.sleep(0.5)
+        upload_from_file(blob, file_obj, **kwargs)
+
+    monkeypatch.setattr(LocalBlob, "upload_from_file", slow_upload)
+    writer = RollingParquetWriter(LocalBucket(str(tmp_path)), prefix="raw/trend", target_file_rows=5, row_group_size=5)
+    writer.write_rows(make_rows(5))
+    while not uploading:
+        time.sleep(0.01)
+    start_ts = time.monotonic()
+    writer.write_rows(make_rows(3))
+
+    # the second write does not wait for the first file's upload
+    assert time.monotonic() - start_ts < 0.25
+    writer.close()
+    assert writer.stats()["files_written"] == 2
+    assert writer.stats()["rows_written"] == 8
+
+def test_writer_close_retries_and_reports_failed_uploads(tmp_path, monkeypatch):
+    upload_from_file = LocalBlob.upload_from_file
+    failures = {"left": 2}
+
+    def flaky_upload(blob, file_obj, **kwargs):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise ConnectionError("bucket unavailable")
+        upload_from_file(blob, file_obj, **kwargs)
+
+    monkeypatch.setattr(LocalBlob, "upload_from_file", flaky_upload)
+    writer = RollingParquetWriter(LocalBucket(str(tmp_path)), prefix="raw/trend", spool_dir=str(tmp_path))
+    writer.write_rows(make_rows(5))
+    writer.close(retry_backoff_sec=0.01)
+    assert writer.stats()["files_written"] == 1
+
+    failures["left"] = 100
+    writer = RollingParquetWriter(LocalBucket(str(tmp_path)), prefix="raw/trend", spool_dir=str(tmp_path))
+    writer.write_rows(make_rows(5))
+    with pytest.raises(RuntimeError, match="left spooled"):
+        writer.close(max_retries=2, retry_backoff_sec=0.01)
+    assert writer.stats()["pending_uploads"] == 1
+
+def test_writer_rolls_files_on_age(tmp_path):
+    bucket = LocalBucket(str(tmp_path))
+    writer = RollingParquetWriter(bucket, prefix="raw/trend", target_file_rows=1000, max_file_age_sec=0.2)
+    writer.write_rows(make_rows(5))
+    time.sleep(0.5)
+
+    assert writer.stats()["files_written"] == 1
+    writer.close()
+
+def test_writer_starts_new_file_on_schema_change(tmp_path):
+    bucket = LocalBucket(str(tmp_path))
+    writer = RollingParquetWriter(bucket, prefix="raw/trend", target_file_rows=1000, row_group_size=5)
+    writer.write_rows(make_rows(5))
+    writer.write_rows([dict(row, extra="x") for row in make_rows(5)])
+    writer.close()
+
+    assert writer.stats()["files_written"] == 2
+    assert writer.stats()["rows_written"] == 10
@@ -0,0 +1,75 @@
+import os
+import time
+import pytest
+import numpy as np
+from datetime import datetime, timezone
+from queue import Queue
+
+from sample_results.main import build_sample_dataset, generate_sample_result_events
+from sample_results.sample_result_generator import SampleResultSet
+
+sample_template_path = os.path.join(os.getenv("PYTHONPATH"), "data", "sample_result.json")
+
+def build_dataset(number_of_runs, column_ids):
+    return build_sample_dataset(
+        template_path=sample_template_path, number_of_runs=number_of_runs, column_ids=column_ids,
+        sampling_ts_buffer_sec=300, noise_def={"absorbance": (0, 0.16), "temperature": (0, 1.0)}, noise_scale=1.0,
+        batch_quality={col: ["good"] * number_of_runs for col in column_ids}, retest_delay_sec=60,
+        batch_duration_sec=10180, batch_delay_sec=1000, execution_time=datetime.now(timezone.utc)
+    )
+
+def test_sample_result_set_retests_until_success():
+    sample_results = build_dataset(number_of_runs=4, column_ids=["chrom_1", "chrom_2", "chrom_3", "chrom_4"])
+    documents = list(sample_results)
+
+    assert isinstance(sample_results, SampleResultSet)
+    assert [doc["test_metadata"]["test_id"] for doc in documents] == list(range(1, len(documents) + 1))
+    assert len({doc["sample_metadata"]["sample_id"] for doc in documents}) == 32
+    for sample_id in range(1, 33):
+        sample_docs = [doc for doc in documents if doc["sample_metadata"]["sample_id"] == sample_id]
+        assert [doc["system_status"]["scan_result"] for doc in sample_docs] == ["fail"] * (len(sample_docs) - 1) + ["success"]
+
+def test_sample_result_set_documents_match_template(sample_result_fixture):
+    sample_results = build_dataset(number_of_runs=1, column_ids=["chrom_1"])
+    bulk_doc = sample_results.get_document(0)
+    template = sample_result_fixture.template_data
+
+    assert bulk_doc.keys() == template.keys()
+    assert bulk_doc["measurement"].keys() == template["measurement"].keys()
+    assert bulk_doc["sample_metadata"].keys() == {"sample_id", "sample_type", "batch_id", "column_id"}
+    assert len(bulk_doc["measurement"]["raw_data_points"]) == len(template["measurement"]["raw_data_points"])
+    assert datetime.strptime(bulk_doc["test_metadata"]["date"], "%Y-%m-%dT%H:%M:%SZ")
+
+def test_bulk_regression_matches_least_squares_fit():
+    sample_results = build_dataset(number_of_runs=2, column_ids=["chrom_1", "chrom_2"])
+    for doc in sample_results:
+        pathlength = [point["pathlength_mm"] for point in doc["measurement"]["raw_data_points"]]
+        absorbance = [point["absorbance"] for point in doc["measurement"]["raw_data_points"]]
+        slope, intercept = np.polyfit(pathlength, absorbance, 1)
+        r_square = np.corrcoef(pathlength, absorbance)[0, 1]**2
+        assert np.isclose(slope, doc["measurement"]["linear_regression"]["slope_abs_per_mm"])
+        assert np.isclose(intercept, doc["measurement"]["linear_regression"]["intercept"])
+        assert np.isclose(r_square, doc["measurement"]["linear_regression"]["r_squared"])
+
+def test_sample_result_set_event_order_and_filter():
+    sample_results = build_dataset(number_of_runs=2, column_ids=["chrom_1", "chrom_2"])
+    dates = [doc["test_metadata"]["date"] for doc in sample_results.get_event_generator()]
+    chrom_1_results = sample_results.filter_columns(["chrom_1"])
+
+    assert dates == sorted(dates)
+    assert all(doc["sample_metadata"]["column_id"] == "chrom_1" for doc in chrom_1_results)
+    assert len(list(sample_results.get_event_generator(test_mode=True))) == 6
+
+def test_empty_sample_result_set_ends_stream():
+    sample_results = build_dataset(number_of_runs=1, column_ids=["chrom_1"]).filter_columns(["chrom_9"])
+    sample_queue = Queue()
+
+    assert generate_sample_result_events(sample_queue, sample_results, stream_rate_adjust_factor=1000) == 0
+    assert sample_queue.get_nowait() == "EOF"
+
+def test_bulk_sample_dataset_scales():
+    start_ts = time.monotonic()
+    sample_results = build_dataset(number_of_runs=50, column_ids=[f"chrom_{n}" for n in range(200)])
+
+    assert len(sample_results) >= 20000
+    assert time.monotonic() - start_ts < 1.0
@@ -0,0 +1,28 @@
+import os
+import shutil
+import importlib.util
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+def load_sync_module():
+    spec = importlib.util.spec_from_file_location("sync_shared_modules", os.path.join(REPO_ROOT, "gcp_cloud_run", "sync_shared_modules.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_shared_module_copies_match_their_source():
+    # the consumer images carry copies of these modules, a copy edited on its own would drift from the tested source
+    assert load_sync_module().stale_copies() == []
+
+def test_sync_restores_drifted_copies(tmp_path):
+    sync_shared_modules = load_sync_module()
+    for module, dirs in sync_shared_modules.SHARED_MODULES.items():
+        for module_dir in dirs:
+            os.makedirs(tmp_path / module_dir, exist_ok=True)
+            shutil.copyfile(os.path.join(REPO_ROOT, module_dir, module), tmp_path / module_dir / module)
+    with open(tmp_path / "gcp_cloud_run" / "gcs_consumer" / "trend_codec.py", "a") as file:
+        file.write("# local edit\n")
+
+    assert sync_shared_modules.stale_copies(str(tmp_path)) == ["gcp_cloud_run/gcs_consumer/trend_codec.py"]
+    assert sync_shared_modules.sync(str(tmp_path)) == ["gcp_cloud_run/gcs_consumer/trend_codec.py"]
+    assert sync_shared_modules.stale_copies(str(tmp_path)) == []
@@ -0,0 +1,83 @@
+import os
+import shutil
+import pytest
+import numpy as np
+import pandas as pd
+
+from template_registry import load_trend_template, load_json_template, clear_templates
+
+good_template_path = os.path.join(os.getenv("PYTHONPATH"), "data", "good_trend_template.csv")
+sample_template_path = os.path.join(os.getenv("PYTHONPATH"), "data", "sample_result.json")
+
+def test_trend_template_parsed_once():
+    clear_templates()
+    template_1 = load_trend_template(good_template_path, holds=False)
+    template_2 = load_trend_template(good_template_path, holds=False)
+
+    assert template_1 is not template_2
+    assert np.shares_memory(template_1["uv_mau"].to_numpy(), template_2["uv_mau"].to_numpy())
+
+def test_trend_template_variants(good_trend_no_holds_fixture):
+    with_holds = load_trend_template(good_template_path, holds=True)
+    no_holds = load_trend_template(good_template_path, holds=False)
+
+    assert len(no_holds) < len(with_holds)
+    assert all(no_holds["flow_setpoint_L_min"] > 0)
+    assert no_holds.equals(good_trend_no_holds_fixture.template_data)
+
+def test_trend_template_memory_mapped(tmp_path):
+    clear_templates()
+    parsed = load_trend_template(good_template_path, holds=True, cache_dir=str(tmp_path))
+    clear_templates()
+    mapped = load_trend_template(good_template_path, holds=True, cache_dir=str(tmp_path))
+
+    assert os.path.exists(os.path.join(tmp_path, "good_trend_template_holds", "uv_mau.npy"))
+    assert np.allclose(parsed["uv_mau"].to_numpy(), mapped["uv_mau"].to_numpy())
+    assert list(parsed["phase"]) == list(mapped["phase"])
+    clear_templates()
+
+def test_trend_template_persisted_atomically(tmp_path):
+    clear_templates()
+    load_trend_template(good_template_path, holds=True, cache_dir=str(tmp_path))
+    clear_templates()
+
+    npy_dir = os.path.join(tmp_path, "good_trend_template_holds")
+    assert not [name for name in os.listdir(npy_dir) if name.endswith(".tmp")]
+    # a cache whose columns.json was never written, e.g. by a process killed mid-persist, is parsed again
+    os.remove(os.path.join(npy_dir, "columns.json"))
+    with open(os.path.join(npy_dir, "uv_mau.npy"), "wb") as file:
+        file.write(b"partial")
+    assert np.allclose(load_trend_template(good_template_path, holds=True, cache_dir=str(tmp_path))["uv_mau"].to_numpy(),
+                       load_trend_template(good_template_path, holds=True)["uv_mau"].to_numpy())
+    clear_templates()
+
+def test_trend_template_cache_follows_csv_changes(tmp_path):
+    template_path = os.path.join(tmp_path, "template.csv")
+    shutil.copy(good_template_path, template_path)
+    clear_templates()
+    cached = load_trend_template(template_path, holds=True, cache_dir=str(tmp_path))
+
+    changed = pd.read_csv(template_path)
+    changed["uv_mau"] = changed["uv_mau"] + 1.0
+    changed.to_csv(template_path, index=False)
+    clear_templates()
+    reloaded = load_trend_template(template_path, holds=True, cache_dir=str(tmp_path))
+
+    assert np.allclose(reloaded["uv_mau"].to_numpy(), cached["uv_mau"].to_numpy() + 1.0)
+    clear_templates()
+
+def test_trend_template_cache_is_read_only():
+    clear_templates()
+    template = load_trend_template(good_template_path, holds=False)
+
+    with pytest.raises(ValueError):
+        template["uv_mau"].to_numpy()[0] = -1.0
+    assert load_trend_template(good_template_path, holds=False)["uv_mau"].to_numpy()[0] != -1.0
+
+def test_json_template_copies_are_independent(sample_result_fixture):
+    template = load_json_template(sample_template_path)
+    template["test_metadata"]["temperature_c"] = -1.0
+
+    assert template is not sample_result_fixture.template_data
+    assert load_json_template(sample_template_path) == sample_result_fixture.template_data
+    assert sample_result_fixture.template_data["test_metadata"]["temperature_c"] != -1.0
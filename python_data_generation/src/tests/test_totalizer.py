@@ -0,0 +1,113 @@
+import pytest
+import numpy as np
+from queue import Queue
+from datetime import datetime, timedelta, timezone
+
+from time_series_trends.trend_generator import TrendGenerator
+from time_series_trends.main import generate_stream, restore_stream_start
+from totalizer import TrendTotalizer
+from transport import iter_queue
+
+def stream_points(trend_gen, unit="chrom_1", hz=0.1):
+    for data_point in trend_gen.get_lazy_stream_generator(trend_resolution_hz=hz, include_phase=True):
+        data_point["chrom_unit"] = unit
+        yield data_point
+
+def test_totalizer_matches_window_totals(good_trend_no_holds_fixture):
+    totalizer = TrendTotalizer()
+    data = [totalizer.process(data_point, batch_key=0) for data_point in stream_points(good_trend_no_holds_fixture)]
+
+    # reference: LAG/running SUM windows of the gold trend_base model
+    time_min = np.array([d["time_sec"] for d in data]) / 60
+    flow_lpm = np.array([d["flow_mL_min"] for d in data]) / 1000
+    vol_thru_l = np.concatenate([[0.0], 0.5 * (flow_lpm[1:] + flow_lpm[:-1]) * np.diff(time_min)])
+    phases = np.array([d["phase"] for d in data])
+
+    assert np.allclose([d["totalized_column_volumes"] for d in data], np.cumsum(vol_thru_l) / 226)
+    for phase in np.unique(phases):
+        in_phase = phases == phase
+        assert np.allclose(np.array([d["phase_column_volumes"] for d in data])[in_phase], np.cumsum(vol_thru_l[in_phase]) / 226)
+
+def test_totalizer_resets_on_new_batch(good_trend_no_holds_fixture):
+    totalizer = TrendTotalizer()
+    for data_point in stream_points(good_trend_no_holds_fixture):
+        totalizer.process(data_point, batch_key=0)
+    first_point = next(stream_points(good_trend_no_holds_fixture))
+    totalizer.process(first_point, batch_key=1)
+
+    assert first_point["totalized_volume_ml"] == 0
+    assert first_point["phase_uv_auc"] == 0
+
+def test_totalizer_checkpoint_resumes(good_trend_no_holds_fixture, tmp_path):
+    data = list(stream_points(good_trend_no_holds_fixture))
+    expected = TrendTotalizer()
+    for data_point in data:
+        expected.process(dict(data_point), batch_key=0)
+
+    totalizer = TrendTotalizer(checkpoint_dir=str(tmp_path))
+    for data_point in data[:100]:
+        totalizer.process(dict(data_point), batch_key=0)
+    totalizer.checkpoint()
+
+    restarted = TrendTotalizer(checkpoint_dir=str(tmp_path))
+    assert restarted.restore(["chrom_1", "chrom_2"]) == ["chrom_1"]
+    for data_point in data[100:]:
+        last_point = restarted.process(dict(data_point), batch_key=0)
+
+    assert last_point["totalized_volume_ml"] == pytest.approx(expected.state["chrom_1"]["batch_vol_l"] * 1000)
+
+def test_generate_stream_resumes_from_checkpoint(good_trend_no_holds_fixture, noise_def_fixture, tmp_path):
+    first_points = list(stream_points(good_trend_no_holds_fixture))[:100]
+    totalizer = TrendTotalizer(checkpoint_dir=str(tmp_path))
+    for data_point in first_points:
+        totalizer.process(data_point, batch_key=0)
+    totalizer.checkpoint()
+    start_ts = restore_stream_start(str(tmp_path), datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    trend_queue = Queue()
+    generate_stream(trend_queue, 0.1, 1000, False, 1, ["chrom_1"], {"chrom_1": ["good"]}, 1.0, 0,
+                    noise_def_fixture, datetime.now(timezone.utc), pacing_policy="as_fast_as_possible",
+                    stream_state_dir=str(tmp_path))
+    resumed_points = list(iter_queue(trend_queue))
+
+    # the restarted stream continues after the last checkpointed point, on the original timeline and totals
+    assert resumed_points[0]["time_sec"] > first_points[-1]["time_sec"]
+    assert resumed_points[0]["totalized_volume_ml"] > first_points[-1]["totalized_volume_ml"]
+    assert len(first_points) + len(resumed_points) == len(list(stream_points(good_trend_no_holds_fixture)))
+    assert datetime.fromisoformat(resumed_points[0]["time_iso"]) == start_ts + timedelta(seconds=resumed_points[0]["time_sec"])
+
+class CrashingQueue(Queue):
+    """ Queue that fails like a killed stream once max_puts micro-batches were sent """
+
+    def __init__(self, max_puts):
+        super().__init__()
+        self.max_puts = max_puts
+
+    def put(self, item, *args, **kwargs):
+        if self.max_puts == 0:
+            raise RuntimeError("stream killed")
+        self.max_puts -= 1
+        super().put(item, *args, **kwargs)
+
+def test_generate_stream_resume_skips_no_sent_points(good_trend_no_holds_fixture, noise_def_fixture, tmp_path):
+    stream_args = (0.1, 1000, False, 1, ["chrom_1"], {"chrom_1": ["good"]}, 1.0, 0, noise_def_fixture, datetime.now(timezone.utc))
+    # checkpoints every tick while points wait in the transport buffer, the stream dies on its third micro-batch
+    crashing_queue = CrashingQueue(max_puts=2)
+    with pytest.raises(RuntimeError):
+        generate_stream(crashing_queue, *stream_args, transport_batch_size=50, transport_max_latency_sec=60,
+                        pacing_policy="as_fast_as_possible", stream_state_dir=str(tmp_path), checkpoint_interval_sec=0)
+    sent_time_sec = [item["time_sec"] for batch in list(crashing_queue.queue) for item in batch]
+
+    trend_queue = Queue()
+    generate_stream(trend_queue, *stream_args, pacing_policy="as_fast_as_possible", stream_state_dir=str(tmp_path))
+    resumed_time_sec = [data_point["time_sec"] for data_point in iter_queue(trend_queue)]
+
+    expected_time_sec = [data_point["time_sec"] for data_point in stream_points(good_trend_no_holds_fixture)]
+    assert sent_time_sec
+    assert sorted(set(sent_time_sec + resumed_time_sec)) == expected_time_sec
+
+def test_get_phases_follows_template(good_trend_no_holds_fixture):
+    template = good_trend_no_holds_fixture.template_data
+    phases = good_trend_no_holds_fixture.get_phases(template["time_min"].to_numpy() * 60.0)
+
+    assert list(phases) == list(template["phase"])
@@ -0,0 +1,40 @@
+import pytest
+import time
+from multiprocessing import Queue
+
+from transport import BatchedQueueWriter, iter_queue
+
+def test_writer_sends_full_batches():
+    queue = Queue()
+    writer = BatchedQueueWriter(queue, batch_size=10, max_latency_sec=60)
+    for n in range(25):
+        writer.put({"n": n})
+    writer.close()
+
+    assert writer.batches_sent == 3
+    assert [item["n"] for item in iter_queue(queue)] == list(range(25))
+
+def test_writer_flushes_stale_batch():
+    queue = Queue()
+    writer = BatchedQueueWriter(queue, batch_size=1000, max_latency_sec=0.01)
+    writer.put({"n": 0})
+    time.sleep(0.02)
+    writer.poll()
+
+    assert writer.items_sent == 1
+    assert queue.get(timeout=1) == [{"n": 0}]
+
+def test_iter_queue_waits_for_all_producers():
+    queue = Queue()
+    for producer in range(2):
+        writer = BatchedQueueWriter(queue, batch_size=2)
+        writer.put(producer)
+        writer.close()
+    queue.put("single item")
+    queue.put("EOF")
+
+    assert list(iter_queue(queue, producer_count=3)) == [0, 1, "single item"]
+
+def test_writer_rejects_invalid_batch_size():
+    with pytest.raises(ValueError):
+        BatchedQueueWriter(Queue(), batch_size=0)
@@ -0,0 +1,129 @@
+import json
+import pytest
+import struct
+from datetime import datetime, timedelta, timezone
+
+import gcp_utils
+from gcp_utils import TrendPublisher
+from local_gcp import LocalPublisherClient
+from trend_codec import encode_trend, decode_trend, to_time_ns
+
+def trend_point(n, chrom_unit="chrom_1"):
+    timestamp = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=n)
+    return {
+        "time_sec": float(n), "time_min": n / 60, "uv_mau": 1234.567, "cond_mScm": 12.345, "ph": 7.2, "flow_mL_min": 60123.4,
+        "pressure_bar": 1.37, "phase": "Load", "time_iso": timestamp.isoformat(), "time_ns": int(timestamp.timestamp()) * 10**9,
+        "chrom_unit": chrom_unit, "totalized_volume_ml": 1000.0 * n, "totalized_column_volumes": n / 226,
+        "phase_column_volumes": n / 452, "phase_uv_auc": 0.5 * n
+    }
+
+def test_publisher_tracks_delivery():
+    client = LocalPublisherClient()
+    trend_publisher = TrendPublisher(client=client, report_every_sec=None)
+    for n in range(50):
+        trend_publisher.publish(trend_point(n, f"chrom_{n % 2}"))
+    trend_publisher.close(timeout=5)
+
+    stats = trend_publisher.stats()
+    assert stats["delivered"] == 50
+    assert stats["outstanding"] == 0
+    assert stats["failed"] == 0
+    assert all(message["topic"] == trend_publisher.topic_path for message in client.messages)
+
+def test_publish_creates_its_client_on_first_use(monkeypatch):
+    clients = []
+    monkeypatch.setattr(gcp_utils, "_publisher", None)
+    monkeypatch.setattr(gcp_utils.pubsub_v1, "PublisherClient", lambda **kwargs: clients.append(LocalPublisherClient()) or clients[-1])
+    assert clients == []
+
+    for n in range(3):
+        gcp_utils.publish(trend_point(n)).result(timeout=5)
+
+    assert len(clients) == 1
+    assert [json.loads(message["data"])["time_sec"] for message in clients[0].messages] == [0.0, 1.0, 2.0]
+
+def test_publisher_keeps_ordering_keys():
+    client = LocalPublisherClient()
+    trend_publisher = TrendPublisher(client=client, report_every_sec=None)
+    for n in range(10):
+        trend_publisher.publish(trend_point(n, f"chrom_{n % 2}"))
+    trend_publisher.flush(timeout=5)
+
+    for message in client.messages:
+        assert message["ordering_key"] == decode_trend(message["data"], message["attributes"])["chrom_unit"]
+    chrom_0_times = [decode_trend(m["data"], m["attributes"])["time_sec"] for m in client.messages if m["ordering_key"] == "chrom_0"]
+    assert chrom_0_times == sorted(chrom_0_times)
+
+def test_publisher_retries_failures():
+    client = LocalPublisherClient(fail_every=4)
+    trend_publisher = TrendPublisher(client=client, max_retries=2, report_every_sec=None)
+    for n in range(10):
+        trend_publisher.publish(trend_point(n, "chrom_1"))
+    trend_publisher.flush(timeout=5)
+
+    stats = trend_publisher.stats()
+    assert stats["retried"] > 0
+    assert stats["delivered"] == 10
+    assert "chrom_1" in client.resumed_keys
+
+def test_publisher_retries_keep_ordering():
+    client = LocalPublisherClient(fail_every=7)
+    trend_publisher = TrendPublisher(client=client, max_retries=5, report_every_sec=None)
+    for n in range(40):
+        trend_publisher.publish(trend_point(n, f"chrom_{n % 2}"))
+    trend_publisher.flush(timeout=10)
+
+    assert trend_publisher.stats()["delivered"] == 40
+    for chrom_unit in ["chrom_0", "chrom_1"]:
+        times = [decode_trend(m["data"], m["attributes"])["time_sec"] for m in client.messages if m["ordering_key"] == chrom_unit]
+        # every message delivered once, in publish order
+        assert times == [float(n) for n in range(40) if f"chrom_{n % 2}" == chrom_unit]
+
+def test_publisher_counts_exhausted_retries():
+    client = LocalPublisherClient(fail_every=1)
+    trend_publisher = TrendPublisher(client=client, max_retries=1, report_every_sec=None)
+    trend_publisher.publish(trend_point(0, "chrom_1"))
+    trend_publisher.flush(timeout=5)
+
+    assert trend_publisher.stats()["failed"] == 1
+    assert trend_publisher.stats()["outstanding"] == 0
+
+def test_struct_encoding_round_trips():
+    data_point = trend_point(42, "chrom_3")
+    data, attributes = encode_trend(data_point)
+
+    # every field decodes to the value the JSON encoding carries, not a float32 approximation
+    assert decode_trend(data, attributes) == data_point
+    assert decode_trend(data, attributes) == decode_trend(*encode_trend(data_point, encoding="json"))
+    assert list(decode_trend(data, attributes)) == list(data_point)
+    assert len(data) < len(encode_trend(data_point, encoding="json")[0]) / 3
+
+def test_struct_time_iso_matches_generator():
+    start_ts = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+    for n in range(1000):
+        # float epoch seconds lose the microseconds of about half of these
+        timestamp = start_ts + timedelta(seconds=n, microseconds=n * 7919 % 10**6)
+        data_point = dict(trend_point(0), time_iso=timestamp.isoformat(), time_ns=to_time_ns(timestamp))
+
+        assert decode_trend(*encode_trend(data_point))["time_iso"] == timestamp.isoformat()
+
+def test_struct_v1_messages_still_decode():
+    data_point = trend_point(7, "chrom_2")
+    data, _ = encode_trend(data_point)
+    # v1 layout: the same fields with the sensor channels packed as float32
+    numbers = struct.unpack_from("<q10d", data)
+    v1_data = struct.pack("<q5f5d", *numbers) + data[struct.calcsize("<q10d"):]
+
+    decoded = decode_trend(v1_data, {"encoding": "trend-struct-v1"})
+    assert decoded["chrom_unit"] == "chrom_2"
+    assert decoded["time_iso"] == data_point["time_iso"]
+    assert decoded == pytest.approx({key: value for key, value in data_point.items()}, rel=1e-6)
+
+def test_decode_falls_back_to_json():
+    data_point = trend_point(1)
+    data, attributes = encode_trend(data_point, encoding="json")
+
+    assert attributes == {}
+    assert decode_trend(data, {"source": "python_time_series_trend_generator"}) == data_point
+    with pytest.raises(ValueError):
+        decode_trend(data, {"encoding": "trend-struct-v9"})
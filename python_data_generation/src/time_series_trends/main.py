@@ -1,12 +1,19 @@
 import os
+import json
+import time
 import argparse
+import itertools
 import yaml
-import time
 from datetime import datetime, timedelta, timezone
 from multiprocessing import Process, Queue
 
 from time_series_trends.trend_generator import TrendGenerator
-from gcp_utils import publish
+from gcp_utils import TrendPublisher
+from transport import BatchedQueueWriter, iter_queue
+from pacing import DeadlineScheduler
+from totalizer import TrendTotalizer
+from trend_codec import to_time_ns
+from local_sinks import write_to_local_sink
 
 def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Chrom Sensor Data Stream Simulator")
@@ -46,7 +53,17 @@ def main(argv=None):
             "flow_mL_min": (0, 300),
             "pressure_bar": (0, 0.01)
         }
+        config["transport_batch_size"] = 500
+        config["transport_max_latency_sec"] = 0.5
+        config["lazy_generation"] = True
+        config["template_cache_dir"] = None
+        config["pacing_policy"] = "catch_up"
+        config["pacing_max_lag_sec"] = None
+        config["stream_state_dir"] = None
+        config["trend_encoding"] = "struct"
         config["local_test"] = True
+        config["local_sink"] = {"type": "null", "output_dir": "local_output"}
+        config["parquet_writer"] = {"target_file_rows": 100000, "row_group_size": 10000, "max_file_age_sec": 300, "compression": "zstd"}
     elif args.config:
         config = load_config(args.config)
     else:
@@ -56,11 +73,12 @@ def main(argv=None):
     config["streaming_start_ts"] = datetime.now(timezone.utc)
     trend_queue = Queue()
 
-    # Setup Pub/Sub publish process or local print based on test mode
+    # Setup Pub/Sub publish process or local sink based on test mode
     if not config["local_test"]:
-        publish_process = Process(target=publish_trend_to_pubsub, args=(trend_queue,))
+        publish_process = Process(target=publish_trend_to_pubsub, args=(trend_queue,), kwargs={"encoding": config["trend_encoding"]})
     else:
-        publish_process = Process(target=print_trend, args=(trend_queue,))
+        publish_process = Process(target=write_to_local_sink, args=(trend_queue, "trend", config["local_sink"]),
+                                  kwargs={"writer_options": config["parquet_writer"]})
 
     # Start processes to generate events and publish to Pub/Sub
     processes = [
@@ -76,7 +94,15 @@ def main(argv=None):
             config["column_util_gap"],
             config["noise_def"],
             config["streaming_start_ts"]
-        )),
+        ), kwargs={
+            "transport_batch_size": config["transport_batch_size"],
+            "transport_max_latency_sec": config["transport_max_latency_sec"],
+            "lazy_generation": config["lazy_generation"],
+            "template_cache_dir": config["template_cache_dir"],
+            "pacing_policy": config["pacing_policy"],
+            "pacing_max_lag_sec": config["pacing_max_lag_sec"],
+            "stream_state_dir": config["stream_state_dir"]
+        }),
         publish_process
     ]
     for process in processes:
@@ -89,35 +115,63 @@ def main(argv=None):
 
 def generate_stream(trend_queue, trend_resolution_hz, stream_rate_adjust_factor, holds,
                    number_of_trends, column_ids, batch_quality, 
-                   noise_scale, column_util_gap, noise_def, streaming_start_ts):
+                   noise_scale, column_util_gap, noise_def, streaming_start_ts, stream_batch_size=1000,
+                   transport_batch_size=500, transport_max_latency_sec=0.5, lazy_generation=True,
+                   template_cache_dir=None, pacing_policy="catch_up", pacing_max_lag_sec=None, stream_state_dir=None, checkpoint_interval_sec=30.0):
     """ Generate Time Series Trend Dataset """
 
+    trend_writer = BatchedQueueWriter(trend_queue, batch_size=transport_batch_size, max_latency_sec=transport_max_latency_sec)
+
     good_trend_path = os.path.join(os.getenv("PYTHONPATH"),"data","good_trend_template.csv")
-    good_trend_gen = TrendGenerator(good_trend_path, noise_def=noise_def, noise_scale=noise_scale, holds=holds)
+    good_trend_gen = TrendGenerator(good_trend_path, noise_def=noise_def, noise_scale=noise_scale, holds=holds,
+                                    template_cache_dir=template_cache_dir)
 
     bad_trend_path = os.path.join(os.getenv("PYTHONPATH"),"data","bad_trend_template.csv")
-    bad_trend_gen = TrendGenerator(bad_trend_path, noise_def=noise_def, noise_scale=noise_scale, holds=holds)
+    bad_trend_gen = TrendGenerator(bad_trend_path, noise_def=noise_def, noise_scale=noise_scale, holds=holds,
+                                   template_cache_dir=template_cache_dir)
 
     trend_gen_dict = {}
     for col in column_ids:
         trend_gen_dict[col] = []
         for j in range(number_of_trends):
             # Decide whether to use good or bad trend template based on anomaly rate
-            if batch_quality[col][j] == "bad":
-                simulated_data = bad_trend_gen.generate_dataset(trend_resolution_hz=trend_resolution_hz)
-                trend_gen = TrendGenerator.get_stream_generator(simulated_data)
+            trend_template_gen = bad_trend_gen if batch_quality[col][j] == "bad" else good_trend_gen
+            if lazy_generation:
+                # data is interpolated window by window as the stream advances
+                trend_gen = trend_template_gen.get_lazy_stream_generator(trend_resolution_hz=trend_resolution_hz, chunk_size=stream_batch_size,
+                                                                         include_phase=True)
             else:
-                simulated_data = good_trend_gen.generate_dataset(trend_resolution_hz=trend_resolution_hz)
-                trend_gen = TrendGenerator.get_stream_generator(simulated_data)
+                simulated_data = trend_template_gen.generate_dataset(trend_resolution_hz=trend_resolution_hz)
+                simulated_data["phase"] = trend_template_gen.get_phases(simulated_data["time_sec"].to_numpy())
+                trend_gen = TrendGenerator.get_row_stream_generator(simulated_data, batch_size=stream_batch_size)
             trend_gen_dict[col].append(trend_gen)
-
+    trend_duration_sec = max(good_trend_gen.get_duration_sec(trend_resolution_hz), bad_trend_gen.get_duration_sec(trend_resolution_hz))
+
+    scheduler = DeadlineScheduler(stream_rate_adjust_factor=stream_rate_adjust_factor, policy=pacing_policy,
+                                  max_lag_sec=pacing_max_lag_sec)
+
+    # running totalized volume, column volumes and uv auc per batch and phase, resumed from checkpoints if present.
+    # a resumed unit skips the batches and points it streamed before the restart, on the original timeline
+    totalizer = TrendTotalizer(checkpoint_dir=stream_state_dir)
+    positions = {unit: totalizer.position(unit) for unit in totalizer.restore(column_ids)}
+    if stream_state_dir:
+        streaming_start_ts = restore_stream_start(stream_state_dir, streaming_start_ts)
+    last_checkpoint_ts = time.monotonic()
     for trend_no in range(number_of_trends):
         active_generators = []
         for col_key, gen_list in trend_gen_dict.items():
             gen = gen_list[trend_no]
+            if col_key in positions:
+                resume_trend_no, resume_time_sec = positions[col_key]
+                if trend_no < resume_trend_no:
+                    continue
+                if trend_no == resume_trend_no:
+                    gen = itertools.dropwhile(lambda data_point, t=resume_time_sec: data_point["time_sec"] <= t, gen)
             active_generators.append((col_key, gen))
+        if not active_generators:
+            continue
 
-        batch_start_ts = streaming_start_ts + trend_no * (timedelta(seconds=max(simulated_data["time_sec"])) + timedelta(seconds=column_util_gap))
+        batch_start_ts = streaming_start_ts + trend_no * (timedelta(seconds=trend_duration_sec) + timedelta(seconds=column_util_gap))
         
         streaming = True
         while streaming:
@@ -127,37 +181,54 @@ def generate_stream(trend_queue, trend_resolution_hz, stream_rate_adjust_factor,
                     data_point = next(gen)
                     timestamp = batch_start_ts + timedelta(seconds=data_point["time_sec"])
                     data_point["time_iso"] = timestamp.isoformat()
-                    data_point["time_ns"] = int(timestamp.timestamp() * 1e9)
+                    data_point["time_ns"] = to_time_ns(timestamp)
                     data_point["chrom_unit"] = col_key
-                    
-                    trend_queue.put(data_point)
+                    totalizer.process(data_point, batch_key=trend_no)
+
+                    trend_writer.put(data_point)
 
                     streaming = True
                 except StopIteration:
                     continue
-            time.sleep(1 / trend_resolution_hz / stream_rate_adjust_factor)
-        time.sleep(column_util_gap / stream_rate_adjust_factor)
+            trend_writer.poll()
+            if stream_state_dir and time.monotonic() - last_checkpoint_ts >= checkpoint_interval_sec:
+                # a restart skips every point up to the checkpointed position, so none may still sit in the buffer
+                trend_writer.flush()
+                totalizer.checkpoint()
+                last_checkpoint_ts = time.monotonic()
+            scheduler.wait(1 / trend_resolution_hz)
+        trend_writer.flush()
+        scheduler.wait(column_util_gap)
 
     # end stream
-    trend_queue.put("EOF")
+    totalizer.checkpoint()
+    trend_writer.close()
+    print(f"trend stream pacing: {scheduler.report()}")
 
-def publish_trend_to_pubsub(trend_queue) -> None:
-    """ Publish message to Pub/Sub topic """
+    return trend_writer.items_sent
+
+def restore_stream_start(stream_state_dir, streaming_start_ts):
+    """ Start of the stream timeline checkpointed in stream_state_dir, streaming_start_ts is stored when there is none """
+
+    path = os.path.join(stream_state_dir, "stream_start.json")
+    if os.path.exists(path):
+        with open(path) as file:
+            return datetime.fromisoformat(json.load(file)["streaming_start_ts"])
 
-    while True:
-        data_point = trend_queue.get()
-        if data_point == "EOF":
-            break
-        publish(message=data_point)
+    os.makedirs(stream_state_dir, exist_ok=True)
+    with open(f"{path}.{os.getpid()}.tmp", "w") as file:
+        json.dump({"streaming_start_ts": streaming_start_ts.isoformat()}, file)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
 
-def print_trend(trend_queue) -> None:
-    """ Print trend data points from queue """
+    return streaming_start_ts
+
+def publish_trend_to_pubsub(trend_queue, producer_count=1, publisher_client=None, encoding="struct") -> None:
+    """ Publish message to Pub/Sub topic """
 
-    while True:
-        data_point = trend_queue.get()
-        if data_point == "EOF":
-            break
-        print(f"trend data point: {data_point}")
+    trend_publisher = TrendPublisher(client=publisher_client, encoding=encoding)
+    for data_point in iter_queue(trend_queue, producer_count=producer_count):
+        trend_publisher.publish(message=data_point)
+    trend_publisher.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
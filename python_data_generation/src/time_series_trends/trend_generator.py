@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from template_registry import load_trend_template
+
 class TrendGenerator:
     """
     Data generation functions for simulating real-time chromatography sensor data streaming
@@ -10,18 +12,22 @@ class TrendGenerator:
         noise_def (dict): Dictionary defining noise characteristics for each sensor column
         noise_scale (float): Scaling factor for the noise to be applied
         holds (bool): Whether to include hold periods in the generated data
+        template_cache_dir (str): Optional directory of memory-mapped .npy templates shared across processes
 
     Methods:
         generate_dataset: Creates full simulated chromatography trend data
+        generate_dataset_chunks: Lazily creates simulated chromatography trend data window by window
+        get_lazy_stream_generator: Generator function to stream lazily generated trend data one point at a time
+        get_duration_sec: Time of the last simulated data point in seconds
+        get_phases: Template phase of each point of a time axis
         get_stream_generator: Generator function to stream simulated chromatography trend data
+        get_batch_stream_generator: Generator function to stream simulated trend data in column batches
+        iter_batch_rows: Lightweight row view yielding one dict per data point of a column batch
+        get_row_stream_generator: Generator function to stream one dict per data point from column batches
     """
     
-    def __init__(self, template_path, noise_def=None, noise_scale=1.0, holds=True):
-        self.template_data = pd.read_csv(template_path)
-        if holds is False:
-            self.template_data = self.template_data[self.template_data["flow_setpoint_L_min"] > 0]
-            # reset time_min to 0.5 minute increments without holds
-            self.template_data["time_min"] = np.arange(0, len(self.template_data) * 0.5, 0.5)
+    def __init__(self, template_path, noise_def=None, noise_scale=1.0, holds=True, template_cache_dir=None):
+        self.template_data = load_trend_template(template_path, holds=holds, cache_dir=template_cache_dir)
         self.noise_def = noise_def or {
             "uv_mau": (0, 2.0),
             "cond_mScm": (0, 0.15),
@@ -37,33 +43,88 @@ class TrendGenerator:
         """
 
         # create new target time axis at specified frequency
+        n_points, dt = self._get_time_axis(trend_resolution_hz)
+        time_sec = np.arange(n_points) * dt
+
+        # interpolate and add noise over the full time axis
+        rng = np.random.default_rng()
+        df_interp = pd.DataFrame(self._simulate_window(time_sec, rng))
+
+        # store the simulated data in the instance
+        return df_interp
+
+    def generate_dataset_chunks(self, trend_resolution_hz=1.0, chunk_size=1000, include_phase=False):
+        """
+        Lazily creates the same simulated trend data as generate_dataset, one window of chunk_size points at a time.
+        Each chunk is a dict of column name to NumPy array so memory stays flat regardless of batch length.
+        With include_phase, each chunk also carries the template phase of every point.
+        """
+
+        n_points, dt = self._get_time_axis(trend_resolution_hz)
+        rng = np.random.default_rng()
+        for start in range(0, n_points, chunk_size):
+            time_sec = np.arange(start, min(start + chunk_size, n_points)) * dt
+            window = self._simulate_window(time_sec, rng)
+            if include_phase:
+                window["phase"] = self.get_phases(time_sec)
+            yield window
+
+    def get_lazy_stream_generator(self, trend_resolution_hz=1.0, chunk_size=1000, test_mode=False, include_phase=False):
+        """
+        Generator function to stream one dict per data point, generating the data window by window as it is consumed
+        """
+
+        n = 0
+        for chunk in self.generate_dataset_chunks(trend_resolution_hz=trend_resolution_hz, chunk_size=chunk_size, include_phase=include_phase):
+            for data_point in TrendGenerator.iter_batch_rows(chunk):
+                yield data_point
+                if test_mode and n >= 5:
+                    return
+                n += 1
+
+    def get_duration_sec(self, trend_resolution_hz=1.0):
+        """ Time of the last simulated data point in seconds """
+
+        n_points, dt = self._get_time_axis(trend_resolution_hz)
+        return (n_points - 1) * dt
+
+    def get_phases(self, time_sec):
+        """ Template phase of each point of a time axis, the phase of the last template row at or before the point """
+
+        template_time_sec = self.template_data["time_min"].to_numpy() * 60.0
+        rows = np.searchsorted(template_time_sec, time_sec, side="right") - 1
+        return self.template_data["phase"].to_numpy()[np.clip(rows, 0, len(template_time_sec) - 1)]
+
+    def _get_time_axis(self, trend_resolution_hz):
+        """ Number of points and spacing of the simulated time axis, matching np.arange(0, total_time_sec + dt, dt) """
+
         total_time_sec = int(self.template_data["time_min"].iloc[-1] * 60)
         dt = 1.0 / trend_resolution_hz
-        time_sec = np.arange(0, total_time_sec + dt, dt)
-        df_interp = pd.DataFrame({"time_sec": time_sec})
-        df_interp["time_min"] = df_interp["time_sec"] / 60.0
+        n_points = int(np.ceil((total_time_sec + dt) / dt))
+        return n_points, dt
+
+    def _simulate_window(self, time_sec, rng):
+        """ Interpolate sensor columns from template data and add noise over a window of the time axis """
+
+        window = {"time_sec": time_sec, "time_min": time_sec / 60.0}
 
         # interpolate sensor columns from template data
-        sensor_cols = list(self.noise_def.keys())
-        for col in sensor_cols:
+        template_time_sec = self.template_data["time_min"].to_numpy() * 60.0
+        for col in self.noise_def.keys():
             if col not in self.template_data.columns:
                 raise KeyError(f"Column '{col}' not found in template data. Please check that noise_def keys match template columns.")
-            df_interp[col] = np.interp(df_interp["time_sec"], 
-                                       self.template_data["time_min"] * 60.0, 
-                                       self.template_data[col])
-            
+            window[col] = np.interp(time_sec, template_time_sec, self.template_data[col].to_numpy())
+
         # add noise based on defined noise levels
-        rng = np.random.default_rng()
         for col, (mean, stddev) in self.noise_def.items():
-            df_interp[col] += self.noise_scale * rng.normal(mean, stddev, len(df_interp))
-            
+            window[col] += self.noise_scale * rng.normal(mean, stddev, len(time_sec))
+
         # Adjust random values to within realistic ranges
-        df_interp["ph"] = df_interp["ph"].clip(2.0, 12.0)
-        df_interp["cond_mScm"] = df_interp["cond_mScm"].clip(0.1, 120.0)
+        window["ph"] = window["ph"].clip(2.0, 12.0)
+        window["cond_mScm"] = window["cond_mScm"].clip(0.1, 120.0)
+
+        return window
 
-        # store the simulated data in the instance
-        return df_interp
-    
     @staticmethod
     def get_stream_generator(simulated_data, test_mode=False):
         """
@@ -75,3 +136,39 @@ class TrendGenerator:
             yield row.to_dict()
             if test_mode and n >= 5:
                 break
+
+    @staticmethod
+    def get_batch_stream_generator(simulated_data, batch_size=1000, test_mode=False):
+        """
+        Generator function to stream simulated chromatography trend data in batches of batch_size data points.
+        Each batch is a dict of column name to contiguous NumPy slice of the simulated data.
+        """
+
+        # extract each column once as a contiguous array, batches are views into these arrays
+        columns = {col: np.ascontiguousarray(simulated_data[col].to_numpy()) for col in simulated_data.columns}
+        n_points = len(simulated_data)
+        if test_mode:
+            n_points = min(n_points, 6)
+
+        for start in range(0, n_points, batch_size):
+            stop = min(start + batch_size, n_points)
+            yield {col: values[start:stop] for col, values in columns.items()}
+
+    @staticmethod
+    def iter_batch_rows(batch):
+        """
+        Lightweight row view over a column batch, yields one dict of python scalars per data point
+        """
+
+        col_names = list(batch.keys())
+        for values in zip(*(batch[col].tolist() for col in col_names)):
+            yield dict(zip(col_names, values))
+
+    @staticmethod
+    def get_row_stream_generator(simulated_data, batch_size=1000, test_mode=False):
+        """
+        Generator function to stream one dict per data point, backed by get_batch_stream_generator
+        """
+
+        for batch in TrendGenerator.get_batch_stream_generator(simulated_data, batch_size=batch_size, test_mode=test_mode):
+            yield from TrendGenerator.iter_batch_rows(batch)
@@ -0,0 +1,85 @@
+import time
+from multiprocessing import Queue
+
+EOF = "EOF"
+
+class BatchedQueueWriter:
+    """
+    Producer side of the micro-batched queue transport between generator and sink processes.
+    Items are buffered locally and sent through the queue as one pickled list per micro-batch,
+    so the queue pays its pickle and pipe overhead once per batch instead of once per item.
+
+    Params:
+        queue (Queue): multiprocessing queue shared with the sink process
+        batch_size (int): Maximum number of items sent per micro-batch
+        max_latency_sec (float): Maximum time an item may wait in the buffer before the batch is sent
+
+    Methods:
+        put: Buffer an item, sending the micro-batch when it is full or stale
+        poll: Send the buffered micro-batch if its oldest item has exceeded max_latency_sec
+        flush: Send all buffered items
+        close: Send all buffered items and signal end of stream to the sink
+    """
+
+    def __init__(self, queue: Queue, batch_size: int = 500, max_latency_sec: float = 0.5):
+        if batch_size < 1:
+            raise ValueError("Error with batch_size argument: must be at least 1")
+        self.queue = queue
+        self.batch_size = batch_size
+        self.max_latency_sec = max_latency_sec
+        self.items_sent = 0
+        self.batches_sent = 0
+        self._buffer = []
+        self._oldest_ts = None
+
+    def put(self, item) -> None:
+        """ Buffer an item, sending the micro-batch when it is full or stale """
+
+        if not self._buffer:
+            self._oldest_ts = time.monotonic()
+        self._buffer.append(item)
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self) -> None:
+        """ Send the buffered micro-batch if its oldest item has waited longer than max_latency_sec """
+
+        if self._buffer and time.monotonic() - self._oldest_ts >= self.max_latency_sec:
+            self.flush()
+
+    def flush(self) -> None:
+        """ Send all buffered items to the queue as one micro-batch """
+
+        if not self._buffer:
+            return
+        self.queue.put(self._buffer)
+        self.items_sent += len(self._buffer)
+        self.batches_sent += 1
+        self._buffer = []
+        self._oldest_ts = None
+
+    def close(self) -> None:
+        """ Send remaining items and signal end of stream """
+
+        self.flush()
+        self.queue.put(EOF)
+
+
+def iter_queue(queue: Queue, producer_count: int = 1):
+    """
+    Consumer side of the queue transport, yields individual items until every producer has signalled EOF.
+    Accepts both micro-batches sent by BatchedQueueWriter and items put on the queue individually.
+    """
+
+    eof_count = 0
+    while eof_count < producer_count:
+        item = queue.get()
+        if isinstance(item, str) and item == EOF:
+            eof_count += 1
+        elif isinstance(item, list):
+            yield from item
+        else:
+            yield item
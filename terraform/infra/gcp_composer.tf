@@ -15,6 +15,12 @@ resource "google_project_iam_member" "composer_gcs" {
   member  = "serviceAccount:${google_service_account.composer_sa.email}"
 }
 
+resource "google_project_iam_member" "composer_pubsub" {
+  project = var.gcp_project_id
+  role    = "roles/pubsub.subscriber"
+  member  = "serviceAccount:${google_service_account.composer_sa.email}"
+}
+
 resource "google_project_iam_member" "composer_container_developer" {
   project = var.gcp_project_id
   role    = "roles/container.developer"
@@ -51,6 +57,8 @@ resource "google_composer_environment" "chrom_batch_airflow" {
         SF_ACCOUNT               = var.sf_account_name
         SF_USER                  = var.sf_dbt_user
         SF_ROLE                  = var.sf_dbt_role
+        GCP_PROJECT_ID           = var.gcp_project_id
+        DBT_DAG_MODE             = "event"
       }
     }
   }
@@ -245,6 +245,45 @@ resource "google_pubsub_subscription" "sample_bucket_sub" {
   }
 }
 
+# bucket notifications for the event mode dbt dag, which checks them for new bronze files before each dbt build
+resource "google_pubsub_subscription" "trend_bucket_dbt_sub" {
+  name  = "trend-bucket-dbt-sub"
+  topic = google_pubsub_topic.trend_bucket_topic.name
+
+  # notifications younger than the dag's snowpipe settle time are redelivered after this
+  ack_deadline_seconds       = 60
+  message_retention_duration = "86400s"
+
+  # pulled by the dag, never expire
+  expiration_policy {
+    ttl = ""
+  }
+}
+
+resource "google_pubsub_subscription" "batch_bucket_dbt_sub" {
+  name  = "batch-bucket-dbt-sub"
+  topic = google_pubsub_topic.batch_bucket_topic.name
+
+  ack_deadline_seconds       = 60
+  message_retention_duration = "86400s"
+
+  expiration_policy {
+    ttl = ""
+  }
+}
+
+resource "google_pubsub_subscription" "sample_bucket_dbt_sub" {
+  name  = "sample-bucket-dbt-sub"
+  topic = google_pubsub_topic.sample_bucket_topic.name
+
+  ack_deadline_seconds       = 60
+  message_retention_duration = "86400s"
+
+  expiration_policy {
+    ttl = ""
+  }
+}
+
 // Cloud Run Services
 # influx consumer cloud run service
 resource "google_cloud_run_v2_service" "influx_consumer" {
@@ -255,12 +294,29 @@ resource "google_cloud_run_v2_service" "influx_consumer" {
   template {
     service_account = var.gcp_service_account
 
-    max_instance_request_concurrency = 10
+    # matches the gunicorn threads of the consumer image
+    max_instance_request_concurrency = 80
 
 
     containers {
       image = "${var.gcp_region}-docker.pkg.dev/${var.gcp_project_id}/docker-repo/influx-consumer:latest"
 
+      # extra cpu while the container boots, and traffic only once its clients are created
+      resources {
+        startup_cpu_boost = true
+      }
+      startup_probe {
+        http_get {
+          path = "/warmup"
+        }
+        period_seconds    = 1
+        failure_threshold = 30
+      }
+
+      env {
+        name  = "GUNICORN_THREADS"
+        value = "80"
+      }
       env {
         name  = "PUBSUB_STREAMING_SUB_ID"
         value = var.pubsub_streaming_sub_id
@@ -296,12 +352,29 @@ resource "google_cloud_run_v2_service" "gcs_consumer" {
   template {
     service_account = var.gcp_service_account
 
-    max_instance_request_concurrency = 10
+    # matches the gunicorn threads of the consumer image
+    max_instance_request_concurrency = 80
 
 
     containers {
       image = "${var.gcp_region}-docker.pkg.dev/${var.gcp_project_id}/docker-repo/gcs-consumer:latest"
 
+      # extra cpu while the container boots, and traffic only once its clients are created
+      resources {
+        startup_cpu_boost = true
+      }
+      startup_probe {
+        http_get {
+          path = "/warmup"
+        }
+        period_seconds    = 1
+        failure_threshold = 30
+      }
+
+      env {
+        name  = "GUNICORN_THREADS"
+        value = "80"
+      }
       env {
         name  = "PUBSUB_BATCHED_SUB_ID"
         value = var.pubsub_batched_sub_id
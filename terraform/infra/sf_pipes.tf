@@ -14,6 +14,7 @@ resource "snowflake_pipe" "trend_pipe" {
         METADATA$FILENAME AS source_file
         FROM @chrom_stream_db.bronze.trend_stage
     )
+    PATTERN = '.*[.]parquet'
     FILE_FORMAT = (TYPE = PARQUET);
   EOF
 }
@@ -34,6 +35,7 @@ resource "snowflake_pipe" "batch_pipe" {
         METADATA$FILENAME AS source_file
         FROM @chrom_stream_db.bronze.batch_stage
     )
+    PATTERN = '.*[.]parquet'
     FILE_FORMAT = (TYPE = PARQUET);
   EOF
 }